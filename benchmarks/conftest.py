@@ -0,0 +1,58 @@
+"""
+Bancos sintéticos para los micro-benchmarks
+Se generan una sola vez por sesión de pytest, con los módulos reales de
+los códigos de forma, varias áreas por módulo y cuatro opciones por reactivo.
+"""
+
+import os
+import random
+import sys
+from typing import Dict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.exam_forms import FORM_MODULES  # noqa: E402
+from exani.question_bank import Question, QuestionBank  # noqa: E402
+
+# Tamaños de banco y de examen (reactivos)
+BANK_SIZES = (100, 10_000, 100_000)
+EXAM_SIZES = (30, 90, 138)
+
+# Banco para los benchmarks que no dependen del tamaño del banco
+DEFAULT_BANK_SIZE = 10_000
+
+AREAS_PER_MODULE = 3
+
+_banks: Dict[int, QuestionBank] = {}
+
+
+def synthetic_bank(size: int) -> QuestionBank:
+    """Banco de ``size`` reactivos repartidos entre todos los módulos"""
+    if size not in _banks:
+        rng = random.Random(size)
+        questions = []
+        for qid in range(size):
+            module = FORM_MODULES[qid % len(FORM_MODULES)]
+            area = f'{module}_{qid // len(FORM_MODULES) % AREAS_PER_MODULE}'
+            options = tuple(f'Opción {letter} del reactivo {qid}' for letter in 'ABCD')
+            questions.append(Question(qid, module, area, f'Reactivo sintético {qid}: ' + 'texto ' * 20,
+                                      options, rng.randrange(4)))
+        _banks[size] = QuestionBank(questions, version=f'{size:04x}'.rjust(16, 'b'))
+    return _banks[size]
+
+
+@pytest.fixture(params=BANK_SIZES, ids=lambda size: f'bank{size}')
+def bank(request) -> QuestionBank:
+    return synthetic_bank(request.param)
+
+
+@pytest.fixture
+def default_bank() -> QuestionBank:
+    return synthetic_bank(DEFAULT_BANK_SIZE)
+
+
+@pytest.fixture(params=EXAM_SIZES, ids=lambda size: f'{size}items')
+def exam_size(request) -> int:
+    return request.param
@@ -0,0 +1,529 @@
+"""
+Prueba de carga sin navegador
+=============================
+Levanta un servidor real de Streamlit con la aplicación y simula N
+sustentantes conectados por websocket, con el mismo protocolo que usa el
+navegador: cada uno inicia un examen desde el panel, contesta las preguntas
+a su propio ritmo pulsando las opciones de ``render_current_question``,
+navega hacia atrás y hacia adelante de vez en cuando y termina el examen
+desde el modal (``finish_exam``). Los botones dentro de fragmentos se
+pulsan como lo hace el navegador (rerun sólo del fragmento) y el chequeo
+periódico del tiempo (``run_every``) se dispara con su intervalo real.
+
+El reporte incluye rendimiento (reruns por segundo y exámenes por minuto),
+percentiles de latencia por tipo de acción, y CPU y RSS del proceso del
+servidor por sesión y por rerun. Con ``--output`` se guarda en JSON junto
+con la configuración y el entorno, y ``--compare`` muestra la diferencia
+contra un reporte anterior.
+
+Uso::
+
+    python benchmarks/loadtest.py --sessions 200 --think-time 2
+    python benchmarks/loadtest.py --sessions 200 -o stats/loadtest/hoy.json --compare stats/loadtest/ayer.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'exani_simulator.py')
+
+# Botón del panel para cada modo de examen
+MODE_BUTTONS = {
+    'transversales': 'mode_trans',
+    'disciplinares': 'mode_disc',
+    'completo': 'mode_comp',
+    'ingles': 'mode_ing'
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Métricas que se comparan entre reportes (mayor es mejor = True)
+COMPARED = (
+    ('reruns_per_second', True),
+    ('exams_per_minute', True),
+    ('latency_ms.all.p50', False),
+    ('latency_ms.all.p95', False),
+    ('latency_ms.all.p99', False),
+    ('server_cpu_ms_per_rerun', False),
+    ('server_rss_mb_per_session', False)
+)
+
+# Estados de script_finished que cierran una acción (los demás: rerun en curso)
+_RUN_DONE = {0, 1, 3}  # FINISHED_SUCCESSFULLY, WITH_COMPILE_ERROR, FRAGMENT_RUN_SUCCESSFULLY
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+class LoadConfig(NamedTuple):
+    sessions: int
+    mode: str
+    think_time: float  # segundos promedio entre acciones (exponencial)
+    answer_rate: float  # probabilidad de contestar (si no, se salta la pregunta)
+    back_rate: float  # probabilidad de volver a la pregunta anterior
+    ramp_up: float  # segundos para conectar todas las sesiones
+    seed: int
+
+
+class ButtonInfo(NamedTuple):
+    widget_id: str
+    label: str
+    key: str
+    fragment_id: str
+    disabled: bool
+
+
+class SessionResult(NamedTuple):
+    latencies: Dict[str, List[float]]  # acción -> segundos por rerun
+    finished: bool
+    error: Optional[str]
+
+
+class SimulatedSession:
+    """Un navegador simulado: mantiene los botones visibles y envía reruns"""
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        self.url = url
+        self.timeout = timeout
+        self.buttons: Dict[Tuple[int, ...], ButtonInfo] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        self._websocket = None
+        self._reader: Optional[asyncio.Task] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._done: Optional[asyncio.Future] = None
+        self._lock = asyncio.Lock()
+        self._run_fragments: Set[str] = set()
+        self._touched: Set[Tuple[int, ...]] = set()
+
+    async def connect(self):
+        try:
+            from websockets.asyncio.client import connect
+        except ImportError as e:
+            raise RuntimeError("La prueba de carga requiere websockets (pip install websockets)") from e
+        self._websocket = await connect(self.url, max_size=None, open_timeout=self.timeout)
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        for task in (self._ticker, self._reader):
+            if task is not None:
+                task.cancel()
+        if self._websocket is not None:
+            await self._websocket.close()
+
+    async def rerun(self, action: str, button: Optional[ButtonInfo] = None, auto_fragment: str = ''):
+        """Envía un rerun (o la pulsación de un botón) y espera a que termine"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        message = BackMsg()
+        message.rerun_script.page_script_hash = ''
+        if button is not None:
+            widget = message.rerun_script.widget_states.widgets.add()
+            widget.id = button.widget_id
+            widget.trigger_value = True
+            message.rerun_script.fragment_id = button.fragment_id
+        elif auto_fragment:
+            message.rerun_script.fragment_id = auto_fragment
+            message.rerun_script.is_auto_rerun = True
+
+        async with self._lock:
+            self._done = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            await self._websocket.send(message.SerializeToString())
+            await asyncio.wait_for(self._done, self.timeout)
+            self.latencies.setdefault(action, []).append(time.perf_counter() - started)
+        if self.errors:
+            raise RuntimeError(self.errors[0])
+
+    def find(self, label: Optional[str] = None, key_prefix: Optional[str] = None) -> List[ButtonInfo]:
+        return [
+            button for button in self.buttons.values()
+            if not button.disabled and (label is None or button.label == label) and
+            (key_prefix is None or button.key.startswith(key_prefix))
+        ]
+
+    def button(self, label: str) -> ButtonInfo:
+        buttons = self.find(label)
+        if not buttons:
+            raise RuntimeError(f"No hay botón '{label}'")
+        return buttons[0]
+
+    def current_question(self) -> Optional[int]:
+        """Índice de la pregunta visible (según las claves option_<índice>_<opción>)"""
+        indexes = {int(button.key.split('_')[1]) for button in self.find(key_prefix='option_')}
+        return indexes.pop() if len(indexes) == 1 else None
+
+    async def _read(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        async for raw in self._websocket:
+            message = ForwardMsg()
+            message.ParseFromString(raw)
+            kind = message.WhichOneof('type')
+            if kind == 'new_session':
+                self._run_fragments = set(message.new_session.fragment_ids_this_run)
+                self._touched = set()
+            elif kind == 'delta':
+                self._apply_delta(message)
+            elif kind == 'script_finished':
+                self._prune()
+                if message.script_finished in _RUN_DONE and self._done is not None and not self._done.done():
+                    self._done.set_result(None)
+            elif kind == 'auto_rerun':
+                if self._ticker is not None:
+                    self._ticker.cancel()
+                self._ticker = asyncio.create_task(
+                    self._tick(message.auto_rerun.interval, message.auto_rerun.fragment_id))
+            elif kind == 'stop_auto_rerun' and self._ticker is not None:
+                self._ticker.cancel()
+                self._ticker = None
+
+    def _apply_delta(self, message):
+        path = tuple(message.metadata.delta_path)
+        self._touched.add(path)
+        delta = message.delta
+        if delta.WhichOneof('type') != 'new_element':
+            self.buttons.pop(path, None)
+            return
+        element = delta.new_element
+        kind = element.WhichOneof('type')
+        if kind == 'button':
+            button = element.button
+            # Los IDs de widget terminan con la clave del usuario ('None' si no tiene)
+            key = button.id.rsplit('-', 1)[-1]
+            self.buttons[path] = ButtonInfo(button.id, button.label, key, delta.fragment_id, button.disabled)
+        else:
+            self.buttons.pop(path, None)
+            if kind == 'exception':
+                self.errors.append(f"{element.exception.type}: {element.exception.message}")
+
+    def _prune(self):
+        """Quita los botones que el último rerun (o fragmento) ya no dibujó"""
+        for path, button in list(self.buttons.items()):
+            if path in self._touched:
+                continue
+            if not self._run_fragments or button.fragment_id in self._run_fragments:
+                del self.buttons[path]
+
+    async def _tick(self, interval: float, fragment_id: str):
+        """Reruns periódicos de un fragmento con run_every, como el navegador"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.rerun('tick', auto_fragment=fragment_id)
+
+
+async def run_session(url: str, number: int, config: LoadConfig) -> SessionResult:
+    """Un sustentante: panel → examen → terminar"""
+    rng = random.Random(config.seed * 100003 + number)
+    session = SimulatedSession(url)
+
+    async def act(action: str, button: Optional[ButtonInfo] = None):
+        if config.think_time:
+            await asyncio.sleep(rng.expovariate(1 / config.think_time))
+        await session.rerun(action, button)
+
+    try:
+        await session.connect()
+        await act('load')
+        await act('configure', session.find(key_prefix=MODE_BUTTONS[config.mode])[0])
+        await act('start', session.button("🚀 Iniciar Simulacro"))
+
+        steps = 0
+        while True:
+            index = session.current_question()
+            if index is None:
+                raise RuntimeError("El examen no muestra una pregunta")
+            steps += 1
+            if steps > 2000:
+                raise RuntimeError("Demasiados pasos sin terminar el examen")
+            if index > 0 and rng.random() < config.back_rate:
+                await act('navigate', session.button("← Anterior"))
+                continue
+            if rng.random() < config.answer_rate:
+                await act('answer', rng.choice(session.find(key_prefix=f'option_{index}_')))
+                if session.current_question() != index:
+                    continue  # avance automático
+            if not session.find("Siguiente →"):
+                break  # última pregunta
+            await act('navigate', session.button("Siguiente →"))
+
+        await act('finish', session.button("🏁 Terminar Examen"))
+        await act('finish', session.button("✅ Terminar"))
+        finished = bool(session.find("📊 Revisar Respuestas"))
+        return SessionResult(session.latencies, finished, None if finished else "No llegó a resultados")
+    except Exception as e:
+        return SessionResult(session.latencies, False, f"{type(e).__name__}: {e}")
+    finally:
+        await session.close()
+
+
+class ServerProcess:
+    """Servidor de Streamlit con la aplicación, en un puerto libre"""
+
+    def __init__(self, env: Dict[str, str]):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP_PATH,
+             '--server.headless', 'true', '--server.address', '127.0.0.1',
+             '--server.port', str(self.port), '--server.fileWatcherType', 'none',
+             '--browser.gatherUsageStats', 'false'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        self.url = f'ws://127.0.0.1:{self.port}/_stcore/stream'
+        self._wait_until_healthy()
+
+    def _wait_until_healthy(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"El servidor terminó: {self.process.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/_stcore/health', timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("El servidor no respondió a tiempo")
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """CPU (usuario + sistema) de un proceso, desde /proc (Linux)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+def process_rss_mb(pid: int) -> float:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {
+        f'p{p}': round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2)
+        for p in PERCENTILES
+    }
+    summary['max'] = round(ordered[-1] * 1000, 2)
+    summary['mean'] = round(sum(ordered) / len(ordered) * 1000, 2)
+    summary['count'] = len(ordered)
+    return summary
+
+
+def _environment() -> Dict:
+    from importlib.metadata import version
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'streamlit': version('streamlit'),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+async def _run_sessions(url: str, config: LoadConfig, pid: Optional[int]) -> Tuple[List[SessionResult], float, float]:
+    peak_rss = 0.0
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, process_rss_mb(pid))
+            await asyncio.sleep(0.2)
+
+    async def delayed(number: int) -> SessionResult:
+        if config.ramp_up:
+            await asyncio.sleep(config.ramp_up * number / config.sessions)
+        return await run_session(url, number, config)
+
+    sampler = asyncio.create_task(sample_rss()) if pid else None
+    started = time.perf_counter()
+    results = await asyncio.gather(*(delayed(number) for number in range(config.sessions)))
+    wall = time.perf_counter() - started
+    if sampler is not None:
+        sampler.cancel()
+    return list(results), wall, peak_rss
+
+
+def run_load_test(config: LoadConfig, url: Optional[str] = None, pid: Optional[int] = None) -> Dict:
+    """Ejecuta la prueba (contra ``url`` o un servidor propio) y devuelve el reporte"""
+    server = None
+    db_dir = None
+    try:
+        if url is None:
+            env = dict(os.environ)
+            # Historial desechable: no se mezcla con data/exani.db
+            db_dir = tempfile.mkdtemp(prefix='exani-loadtest-')
+            env.setdefault('EXANI_DB_PATH', os.path.join(db_dir, 'exani.db'))
+            server = ServerProcess(env)
+            url, pid = server.url, server.pid
+        # Calienta el servidor (imports, banco, historial) para medir sólo las sesiones
+        warmup = asyncio.run(run_session(url, -1, config._replace(think_time=0.0, back_rate=0.0)))
+        if warmup.error:
+            raise RuntimeError(f"La sesión de calentamiento falló: {warmup.error}")
+        baseline_rss = process_rss_mb(pid) if pid else 0.0
+        cpu_started = process_cpu_seconds(pid) if pid else 0.0
+        results, wall, peak_rss = asyncio.run(_run_sessions(url, config, pid))
+        cpu = process_cpu_seconds(pid) - cpu_started if pid else 0.0
+        if pid:
+            peak_rss = max(peak_rss, process_rss_mb(pid))
+    finally:
+        if server is not None:
+            server.stop()
+        if db_dir is not None:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    by_action: Dict[str, List[float]] = {}
+    for result in results:
+        for action, values in result.latencies.items():
+            by_action.setdefault(action, []).extend(values)
+    all_latencies = [value for values in by_action.values() for value in values]
+    finished = sum(result.finished for result in results)
+    errors = [result.error for result in results if result.error]
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': config._asdict(),
+        'environment': _environment(),
+        'wall_seconds': round(wall, 3),
+        'sessions_finished': finished,
+        'sessions_failed': len(errors),
+        'errors': sorted(set(errors))[:10],
+        'reruns': len(all_latencies),
+        'reruns_per_second': round(len(all_latencies) / wall, 2),
+        'exams_per_minute': round(finished / wall * 60, 2),
+        'latency_ms': dict({'all': _percentiles(all_latencies)},
+                           **{action: _percentiles(values) for action, values in sorted(by_action.items())})
+    }
+    if pid:
+        report.update({
+            'server_cpu_seconds': round(cpu, 3),
+            'server_cpu_utilization': round(cpu / wall, 3),
+            'server_cpu_ms_per_rerun': round(cpu / max(len(all_latencies), 1) * 1000, 3),
+            'server_cpu_ms_per_session': round(cpu / config.sessions * 1000, 2),
+            'server_rss_mb_baseline': round(baseline_rss, 1),
+            'server_rss_mb_peak': round(peak_rss, 1),
+            'server_rss_mb_per_session': round((peak_rss - baseline_rss) / config.sessions, 3)
+        })
+    return report
+
+
+def _lookup(report: Dict, path: str) -> Optional[float]:
+    value = report
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def print_report(report: Dict, previous: Optional[Dict] = None):
+    config = report['config']
+    print(f"Sesiones: {config['sessions']}, modo {config['mode']}, pausa media {config['think_time']} s")
+    print(f"Terminadas: {report['sessions_finished']}, fallidas: {report['sessions_failed']} "
+          f"en {report['wall_seconds']:.1f} s")
+    for error in report['errors']:
+        print(f"  ❌ {error}")
+    print(f"Rendimiento: {report['reruns_per_second']} reruns/s, {report['exams_per_minute']} exámenes/min")
+    print("Latencia por rerun (ms):")
+    for action, stats in report['latency_ms'].items():
+        if stats:
+            print(f"  {action:<10} n={stats['count']:<7} " +
+                  '  '.join(f"p{p}={stats[f'p{p}']:.1f}" for p in PERCENTILES) + f"  max={stats['max']:.1f}")
+    if 'server_cpu_seconds' in report:
+        print(f"CPU del servidor: {report['server_cpu_seconds']:.1f} s "
+              f"({report['server_cpu_utilization']:.0%} de un núcleo), "
+              f"{report['server_cpu_ms_per_rerun']:.2f} ms/rerun, {report['server_cpu_ms_per_session']:.0f} ms/sesión")
+        print(f"RSS del servidor: {report['server_rss_mb_baseline']:.0f} MB base, "
+              f"{report['server_rss_mb_peak']:.0f} MB pico, {report['server_rss_mb_per_session']:.2f} MB/sesión")
+
+    if previous is not None:
+        print(f"Comparado con {previous.get('created_at')} ({previous.get('environment', {}).get('commit')}):")
+        for path, higher_is_better in COMPARED:
+            old, new = _lookup(previous, path), _lookup(report, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            better = change > 0 if higher_is_better else change < 0
+            mark = '✅' if better else ('⚠️' if abs(change) > 0.05 else '  ')
+            print(f"  {mark} {path:<26} {old:>10} → {new:<10} ({change:+.1%})")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Prueba de carga con sesiones simuladas por websocket')
+    parser.add_argument('--sessions', type=int, default=50, help='sustentantes simulados')
+    parser.add_argument('--mode', choices=sorted(MODE_BUTTONS), default='transversales')
+    parser.add_argument('--think-time', type=float, default=0.0, help='segundos promedio entre acciones')
+    parser.add_argument('--answer-rate', type=float, default=0.9, help='probabilidad de contestar cada pregunta')
+    parser.add_argument('--back-rate', type=float, default=0.05, help='probabilidad de volver a la anterior')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='segundos para conectar todas las sesiones')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', default=None,
+                        help='websocket de un servidor ya levantado (ws://host:puerto/_stcore/stream)')
+    parser.add_argument('--pid', type=int, default=None, help='PID de ese servidor para medir CPU y RSS')
+    parser.add_argument('-o', '--output', default=None, help='guarda el reporte en JSON')
+    parser.add_argument('--compare', default=None, help='reporte JSON anterior para comparar')
+    args = parser.parse_args(argv)
+
+    config = LoadConfig(
+        sessions=args.sessions,
+        mode=args.mode,
+        think_time=args.think_time,
+        answer_rate=args.answer_rate,
+        back_rate=args.back_rate,
+        ramp_up=args.ramp_up,
+        seed=args.seed
+    )
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    report = run_load_test(config, args.url, args.pid)
+    print_report(report, previous)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Reporte guardado en {args.output}", file=sys.stderr)
+    return 1 if report['sessions_failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Benchmark de arranque
+=====================
+Mide, en procesos nuevos, lo que paga cada worker antes de mostrar el panel
+inicial: tiempo de importación de la aplicación, primera ejecución del
+panel (con ``AppTest``) y memoria residente máxima. También verifica que
+las dependencias pesadas (pandas, NumPy, pyarrow) no se carguen en ese
+camino.
+
+Uso::
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 7 --max-import-ms 800 --max-rss-mb 250
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben cargarse para mostrar el panel inicial
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow')
+
+
+def _max_rss_mb() -> float:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure() -> Dict:
+    """Medición dentro del proceso hijo"""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    streamlit_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    import exani_simulator  # noqa: F401
+    import_ms = (time.perf_counter() - started) * 1000 + streamlit_ms
+    import_rss = _max_rss_mb()
+    heavy_on_import = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(ROOT, 'exani_simulator.py'), default_timeout=60)
+    started = time.perf_counter()
+    app.run()
+    dashboard_ms = (time.perf_counter() - started) * 1000
+    if app.exception:
+        raise RuntimeError(f"El panel inicial falló: {app.exception[0].value}")
+
+    return {
+        'streamlit_ms': streamlit_ms,
+        'import_ms': import_ms,
+        'dashboard_ms': dashboard_ms,
+        'import_rss_mb': import_rss,
+        'rss_mb': _max_rss_mb(),
+        'heavy_on_import': heavy_on_import,
+        'heavy_on_dashboard': [m for m in HEAVY_MODULES if m in sys.modules]
+    }
+
+
+def run_child(env: Dict[str, str]) -> Dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        env=env, cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Tiempo de importación y memoria del arranque')
+    parser.add_argument('--runs', type=int, default=5, help='procesos a medir (se reporta la mediana)')
+    parser.add_argument('--max-import-ms', type=float, default=None, help='falla si la mediana de importación lo excede')
+    parser.add_argument('--max-rss-mb', type=float, default=None, help='falla si la mediana de RSS lo excede')
+    parser.add_argument('--json', action='store_true', help='imprime el resultado como JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure()))
+        return 0
+
+    env = dict(os.environ)
+    # Historial desechable para no tocar data/exani.db
+    env.setdefault('EXANI_DB_PATH', os.path.join(ROOT, 'data', 'benchmark-startup.db'))
+    samples = [run_child(env) for _ in range(args.runs)]
+    summary = {
+        key: statistics.median(sample[key] for sample in samples)
+        for key in ('streamlit_ms', 'import_ms', 'dashboard_ms', 'import_rss_mb', 'rss_mb')
+    }
+    heavy = sorted({m for sample in samples for m in sample['heavy_on_dashboard']})
+    summary['heavy_modules'] = heavy
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Importación:   {summary['import_ms']:.0f} ms (streamlit {summary['streamlit_ms']:.0f} ms)")
+        print(f"Panel inicial: {summary['dashboard_ms']:.0f} ms")
+        print(f"RSS máximo:    {summary['import_rss_mb']:.0f} MB tras importar, {summary['rss_mb']:.0f} MB tras el panel")
+        print(f"Dependencias pesadas cargadas: {', '.join(heavy) or 'ninguna'}")
+
+    failures = []
+    if heavy:
+        failures.append(f"el panel inicial carga {', '.join(heavy)}")
+    if args.max_import_ms is not None and summary['import_ms'] > args.max_import_ms:
+        failures.append(f"importación {summary['import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+    if args.max_rss_mb is not None and summary['rss_mb'] > args.max_rss_mb:
+        failures.append(f"RSS {summary['rss_mb']:.0f} MB > {args.max_rss_mb:.0f} MB")
+    for failure in failures:
+        print(f"❌ Regresión: {failure}", file=sys.stderr)
+    if not failures:
+        print(f"✅ {args.runs} arranques medidos", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
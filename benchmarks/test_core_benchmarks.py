@@ -0,0 +1,116 @@
+"""
+Micro-benchmarks de la lógica del examen (sin servidor de Streamlit)
+Cada benchmark llama a las mismas funciones de ``exani.exam_session`` que
+el método indicado de la aplicación.
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:15%
+"""
+
+import itertools
+import random
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import pytest
+
+from exani.exam_forms import FORM_MODULES, ExamForm
+from exani.exam_session import FinishedExam, current_stats, finish_exam, generate_form, record_answer
+from exani.exam_state import REVIEW_STATUSES, ExamStats, ReviewIndex, new_answer_array
+from exani.export import results_json, summary_csv
+from exani.question_bank import Question, QuestionBank
+
+# Probabilidad de dejar una pregunta sin responder en los exámenes simulados
+SKIP_RATE = 0.1
+
+# Inicio y fin de los exámenes simulados
+STARTED_AT = datetime(2025, 1, 1, 8, 0)
+FINISHED_AT = STARTED_AT + timedelta(minutes=87, seconds=12)
+
+
+def answered_exam(bank: QuestionBank, items: int) -> Tuple[ExamForm, List[Question], array]:
+    """Forma, sus preguntas y respuestas aleatorias (con algunas sin responder)"""
+    form, _ = generate_form(bank, FORM_MODULES, items, seed=items)
+    questions = [bank[qid] for qid in form.question_ids]
+    rng = random.Random(items)
+    answers = new_answer_array(len(questions))
+    for i, question in enumerate(questions):
+        if rng.random() >= SKIP_RATE:
+            answers[i] = rng.randrange(len(question.options))
+    return form, questions, answers
+
+
+def finished_exam(form: ExamForm, questions: List[Question], answers: array) -> FinishedExam:
+    return finish_exam(questions, answers, exam_type='completo', modules=list(FORM_MODULES),
+                       form_code=form.code, bank_version='benchmark', user_id='benchmark',
+                       started_at=STARTED_AT, finished_at=FINISHED_AT)
+
+
+@pytest.mark.parametrize('shuffle_options', [False, True], ids=['fixed', 'shuffled'])
+def test_generate_questions(benchmark, bank, exam_size, shuffle_options):
+    """generate_questions: especificación nueva + construcción de la forma"""
+    # Una semilla nueva en cada ronda, como en la aplicación: nunca se toma del caché de formas
+    seeds = itertools.count()
+
+    def generate():
+        return generate_form(bank, FORM_MODULES, exam_size, shuffle_options, seed=next(seeds))
+
+    form, _ = benchmark(generate)
+    assert len(form.question_ids) == min(exam_size, len(bank))
+
+
+def test_answer_stats(benchmark, default_bank, exam_size):
+    """set_answer + calculate_current_stats: acumulador O(1) por respuesta"""
+    _, questions, answers = answered_exam(default_bank, exam_size)
+
+    def answer_all():
+        stats = ExamStats.from_answers(questions, new_answer_array(len(questions)))
+        current = new_answer_array(len(questions))
+        answered = 0
+        for i, (question, answer) in enumerate(zip(questions, answers)):
+            answered = record_answer(stats, current, answered, i, question, answer)
+        return current_stats(stats)
+
+    assert benchmark(answer_all) == ExamStats.from_answers(questions, answers).as_tuple()
+
+
+def test_rebuild_stats(benchmark, default_bank, exam_size):
+    """Reconstrucción completa del acumulador (al reanudar un examen)"""
+    _, questions, answers = answered_exam(default_bank, exam_size)
+    stats = benchmark(ExamStats.from_answers, questions, answers)
+    assert stats.total == exam_size
+
+
+def test_finish_exam(benchmark, default_bank, exam_size):
+    """finish_exam: calificación, resultados, registro del intento e índice de revisión"""
+    form, questions, answers = answered_exam(default_bank, exam_size)
+    finished = benchmark(finished_exam, form, questions, answers)
+    record = finished.record
+    assert record.correct + record.wrong + record.skipped == exam_size
+    assert finished.review.count() == exam_size
+
+
+def test_review_filtering(benchmark, default_bank, exam_size):
+    """Pantalla de revisión: todas las combinaciones de estado y área"""
+    _, questions, answers = answered_exam(default_bank, exam_size)
+    review = ReviewIndex(questions, answers)
+    statuses = (None,) + REVIEW_STATUSES
+    areas = (None,) + review.areas
+
+    def filter_all():
+        return sum(len(review.select(status, area)) for status in statuses for area in areas)
+
+    assert benchmark(filter_all) == exam_size * 4
+
+
+def test_export_results(benchmark, default_bank, exam_size):
+    """export_results: JSON detallado y resumen CSV"""
+    form, questions, answers = answered_exam(default_bank, exam_size)
+    results = finished_exam(form, questions, answers).results
+
+    def export():
+        return results_json(results, questions, answers), summary_csv(results)
+
+    detailed, summary = benchmark(export)
+    assert detailed and summary
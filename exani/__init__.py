@@ -0,0 +1,7 @@
+"""
+Núcleo del simulador EXANI-II
+=============================
+Lógica independiente de Streamlit (banco de preguntas, generación de
+exámenes, calificación) compartida por la aplicación web y las herramientas
+de línea de comandos.
+"""
@@ -0,0 +1,395 @@
+"""
+Historial de intentos en SQLite
+===============================
+Guarda cada examen terminado (resumen del intento y respuesta por pregunta)
+en una base SQLite local en modo WAL, para que los resultados sobrevivan a
+recargas y reinicios del servidor.
+
+La misma base guarda las listas de exclusión de las formas (ver
+``exani.exam_forms``): todos los procesos que comparten el historial pueden
+reconstruir una forma a partir de su código.
+
+Las conexiones se comparten entre sesiones mediante un pool; las sentencias
+son constantes del módulo, así que cada conexión las prepara una vez y
+reutiliza su caché. Las respuestas de un intento se insertan en lote
+(``executemany``) dentro de una sola transacción.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import AbstractSet, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Base de datos por defecto (se puede cambiar con EXANI_DB_PATH)
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'exani.db')
+
+# Conexiones abiertas por el pool
+DEFAULT_POOL_SIZE = 4
+
+# Días que se conservan los puntos de control y las respuestas en curso de
+# exámenes abandonados
+CHECKPOINT_TTL_DAYS = 7
+
+# Días sin usarse tras los que se borra una lista de exclusión de formas
+EXCLUSION_TTL_DAYS = 180
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    form_code TEXT,
+    bank_version TEXT,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    duration_seconds REAL,
+    score INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    wrong INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempt_answers (
+    attempt_id INTEGER NOT NULL REFERENCES attempts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    answer INTEGER NOT NULL,
+    is_correct INTEGER NOT NULL,
+    PRIMARY KEY (attempt_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS live_answers (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    answer INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    token TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS form_exclusions (
+    bank_version TEXT NOT NULL,
+    checksum INTEGER NOT NULL,
+    question_ids TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (bank_version, checksum)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts (user_id, finished_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_exam_type ON attempts (exam_type, finished_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_finished ON attempts (finished_at);
+CREATE INDEX IF NOT EXISTS idx_answers_question ON attempt_answers (question_id);
+"""
+
+_ATTEMPT_COLUMNS = ('id, user_id, exam_type, form_code, bank_version, started_at, finished_at, '
+                    'duration_seconds, score, correct, wrong, skipped, total')
+
+_INSERT_ATTEMPT = (
+    "INSERT INTO attempts (user_id, exam_type, form_code, bank_version, started_at, finished_at, "
+    "duration_seconds, score, correct, wrong, skipped, total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_ANSWER = (
+    "INSERT INTO attempt_answers (attempt_id, position, question_id, answer, is_correct) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+_UPSERT_LIVE_ANSWER = (
+    "INSERT INTO live_answers (session_id, position, question_id, answer, updated_at) "
+    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id, position) DO UPDATE SET "
+    "question_id = excluded.question_id, answer = excluded.answer, updated_at = excluded.updated_at"
+)
+_DELETE_LIVE_ANSWERS = "DELETE FROM live_answers WHERE session_id = ?"
+_SELECT_LIVE_ANSWERS = (
+    "SELECT position, question_id, answer FROM live_answers WHERE session_id = ? ORDER BY position"
+)
+_UPSERT_CHECKPOINT = (
+    "INSERT INTO checkpoints (token, data, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (token) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+)
+_DELETE_CHECKPOINT = "DELETE FROM checkpoints WHERE token = ?"
+_SELECT_CHECKPOINT = "SELECT data FROM checkpoints WHERE token = ?"
+_PRUNE_CHECKPOINTS = "DELETE FROM checkpoints WHERE updated_at < ?"
+_PRUNE_LIVE_ANSWERS = "DELETE FROM live_answers WHERE updated_at < ?"
+_SELECT_EXCLUSION = "SELECT question_ids FROM form_exclusions WHERE bank_version = ? AND checksum = ?"
+_UPSERT_EXCLUSION = (
+    "INSERT INTO form_exclusions (bank_version, checksum, question_ids, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (bank_version, checksum) DO UPDATE SET updated_at = excluded.updated_at"
+)
+_PRUNE_EXCLUSIONS = "DELETE FROM form_exclusions WHERE updated_at < ?"
+_SELECT_BY_USER = (
+    f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE user_id = ? "
+    "ORDER BY finished_at DESC LIMIT ?"
+)
+_SELECT_BY_EXAM_TYPE = (
+    f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE exam_type = ? AND finished_at BETWEEN ? AND ? "
+    "ORDER BY finished_at DESC LIMIT ?"
+)
+_SELECT_BETWEEN = (
+    f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE finished_at BETWEEN ? AND ? "
+    "ORDER BY finished_at DESC LIMIT ?"
+)
+_SELECT_PAGE = (
+    f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE id > ? AND finished_at >= ? "
+    "ORDER BY id LIMIT ?"
+)
+_SELECT_PAGE_ANSWERS = (
+    "SELECT attempt_id, question_id, answer, is_correct FROM attempt_answers "
+    "WHERE attempt_id BETWEEN ? AND ? ORDER BY attempt_id, position"
+)
+_SELECT_ANSWERS = (
+    "SELECT position, question_id, answer, is_correct FROM attempt_answers "
+    "WHERE attempt_id = ? ORDER BY position"
+)
+
+
+class AttemptRecord(NamedTuple):
+    """Intento terminado listo para guardarse"""
+    user_id: str
+    exam_type: str
+    form_code: Optional[str]
+    bank_version: str
+    started_at: Optional[float]  # epoch (segundos)
+    finished_at: float
+    score: int
+    correct: int
+    wrong: int
+    skipped: int
+    question_ids: Sequence[int]
+    answers: Sequence[int]  # índice original de la opción o UNANSWERED
+    correct_options: Sequence[int]
+    # Sesión del examen: al guardar el intento se borran sus respuestas en
+    # curso y su punto de control
+    session_id: Optional[str] = None
+
+
+class LiveAnswer(NamedTuple):
+    """Respuesta de un examen en curso"""
+    session_id: str
+    position: int
+    question_id: int
+    answer: int
+    updated_at: float
+
+
+class CheckpointRow(NamedTuple):
+    """Punto de control serializado de un examen en curso"""
+    token: str
+    data: bytes
+    updated_at: float
+
+
+class StoredAttempt(NamedTuple):
+    """Resumen de un intento guardado"""
+    id: int
+    user_id: str
+    exam_type: str
+    form_code: Optional[str]
+    bank_version: Optional[str]
+    started_at: Optional[float]
+    finished_at: float
+    duration_seconds: Optional[float]
+    score: int
+    correct: int
+    wrong: int
+    skipped: int
+    total: int
+
+
+class AttemptStore:
+    """
+    Almacén de intentos sobre SQLite (WAL) con un pool de conexiones
+    Seguro para usarse desde varios hilos; SQLite serializa las escrituras
+    y WAL permite leer mientras se escribe.
+    """
+
+    def __init__(self, path: str, pool_size: int = DEFAULT_POOL_SIZE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._pool: 'queue.Queue[sqlite3.Connection]' = queue.Queue()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        for _ in range(pool_size):
+            connection = self._connect()
+            self._connections.append(connection)
+            self._pool.put(connection)
+        with self.connection() as connection:
+            connection.executescript(SCHEMA)
+            expired = time.time() - CHECKPOINT_TTL_DAYS * 86400
+            connection.execute(_PRUNE_CHECKPOINTS, (expired,))
+            connection.execute(_PRUNE_LIVE_ANSWERS, (expired,))
+            connection.execute(_PRUNE_EXCLUSIONS, (time.time() - EXCLUSION_TTL_DAYS * 86400,))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False,
+                                     isolation_level=None, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no arriesga corrupción y evita un fsync por transacción
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Toma una conexión del pool y la devuelve al terminar"""
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def save_attempt(self, record: AttemptRecord) -> int:
+        """Guarda un intento con todas sus respuestas; devuelve su ID"""
+        return self.save_attempts([record])[0]
+
+    def save_attempts(self, records: Iterable[AttemptRecord]) -> List[int]:
+        """Guarda varios intentos en una sola transacción"""
+        return self.write_batch((), records)
+
+    def write_batch(self, live_answers: Iterable[LiveAnswer],
+                    records: Iterable[AttemptRecord],
+                    checkpoints: Iterable[CheckpointRow] = ()) -> List[int]:
+        """
+        Escribe en una sola transacción respuestas en curso, puntos de
+        control e intentos terminados; devuelve los IDs de los intentos
+        """
+        ids = []
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(_UPSERT_LIVE_ANSWER, live_answers)
+                connection.executemany(_UPSERT_CHECKPOINT, checkpoints)
+                for record in records:
+                    ids.append(self._insert_attempt(connection, record))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return ids
+
+    @staticmethod
+    def _insert_attempt(connection: sqlite3.Connection, record: AttemptRecord) -> int:
+        duration = (record.finished_at - record.started_at
+                    if record.started_at is not None else None)
+        cursor = connection.execute(_INSERT_ATTEMPT, (
+            record.user_id, record.exam_type, record.form_code, record.bank_version,
+            record.started_at, record.finished_at, duration, record.score,
+            record.correct, record.wrong, record.skipped, len(record.question_ids)
+        ))
+        attempt_id = cursor.lastrowid
+        connection.executemany(_INSERT_ANSWER, (
+            (attempt_id, position, qid, answer, int(answer == correct))
+            for position, (qid, answer, correct)
+            in enumerate(zip(record.question_ids, record.answers, record.correct_options))
+        ))
+        if record.session_id is not None:
+            connection.execute(_DELETE_LIVE_ANSWERS, (record.session_id,))
+            connection.execute(_DELETE_CHECKPOINT, (record.session_id,))
+        return attempt_id
+
+    def load_checkpoint(self, token: str) -> Optional[bytes]:
+        """Punto de control serializado de un examen en curso (None si no existe)"""
+        with self.connection() as connection:
+            row = connection.execute(_SELECT_CHECKPOINT, (token,)).fetchone()
+        return row[0] if row else None
+
+    def delete_checkpoint(self, token: str):
+        """Descarta el punto de control de un examen abandonado"""
+        with self.connection() as connection:
+            connection.execute(_DELETE_CHECKPOINT, (token,))
+
+    def save_exclusion(self, bank_version: str, checksum: int, question_ids: AbstractSet[int]) -> bool:
+        """
+        Guarda la lista de exclusión de una forma (o renueva su fecha de uso);
+        False si la huella ya corresponde a otra lista
+        """
+        data = json.dumps(sorted(question_ids))
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(_SELECT_EXCLUSION, (bank_version, checksum)).fetchone()
+                if row is None or row[0] == data:
+                    connection.execute(_UPSERT_EXCLUSION, (bank_version, checksum, data, time.time()))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return row is None or row[0] == data
+
+    def load_exclusion(self, bank_version: str, checksum: int) -> Optional[FrozenSet[int]]:
+        """Lista de exclusión guardada con esa huella (None si no existe)"""
+        with self.connection() as connection:
+            row = connection.execute(_SELECT_EXCLUSION, (bank_version, checksum)).fetchone()
+        return frozenset(json.loads(row[0])) if row else None
+
+    def live_answers(self, session_id: str) -> List[Tuple[int, int, int]]:
+        """Respuestas guardadas de un examen en curso: (posición, ID de pregunta, respuesta)"""
+        with self.connection() as connection:
+            return connection.execute(_SELECT_LIVE_ANSWERS, (session_id,)).fetchall()
+
+    def attempts_by_user(self, user_id: str, limit: int = 50) -> List[StoredAttempt]:
+        """Intentos de un usuario, del más reciente al más antiguo"""
+        return self._query(_SELECT_BY_USER, (user_id, limit))
+
+    def attempts_by_exam_type(self, exam_type: str, since: float = 0.0, until: Optional[float] = None,
+                              limit: int = 1000) -> List[StoredAttempt]:
+        """Intentos de un tipo de simulacro dentro de un rango de fechas (epoch)"""
+        return self._query(_SELECT_BY_EXAM_TYPE, (exam_type, since, until or time.time(), limit))
+
+    def attempts_between(self, since: float, until: Optional[float] = None,
+                         limit: int = 1000) -> List[StoredAttempt]:
+        """Intentos terminados dentro de un rango de fechas (epoch)"""
+        return self._query(_SELECT_BETWEEN, (since, until or time.time(), limit))
+
+    def attempt_answers(self, attempt_id: int) -> List[Tuple[int, int, int, bool]]:
+        """Respuestas de un intento: (posición, ID de pregunta, respuesta, correcta)"""
+        with self.connection() as connection:
+            return [(position, qid, answer, bool(is_correct)) for position, qid, answer, is_correct
+                    in connection.execute(_SELECT_ANSWERS, (attempt_id,))]
+
+    def iter_attempts(self, since: float = 0.0, page_size: int = 500,
+                      after_id: int = 0) -> Iterator[Tuple[StoredAttempt, List[Tuple[int, int, bool]]]]:
+        """
+        Recorre todos los intentos (en orden de ID, a partir de ``after_id``)
+        con sus respuestas (ID de pregunta, respuesta, correcta), por páginas
+        de ``page_size`` intentos: la memoria no depende del tamaño del
+        historial y la conexión vuelve al pool entre páginas
+        """
+        last_id = after_id
+        while True:
+            with self.connection() as connection:
+                page = [StoredAttempt(*row) for row in
+                        connection.execute(_SELECT_PAGE, (last_id, since, page_size))]
+                if not page:
+                    return
+                answers: Dict[int, List[Tuple[int, int, bool]]] = {}
+                for attempt_id, qid, answer, is_correct in connection.execute(
+                        _SELECT_PAGE_ANSWERS, (page[0].id, page[-1].id)):
+                    answers.setdefault(attempt_id, []).append((qid, answer, bool(is_correct)))
+            for attempt in page:
+                yield attempt, answers.get(attempt.id, [])
+            last_id = page[-1].id
+
+    def _query(self, sql: str, params: tuple) -> List[StoredAttempt]:
+        with self.connection() as connection:
+            return [StoredAttempt(*row) for row in connection.execute(sql, params)]
+
+    def close(self):
+        """Cierra todas las conexiones del pool"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+@lru_cache(maxsize=None)
+def get_attempt_store(path: Optional[str] = None) -> AttemptStore:
+    """
+    Devuelve el almacén de intentos del proceso, compartido por todas las sesiones
+    """
+    return AttemptStore(path or os.environ.get('EXANI_DB_PATH', DEFAULT_DB_PATH))
@@ -0,0 +1,263 @@
+"""
+Generador de formas por lotes
+=============================
+Genera miles de formas de examen sin Streamlit, con los mismos tipos de
+simulacro y la misma lógica de muestreo que la aplicación, y las escribe en
+NDJSON o CSV junto con su clave de respuestas.
+
+Las formas se construyen en paralelo en un pool de procesos. Cada proceso
+carga el banco una vez; el proceso principal mantiene un número acotado de
+lotes en vuelo y escribe los resultados en orden conforme llegan, así que la
+memoria no depende del número de formas.
+
+Uso::
+
+    python -m exani.batch_forms completo 5000 -o formas.ndjson
+    python -m exani.batch_forms transversales 2000 --format csv --shuffle-options -o formas.csv
+
+Con ``--strict`` un módulo sin preguntas suficientes para su cuota detiene
+la generación en lugar de completar con otros módulos. Los reactivos
+marcados por el análisis de reactivos quedan fuera de las formas salvo con
+``--include-flagged``.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import secrets
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, FrozenSet, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from exani.exam_forms import (
+    EXAM_MODES, ExamForm, InsufficientQuestionsError, build_form, module_quotas, new_form_spec
+)
+from exani.item_analysis import flagged_items
+from exani.question_bank import QuestionBank, get_bank_loader
+
+# Formas por lote enviado a cada proceso
+DEFAULT_BATCH_SIZE = 250
+
+# Multiplicador impar: i → base + i·K (mod 2³²) da semillas distintas para cada forma
+_SEED_STEP = 0x9E3779B1
+
+CSV_HEADER = ('form', 'code', 'question_count', 'question_ids', 'answer_key')
+
+
+class BatchConfig(NamedTuple):
+    """Parámetros compartidos por todos los lotes (se envían a cada proceso)"""
+    bank_dir: Optional[str]
+    modules: Tuple[str, ...]
+    question_count: int
+    shuffle_options: bool
+    output_format: str
+    bank_version: str
+    strict: bool = False
+    exclude: FrozenSet[int] = frozenset()
+
+
+def form_seed(base_seed: int, index: int) -> int:
+    """Semilla de la forma ``index``; distinta para cada índice menor que 2³²"""
+    return (base_seed + index * _SEED_STEP) & 0xFFFFFFFF
+
+
+def answer_key(bank: QuestionBank, form: ExamForm) -> str:
+    """Letra correcta de cada pregunta en el orden en que se muestran las opciones"""
+    letters = []
+    for i, qid in enumerate(form.question_ids):
+        question = bank[qid]
+        order = list(form.option_order(i, len(question.options)))
+        letters.append(chr(ord('A') + order.index(question.correct)))
+    return ''.join(letters)
+
+
+def format_form(bank: QuestionBank, form: ExamForm, number: int, mode: str, output_format: str) -> str:
+    """Serializa una forma como una línea NDJSON o un renglón CSV"""
+    key = answer_key(bank, form)
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow(
+            (number, form.code, len(form.question_ids), ' '.join(map(str, form.question_ids)), key)
+        )
+        return buffer.getvalue()
+
+    questions = []
+    for i, qid in enumerate(form.question_ids):
+        question = bank[qid]
+        questions.append({
+            'id': qid,
+            'module': question.module,
+            'area': question.area,
+            'options': list(form.option_order(i, len(question.options))),
+            'answer': key[i]
+        })
+    record = {
+        'form': number,
+        'code': form.code,
+        'mode': mode,
+        'bank_version': bank.version,
+        'answer_key': key,
+        'questions': questions
+    }
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+# Banco cargado por cada proceso del pool (una vez por proceso)
+_worker_bank: Optional[QuestionBank] = None
+
+
+def _load_bank(config: BatchConfig) -> QuestionBank:
+    bank = get_bank_loader(config.bank_dir).get_bank(config.modules)
+    if bank.version != config.bank_version:
+        raise RuntimeError(
+            f"El banco cambió durante la generación ({config.bank_version} → {bank.version})"
+        )
+    return bank
+
+
+def _init_worker(config: BatchConfig):
+    global _worker_bank
+    _worker_bank = _load_bank(config)
+
+
+def build_batch(config: BatchConfig, mode: str, base_seed: int, start: int, count: int,
+                bank: Optional[QuestionBank] = None) -> str:
+    """Construye y serializa las formas ``start`` … ``start + count - 1``"""
+    if bank is None:
+        bank = _worker_bank if _worker_bank is not None else _load_bank(config)
+    lines = []
+    for index in range(start, start + count):
+        spec = new_form_spec(bank, config.modules, config.question_count,
+                             config.shuffle_options, form_seed(base_seed, index), config.exclude)
+        form = build_form(bank, spec, strict=config.strict)
+        lines.append(format_form(bank, form, index + 1, mode, config.output_format))
+    return ''.join(lines)
+
+
+def _batches(total: int, batch_size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+def generate_forms(output: TextIO, mode: str, total: int, config: BatchConfig, base_seed: int,
+                   workers: int = 0, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Escribe ``total`` formas en ``output`` y devuelve cuántas se escribieron
+    Con ``workers=0`` todo corre en el proceso actual
+    """
+    if config.output_format == 'csv':
+        csv.writer(output, lineterminator='\n').writerow(CSV_HEADER)
+
+    if workers <= 0:
+        bank = _load_bank(config)
+        for start, count in _batches(total, batch_size):
+            output.write(build_batch(config, mode, base_seed, start, count, bank))
+        return total
+
+    # Ventana acotada de lotes en vuelo: la memoria no crece con ``total``
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(config,)) as pool:
+        pending: Deque[Future] = deque()
+        for start, count in _batches(total, batch_size):
+            if len(pending) >= workers * 2:
+                output.write(pending.popleft().result())
+            pending.append(pool.submit(build_batch, config, mode, base_seed, start, count))
+        while pending:
+            output.write(pending.popleft().result())
+    return total
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m exani.batch_forms',
+        description='Genera formas de examen EXANI-II por lotes con su clave de respuestas'
+    )
+    parser.add_argument('mode', choices=sorted(EXAM_MODES), help='tipo de simulacro')
+    parser.add_argument('count', type=int, help='número de formas a generar')
+    parser.add_argument('-o', '--output', default='-', help='archivo de salida (por defecto stdout)')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default=None,
+                        help='formato de salida (por defecto según la extensión, o ndjson)')
+    parser.add_argument('--questions', type=int, default=None,
+                        help='preguntas por forma (por defecto las del tipo de simulacro)')
+    parser.add_argument('--shuffle-options', action='store_true', help='mezclar el orden de las opciones')
+    parser.add_argument('--strict', action='store_true',
+                        help='fallar si algún módulo no alcanza su cuota (en lugar de completar con otros)')
+    parser.add_argument('--include-flagged', action='store_true',
+                        help='no excluir los reactivos marcados por el análisis de reactivos')
+    parser.add_argument('--stats', default=None,
+                        help='metadatos del análisis de reactivos (por defecto EXANI_ITEM_STATS)')
+    parser.add_argument('--seed', type=int, default=None, help='semilla base para resultados reproducibles')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='procesos en paralelo (0 = sin pool)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='formas por lote')
+    parser.add_argument('--bank-dir', default=None, help='directorio de banco (por defecto EXANI_BANK_DIR)')
+    args = parser.parse_args(argv)
+    if args.count < 0:
+        parser.error('count debe ser mayor o igual a cero')
+    if args.questions is not None and not 0 < args.questions <= 255:
+        parser.error('--questions debe estar entre 1 y 255')
+    if args.batch_size <= 0:
+        parser.error('--batch-size debe ser mayor que cero')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    exam_mode = EXAM_MODES[args.mode]
+    question_count = args.questions or exam_mode.question_count
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'ndjson')
+
+    loader = get_bank_loader(args.bank_dir)
+    bank = loader.get_bank(exam_mode.modules)
+    errors = loader.errors(exam_mode.modules)
+    for message in errors.values():
+        print(f"❌ {message}", file=sys.stderr)
+    if errors:
+        return 1
+    if not len(bank):
+        print(f"❌ No hay preguntas para los módulos de '{args.mode}'", file=sys.stderr)
+        return 1
+
+    exclude = frozenset() if args.include_flagged else frozenset(
+        qid for qid in flagged_items(args.stats) if qid in bank)
+    if exclude:
+        print(f"🚩 {len(exclude)} reactivos marcados quedan fuera de las formas", file=sys.stderr)
+
+    # Los faltantes son iguales para todas las formas: se reportan una vez
+    shortfalls = {}
+    for module, quota in module_quotas(question_count, exam_mode.modules).items():
+        available = sum(1 for qid in bank.module_ids(module) if qid not in exclude)
+        if quota > available:
+            shortfalls[module] = (quota, available)
+    if shortfalls and args.strict:
+        print(f"❌ {InsufficientQuestionsError(shortfalls)}", file=sys.stderr)
+        return 1
+    for module, (quota, available) in shortfalls.items():
+        print(f"⚠️ {module}: se piden {quota} preguntas y el banco tiene {available}", file=sys.stderr)
+
+    config = BatchConfig(args.bank_dir, exam_mode.modules, question_count,
+                         args.shuffle_options, output_format, bank.version, args.strict, exclude)
+    base_seed = secrets.randbits(32) if args.seed is None else args.seed & 0xFFFFFFFF
+
+    started = time.perf_counter()
+    if args.output == '-':
+        written = generate_forms(sys.stdout, args.mode, args.count, config, base_seed,
+                                 args.workers, args.batch_size)
+    else:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            written = generate_forms(output, args.mode, args.count, config, base_seed,
+                                     args.workers, args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    rate = written / elapsed if elapsed > 0 else float('inf')
+    print(f"✅ {written} formas en {elapsed:.2f} s ({rate:,.0f} formas/s, semilla base {base_seed})",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
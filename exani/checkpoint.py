@@ -0,0 +1,87 @@
+"""
+Puntos de control de exámenes en curso
+======================================
+Un examen en curso se puede reconstruir con muy poco: el código de forma
+(que ya determina preguntas y orden de opciones), el arreglo empaquetado de
+respuestas, la pregunta actual y la hora límite absoluta. El punto de
+control guarda sólo eso en un blob binario de unos cientos de bytes,
+identificado por un token aleatorio con el que la sesión se reanuda después
+de recargar la página o reiniciar el servidor.
+"""
+
+import secrets
+import struct
+from array import array
+from typing import NamedTuple
+
+from exani.exam_forms import decode_form_code
+
+# Versión del formato binario
+CHECKPOINT_VERSION = 1
+
+# versión, índice actual, límite de tiempo (min), inicio y hora límite (epoch)
+_HEADER = struct.Struct('<BHHdd')
+
+
+class InvalidCheckpointError(ValueError):
+    """Punto de control ilegible o de un formato desconocido"""
+
+
+class Checkpoint(NamedTuple):
+    """Estado mínimo para reanudar un examen"""
+    form_code: str
+    exam_type: str
+    user_id: str
+    time_limit: int  # minutos
+    current_index: int
+    started_at: float  # epoch
+    deadline: float  # epoch
+    answers: array  # array('b'), UNANSWERED = sin responder
+
+
+def new_token() -> str:
+    """Token aleatorio para reanudar un examen (también identifica la sesión)"""
+    return secrets.token_urlsafe(16)
+
+
+def _pack_text(text: str) -> bytes:
+    # Se corta en 255 bytes sin partir un carácter multibyte
+    data = text.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+    return bytes((len(data),)) + data
+
+
+def encode_checkpoint(checkpoint: Checkpoint) -> bytes:
+    """Serializa el punto de control (≈ 60 bytes + 1 byte por pregunta)"""
+    return b''.join((
+        _HEADER.pack(CHECKPOINT_VERSION, checkpoint.current_index, checkpoint.time_limit,
+                     checkpoint.started_at, checkpoint.deadline),
+        _pack_text(checkpoint.form_code.replace('-', '')),
+        _pack_text(checkpoint.exam_type),
+        _pack_text(checkpoint.user_id),
+        checkpoint.answers.tobytes()
+    ))
+
+
+def decode_checkpoint(data: bytes) -> Checkpoint:
+    """Reconstruye el punto de control; valida el código de forma"""
+    try:
+        version, current_index, time_limit, started_at, deadline = _HEADER.unpack_from(data)
+        if version != CHECKPOINT_VERSION:
+            raise InvalidCheckpointError(f"Versión de punto de control desconocida: {version}")
+        offset = _HEADER.size
+        texts = []
+        for _ in range(3):
+            length = data[offset]
+            texts.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+            offset += 1 + length
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise InvalidCheckpointError("Punto de control ilegible") from e
+
+    compact_code, exam_type, user_id = texts
+    form_code = '-'.join(compact_code[i:i + 4] for i in range(0, len(compact_code), 4))
+    spec = decode_form_code(form_code)
+    answers = array('b', data[offset:])
+    if len(answers) > spec.question_count or current_index >= max(len(answers), 1):
+        raise InvalidCheckpointError("Punto de control inconsistente con su forma")
+    return Checkpoint(form_code, exam_type, user_id, time_limit, current_index,
+                      started_at, deadline, answers)
@@ -0,0 +1,390 @@
+"""
+Generación de exámenes
+======================
+Muestreo estratificado por módulo, sin reemplazo: cada módulo aporta su
+cuota de preguntas distintas y el residuo del reparto se distribuye entre
+los primeros módulos. El costo es O(largo del examen) usando los índices
+por módulo precalculados del banco, sin copiar las listas de cada módulo.
+
+Un examen ("forma") es una función pura de (versión del banco,
+configuración, semilla) y se identifica con un código corto del estilo
+``ABCD-EFGH-JKLM-NOPQ``. Cualquier proceso con la misma versión del banco
+reconstruye a partir del código el mismo orden de preguntas y de opciones.
+
+Las formas nuevas pueden excluir reactivos (los marcados por el análisis de
+reactivos). La lista usada se guarda con su huella en la base del historial
+(``EXANI_DB_PATH``, compartida por todos los procesos) y el código lleva esa
+huella, así que la forma se sigue reconstruyendo igual aunque después cambien
+los reactivos marcados. Los códigos sin exclusión no cambian.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AbstractSet, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from exani.attempt_store import get_attempt_store
+from exani.question_bank import Question, QuestionBank
+
+logger = logging.getLogger(__name__)
+
+# Registro de módulos para los códigos de forma. El orden define el bit de
+# cada módulo: sólo se agregan módulos al final, nunca se reordenan.
+FORM_MODULES = (
+    'pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta',
+    'biologia', 'fisica', 'quimica', 'historia', 'literatura'
+)
+
+
+class ExamMode(NamedTuple):
+    """Configuración predefinida de un tipo de simulacro"""
+    question_count: int
+    time_limit: int  # minutos
+    modules: Tuple[str, ...]
+
+
+# Tipos de simulacro (los usan la aplicación y el generador por lotes)
+EXAM_MODES: Dict[str, ExamMode] = {
+    'transversales': ExamMode(90, 180, ('pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta')),
+    'disciplinares': ExamMode(48, 120, ('biologia', 'fisica', 'quimica')),
+    'completo': ExamMode(138, 270, ('pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta',
+                                    'biologia', 'fisica')),
+    'ingles': ExamMode(30, 30, ('literatura',))
+}
+
+# Versión del formato del código de forma
+FORM_CODE_VERSION = 1
+
+# Formas reconstruidas que se conservan por versión del banco; debe cubrir las
+# sesiones simultáneas con formas distintas (EXANI_FORM_CACHE_SIZE)
+FORM_CACHE_SIZE = int(os.environ.get('EXANI_FORM_CACHE_SIZE', '2048') or 2048)
+
+# Prefijo "A) " de las opciones en el banco
+_OPTION_PREFIX = re.compile(r'^[A-Z]\)\s*')
+
+
+class InsufficientQuestionsError(ValueError):
+    """El banco no tiene suficientes preguntas para las cuotas pedidas"""
+
+    def __init__(self, shortfalls: Mapping[str, Tuple[int, int]]):
+        self.shortfalls = dict(shortfalls)
+        detail = ', '.join(f"{module}: se piden {quota}, hay {available}"
+                           for module, (quota, available) in self.shortfalls.items())
+        super().__init__(f"Preguntas insuficientes en el banco ({detail})")
+
+
+class SampleResult(NamedTuple):
+    """Preguntas elegidas y módulos que no alcanzaron su cuota"""
+    question_ids: List[int]
+    # módulo → (cuota pedida, preguntas disponibles)
+    shortfalls: Dict[str, Tuple[int, int]]
+
+
+def module_quotas(total: int, modules: Sequence[str]) -> Dict[str, int]:
+    """
+    Reparte ``total`` preguntas entre los módulos en partes iguales; el
+    residuo se asigna, una pregunta cada uno, a los primeros módulos
+    """
+    if not modules:
+        return {}
+    base, remainder = divmod(total, len(modules))
+    return {module: base + (1 if i < remainder else 0) for i, module in enumerate(modules)}
+
+
+def _draw(pool: Sequence[int], count: int, excluded: int, exclude: AbstractSet[int],
+          rng: random.Random) -> List[int]:
+    """``count`` IDs distintos de ``pool`` que no estén en ``exclude``"""
+    if not excluded:
+        # random.sample sobre un range es O(k) y no copia el módulo
+        return [pool[i] for i in rng.sample(range(len(pool)), count)]
+    if 2 * (count + excluded) > len(pool):
+        # Se pide casi todo el módulo: es más barato filtrarlo que redibujar
+        candidates = [qid for qid in pool if qid not in exclude]
+        return [candidates[i] for i in rng.sample(range(len(candidates)), count)]
+    # Se sortean posiciones y se vuelve a sortear cada una excluida o repetida
+    chosen: List[int] = []
+    seen = set()
+    while len(chosen) < count:
+        i = rng.randrange(len(pool))
+        if i not in seen:
+            seen.add(i)
+            if pool[i] not in exclude:
+                chosen.append(pool[i])
+    return chosen
+
+
+def sample_questions(bank: QuestionBank,
+                     modules: Sequence[str],
+                     total: int,
+                     rng: random.Random,
+                     quotas: Optional[Mapping[str, int]] = None,
+                     strict: bool = False,
+                     exclude: AbstractSet[int] = frozenset()) -> SampleResult:
+    """
+    Elige preguntas sin reemplazo respetando la cuota de cada módulo
+
+    Si un módulo no alcanza su cuota, el faltante se cubre con módulos que
+    tengan preguntas de sobra y el módulo se reporta en ``shortfalls``. Si
+    aun así no se completa el total, el examen resulta más corto. Con
+    ``strict=True`` cualquier faltante lanza InsufficientQuestionsError.
+    ``exclude`` deja fuera reactivos (p. ej. los marcados por el análisis de
+    reactivos) sin copiar los módulos: los excluidos que salen en el sorteo
+    se vuelven a sortear.
+    """
+    modules = list(dict.fromkeys(modules))
+    if quotas is None:
+        quotas = module_quotas(total, modules)
+
+    pools = {module: bank.module_ids(module) for module in modules}
+    excluded = dict.fromkeys(modules, 0)
+    for qid in exclude:
+        if qid in bank and bank[qid].module in excluded:
+            excluded[bank[qid].module] += 1
+    available = {module: len(pools[module]) - excluded[module] for module in modules}
+    shortfalls = {module: (quotas.get(module, 0), available[module]) for module in modules
+                  if quotas.get(module, 0) > available[module]}
+    if shortfalls and strict:
+        raise InsufficientQuestionsError(shortfalls)
+
+    take = {module: min(quotas.get(module, 0), available[module]) for module in modules}
+
+    # Redistribuir el faltante entre los módulos con preguntas de sobra
+    missing = sum(quotas.get(module, 0) for module in modules) - sum(take.values())
+    while missing > 0:
+        spare = [module for module in modules if take[module] < available[module]]
+        if not spare:
+            break
+        for module in spare[:missing]:
+            take[module] += 1
+            missing -= 1
+
+    question_ids: List[int] = []
+    for module in modules:
+        question_ids.extend(_draw(pools[module], take[module], excluded[module], exclude, rng))
+
+    rng.shuffle(question_ids)
+    return SampleResult(question_ids, shortfalls)
+
+
+class InvalidFormCodeError(ValueError):
+    """Código de forma mal escrito o de un formato desconocido"""
+
+
+class FormBankMismatchError(ValueError):
+    """La forma se generó con otra versión del banco de preguntas"""
+
+
+class FormSpec(NamedTuple):
+    """Todo lo necesario para reconstruir una forma (lo que codifica el código)"""
+    modules: Tuple[str, ...]
+    question_count: int
+    seed: int
+    shuffle_options: bool
+    bank_check: int  # con exclusión, huella de la lista de exclusión guardada
+    excludes_items: bool = False
+
+
+class ExamForm(NamedTuple):
+    """Forma de examen reconstruida: preguntas y orden de opciones"""
+    code: str
+    spec: FormSpec
+    question_ids: Tuple[int, ...]
+    # Permutación de opciones por pregunta (None = orden del banco)
+    option_orders: Optional[Tuple[Tuple[int, ...], ...]]
+    shortfalls: Dict[str, Tuple[int, int]]
+
+    def option_order(self, index: int, option_count: int) -> Sequence[int]:
+        """Orden en que se muestran las opciones de la pregunta ``index``"""
+        if self.option_orders is None:
+            return range(option_count)
+        return self.option_orders[index]
+
+
+def bank_check(bank: QuestionBank) -> int:
+    """Huella de 16 bits de la versión del banco que se guarda en el código"""
+    return int(bank.version[:4] or '0', 16)
+
+
+@lru_cache(maxsize=64)
+def save_exclusion(bank_version: str, exclude: FrozenSet[int]) -> Optional[int]:
+    """
+    Guarda (una vez por proceso) la lista de exclusión de una versión del
+    banco y devuelve su huella de 16 bits; None si la huella ya la usa otra lista
+    """
+    qids = sorted(exclude)
+    digest = hashlib.blake2b(f"{bank_version}:{qids}".encode('ascii'), digest_size=2).digest()
+    check = int.from_bytes(digest, 'big')
+    if not get_attempt_store().save_exclusion(bank_version, check, exclude):
+        logger.warning("La huella %04x ya corresponde a otra lista de exclusión; la forma no excluye reactivos",
+                       check)
+        return None
+    return check
+
+
+@lru_cache(maxsize=64)
+def load_exclusion(bank_version: str, check: int) -> FrozenSet[int]:
+    """Lista de exclusión de una forma; FormBankMismatchError si no existe"""
+    exclude = get_attempt_store().load_exclusion(bank_version, check)
+    if exclude is None:
+        raise FormBankMismatchError(
+            "La forma se generó con otra versión del banco de preguntas o falta su lista de exclusión"
+        )
+    return exclude
+
+
+def new_form_spec(bank: QuestionBank,
+                  modules: Sequence[str],
+                  question_count: int,
+                  shuffle_options: bool = False,
+                  seed: Optional[int] = None,
+                  exclude: AbstractSet[int] = frozenset()) -> FormSpec:
+    """
+    Crea la especificación de una forma nueva (semilla aleatoria si no se da)
+    ``exclude`` deja fuera esos reactivos; la lista queda guardada para
+    reconstruir la forma a partir de su código
+    """
+    unknown = [module for module in modules if module not in FORM_MODULES]
+    if unknown:
+        raise ValueError(f"Módulos sin código de forma: {', '.join(unknown)}")
+    ordered = tuple(module for module in FORM_MODULES if module in modules)
+    exclude = frozenset(qid for qid in exclude if qid in bank and bank[qid].module in ordered)
+    check = None
+    if exclude:
+        try:
+            check = save_exclusion(bank.version, exclude)
+        except sqlite3.Error:
+            logger.exception("No se pudo guardar la lista de exclusión; la forma no excluye reactivos")
+    return FormSpec(
+        modules=ordered,
+        question_count=question_count,
+        seed=secrets.randbits(32) if seed is None else seed & 0xFFFFFFFF,
+        shuffle_options=shuffle_options,
+        bank_check=bank_check(bank) if check is None else check,
+        excludes_items=check is not None
+    )
+
+
+def encode_form_code(spec: FormSpec) -> str:
+    """Codifica la especificación en un código corto (16 caracteres base32)"""
+    if not 0 < spec.question_count <= 0xFF:
+        raise ValueError(f"Número de preguntas fuera de rango: {spec.question_count}")
+    mask = 0
+    for module in spec.modules:
+        mask |= 1 << FORM_MODULES.index(module)
+    header = FORM_CODE_VERSION << 4 | (2 if spec.excludes_items else 0) | (1 if spec.shuffle_options else 0)
+    payload = (header.to_bytes(1, 'big') + spec.seed.to_bytes(4, 'big') +
+               spec.question_count.to_bytes(1, 'big') + mask.to_bytes(2, 'big') +
+               spec.bank_check.to_bytes(2, 'big'))
+    code = base64.b32encode(payload).decode('ascii')
+    return '-'.join(code[i:i + 4] for i in range(0, len(code), 4))
+
+
+def decode_form_code(code: str) -> FormSpec:
+    """Decodifica un código de forma (acepta minúsculas, espacios y guiones)"""
+    compact = re.sub(r'[\s-]', '', code).upper()
+    try:
+        payload = base64.b32decode(compact)
+    except ValueError as e:
+        raise InvalidFormCodeError(f"Código de forma inválido: {code}") from e
+    if len(payload) != 10 or payload[0] >> 4 != FORM_CODE_VERSION:
+        raise InvalidFormCodeError(f"Código de forma inválido: {code}")
+
+    mask = int.from_bytes(payload[6:8], 'big')
+    modules = tuple(module for i, module in enumerate(FORM_MODULES) if mask >> i & 1)
+    question_count = payload[5]
+    if not modules or not question_count:
+        raise InvalidFormCodeError(f"Código de forma inválido: {code}")
+    return FormSpec(
+        modules=modules,
+        question_count=question_count,
+        seed=int.from_bytes(payload[1:5], 'big'),
+        shuffle_options=bool(payload[0] & 1),
+        bank_check=int.from_bytes(payload[8:10], 'big'),
+        excludes_items=bool(payload[0] & 2)
+    )
+
+
+def build_form(bank: QuestionBank, spec: FormSpec, strict: bool = False) -> ExamForm:
+    """
+    Construye la forma: función pura de (banco, especificación)
+    Lanza FormBankMismatchError si el banco no es la versión de la forma y,
+    con ``strict=True``, InsufficientQuestionsError si algún módulo no
+    alcanza su cuota
+    """
+    if spec.excludes_items:
+        exclude = load_exclusion(bank.version, spec.bank_check)
+    elif spec.bank_check != bank_check(bank):
+        raise FormBankMismatchError(
+            "La forma se generó con otra versión del banco de preguntas"
+        )
+    else:
+        exclude = frozenset()
+    rng = random.Random(spec.seed)
+    result = sample_questions(bank, spec.modules, spec.question_count, rng, strict=strict, exclude=exclude)
+
+    option_orders = None
+    if spec.shuffle_options:
+        option_orders = tuple(
+            tuple(rng.sample(range(len(bank[qid].options)), len(bank[qid].options)))
+            for qid in result.question_ids
+        )
+    return ExamForm(
+        code=encode_form_code(spec),
+        spec=spec,
+        question_ids=tuple(result.question_ids),
+        option_orders=option_orders,
+        shortfalls=result.shortfalls
+    )
+
+
+# Caché por banco: al recargarse el banco, las formas de la versión anterior
+# se liberan junto con él cuando ninguna sesión lo usa
+_form_cache: 'weakref.WeakKeyDictionary[QuestionBank, OrderedDict[str, ExamForm]]' = weakref.WeakKeyDictionary()
+_form_cache_lock = threading.Lock()
+
+
+def get_form(bank: QuestionBank, code: str) -> ExamForm:
+    """
+    Forma reconstruida a partir de su código, cacheada y compartida entre
+    todas las sesiones que usan el mismo código con la misma versión del banco
+    """
+    with _form_cache_lock:
+        forms = _form_cache.get(bank)
+        if forms is None:
+            forms = _form_cache[bank] = OrderedDict()
+        form = forms.get(code)
+        if form is not None:
+            forms.move_to_end(code)
+            return form
+    # Se construye fuera del lock; dos sesiones con el mismo código nuevo a lo
+    # sumo la construyen dos veces
+    form = build_form(bank, decode_form_code(code))
+    with _form_cache_lock:
+        forms[code] = form
+        if len(forms) > FORM_CACHE_SIZE:
+            forms.popitem(last=False)
+    return form
+
+
+def option_label(position: int, option: str) -> str:
+    """Texto de la opción con la letra de la posición en que se muestra"""
+    return f"{chr(ord('A') + position)}) {_OPTION_PREFIX.sub('', option, count=1)}"
+
+
+def display_options(form: ExamForm, index: int, question: Question) -> List[Tuple[int, str]]:
+    """
+    Opciones de la pregunta ``index`` en el orden de la forma, como pares
+    (índice original de la opción, texto con la letra de su posición)
+    """
+    order = form.option_order(index, len(question.options))
+    return [(original, option_label(position, question.options[original]))
+            for position, original in enumerate(order)]
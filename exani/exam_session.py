@@ -0,0 +1,133 @@
+"""
+Operaciones del examen en curso
+===============================
+Lo que hace la aplicación al generar un examen, registrar una respuesta,
+mostrar las estadísticas y terminar el examen, sin Streamlit: la
+aplicación guarda los resultados en ``st.session_state`` y los
+micro-benchmarks llaman a estas mismas funciones.
+
+NumPy (calificación) se importa al terminar el examen, no al importar este
+módulo: el panel inicial no lo necesita.
+"""
+
+from array import array
+from datetime import datetime, timedelta
+from typing import AbstractSet, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from exani.attempt_store import AttemptRecord
+from exani.exam_forms import ExamForm, encode_form_code, get_form, new_form_spec
+from exani.exam_state import UNANSWERED, ExamStats, ReviewIndex
+from exani.question_bank import Question, QuestionBank
+
+
+def sampling_warnings(form: ExamForm, question_count: int) -> List[str]:
+    """Avisos de los módulos que no alcanzaron su cuota y del examen incompleto"""
+    warnings = [
+        f"⚠️ {module.replace('_', ' ').title()}: se pidieron {quota} preguntas y el banco tiene {available} disponibles"
+        for module, (quota, available) in form.shortfalls.items()
+    ]
+    if form.question_ids and len(form.question_ids) < question_count:
+        warnings.append(f"⚠️ El examen tendrá {len(form.question_ids)} preguntas "
+                        f"en lugar de {question_count} (sin repetir preguntas)")
+    return warnings
+
+
+def generate_form(bank: QuestionBank,
+                  modules: Sequence[str],
+                  question_count: int,
+                  shuffle_options: bool = False,
+                  form_code: Optional[str] = None,
+                  seed: Optional[int] = None,
+                  exclude: AbstractSet[int] = frozenset()) -> Tuple[ExamForm, List[str]]:
+    """
+    Forma nueva (semilla aleatoria si no se da) o la del código indicado,
+    con sus avisos de muestreo; la forma se cachea por código
+    """
+    if not form_code:
+        spec = new_form_spec(bank, modules, question_count, shuffle_options, seed, exclude)
+        form_code = encode_form_code(spec)
+    form = get_form(bank, form_code)
+    return form, sampling_warnings(form, question_count)
+
+
+def record_answer(stats: ExamStats, answers: array, answered: int,
+                  index: int, question: Question, option: int) -> int:
+    """
+    Guarda la respuesta de la pregunta ``index`` (``UNANSWERED`` la borra),
+    actualiza el acumulador en O(1) y devuelve el nuevo mapa de respondidas
+    """
+    old_answer = answers[index]
+    answers[index] = option
+    stats.record(question, old_answer, option)
+    if option == UNANSWERED:
+        return answered & ~(1 << index)
+    return answered | 1 << index
+
+
+def current_stats(stats: ExamStats, questions: Optional[Iterable[Question]] = None,
+                  answers: Optional[Iterable[int]] = None) -> Tuple[int, int, int]:
+    """
+    (correctas, incorrectas, sin responder) desde el acumulador; con
+    ``questions`` y ``answers`` antes lo verifica contra un recálculo
+    """
+    if questions is not None:
+        stats.verify(questions, answers)
+    return stats.as_tuple()
+
+
+class FinishedExam(NamedTuple):
+    """Resultado de terminar un examen"""
+    results: Dict  # resumen para la pantalla de resultados y la exportación
+    record: AttemptRecord  # intento para el historial
+    review: ReviewIndex
+
+
+def finish_exam(questions: Sequence[Question], answers: array, *,
+                exam_type: str, modules: Sequence[str], form_code: str, bank_version: str,
+                user_id: str, started_at: Optional[datetime], session_id: Optional[str] = None,
+                finished_at: Optional[datetime] = None, stats: Optional[ExamStats] = None) -> FinishedExam:
+    """
+    Califica el examen, arma el resumen de resultados, el intento para el
+    historial y el índice de revisión. Con ``stats`` verifica que la
+    calificación coincida con el acumulador (modo depuración)
+    """
+    # Mismo motor que la calificación masiva
+    from exani.grading import grade_answers
+    grade = grade_answers(questions, answers)
+    correct, wrong, skipped = int(grade.correct[0]), int(grade.wrong[0]), int(grade.skipped[0])
+    score = int(grade.score[0])
+    if stats is not None and (correct, wrong, skipped) != current_stats(stats, questions, answers):
+        raise AssertionError(f"Calificación inconsistente con el acumulador: {(correct, wrong, skipped)}")
+
+    finished_at = finished_at or datetime.now()
+    results = {
+        'score': score,
+        'correct': correct,
+        'wrong': wrong,
+        'skipped': skipped,
+        'total_questions': len(questions),
+        'exam_type': exam_type,
+        'modules': modules,
+        'form_code': form_code,
+        'areas': grade.area_summary(),
+        'duration': finished_at - started_at if started_at else timedelta(0),
+        'date': finished_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    record = AttemptRecord(
+        user_id=user_id,
+        exam_type=exam_type,
+        form_code=form_code,
+        bank_version=bank_version,
+        started_at=started_at.timestamp() if started_at else None,
+        finished_at=finished_at.timestamp(),
+        score=score,
+        correct=correct,
+        wrong=wrong,
+        skipped=skipped,
+        question_ids=tuple(question.qid for question in questions),
+        answers=answers,
+        correct_options=[question.correct for question in questions],
+        session_id=session_id
+    )
+    # Índices de revisión por estado y área (una sola pasada)
+    return FinishedExam(results, record, ReviewIndex(questions, answers))
@@ -0,0 +1,156 @@
+"""
+Estado compacto del examen por sesión
+=====================================
+Cada sesión guarda sólo el código de su forma (las preguntas se reconstruyen
+a partir de él) y sus respuestas como un arreglo de enteros de 8 bits
+(``array('b')``) donde ``UNANSWERED`` marca las preguntas sin responder. El
+contenido de las preguntas se resuelve contra el banco compartido al
+renderizar.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from exani.question_bank import Question
+
+# Valor centinela para "sin responder" en el arreglo de respuestas
+UNANSWERED = -1
+
+
+def new_answer_array(length: int) -> array:
+    """Crea el arreglo de respuestas con todas las preguntas sin responder"""
+    return array('b', [UNANSWERED]) * length
+
+
+def answer_value(answer: int) -> Optional[int]:
+    """Convierte una respuesta empaquetada a índice de opción o None"""
+    return None if answer == UNANSWERED else answer
+
+
+def answered_mask(answers: Iterable[int]) -> int:
+    """Mapa de bits de preguntas respondidas (bit i = pregunta i respondida)"""
+    mask = 0
+    for i, answer in enumerate(answers):
+        if answer != UNANSWERED:
+            mask |= 1 << i
+    return mask
+
+
+class ExamStats:
+    """
+    Acumulador de estadísticas del examen
+    Se actualiza en O(1) cada vez que se responde o cambia una respuesta,
+    en lugar de recorrer todas las respuestas en cada rerun.
+    """
+
+    __slots__ = ('total', 'answered', 'correct', 'areas')
+
+    def __init__(self):
+        self.total = 0
+        self.answered = 0
+        self.correct = 0
+        # Por área: [total, respondidas, correctas]
+        self.areas: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_answers(cls, questions: Iterable[Question], answers: Iterable[int]) -> 'ExamStats':
+        """Construye el acumulador recorriendo todas las respuestas (O(n))"""
+        stats = cls()
+        for question, answer in zip(questions, answers):
+            stats.total += 1
+            tally = stats.areas.setdefault(question.area, [0, 0, 0])
+            tally[0] += 1
+            if answer != UNANSWERED:
+                stats.answered += 1
+                tally[1] += 1
+                if answer == question.correct:
+                    stats.correct += 1
+                    tally[2] += 1
+        return stats
+
+    @property
+    def wrong(self) -> int:
+        return self.answered - self.correct
+
+    @property
+    def skipped(self) -> int:
+        return self.total - self.answered
+
+    def record(self, question: Question, old_answer: int, new_answer: int):
+        """Actualiza los contadores al cambiar la respuesta de una pregunta"""
+        tally = self.areas[question.area]
+        if old_answer != UNANSWERED:
+            self.answered -= 1
+            tally[1] -= 1
+            if old_answer == question.correct:
+                self.correct -= 1
+                tally[2] -= 1
+        if new_answer != UNANSWERED:
+            self.answered += 1
+            tally[1] += 1
+            if new_answer == question.correct:
+                self.correct += 1
+                tally[2] += 1
+
+    def as_tuple(self) -> Tuple[int, int, int]:
+        """(correctas, incorrectas, sin responder)"""
+        return self.correct, self.wrong, self.skipped
+
+    def area_summary(self) -> Dict[str, Dict[str, int]]:
+        """Resumen por área: total, respondidas y correctas"""
+        return {area: {'total': total, 'answered': answered, 'correct': correct}
+                for area, (total, answered, correct) in self.areas.items()}
+
+    def verify(self, questions: Iterable[Question], answers: Iterable[int]):
+        """
+        Compara el acumulador contra un recálculo completo
+        Lanza AssertionError si no coinciden (sólo para modo depuración)
+        """
+        expected = ExamStats.from_answers(questions, answers)
+        if (self.total, self.answered, self.correct, self.areas) != \
+                (expected.total, expected.answered, expected.correct, expected.areas):
+            raise AssertionError(
+                f"Estadísticas inconsistentes: acumulado={self.as_tuple()} {self.areas}, "
+                f"recalculado={expected.as_tuple()} {expected.areas}"
+            )
+
+
+# Estados de una respuesta en la revisión
+REVIEW_STATUSES = ('correct', 'wrong', 'skipped')
+
+
+class ReviewIndex:
+    """
+    Índice precalculado para la pantalla de revisión
+    Para cada combinación (estado, área), incluyendo "todas" como None,
+    guarda las posiciones de las preguntas que coinciden. Se construye una
+    vez al terminar el examen; filtrar cuesta O(1) y mostrar una página
+    cuesta O(tamaño de la página).
+    """
+
+    __slots__ = ('areas', '_positions')
+
+    def __init__(self, questions: Iterable[Question], answers: Iterable[int]):
+        positions: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        areas: Dict[str, None] = {}
+        for i, (question, answer) in enumerate(zip(questions, answers)):
+            if answer == UNANSWERED:
+                status = 'skipped'
+            elif answer == question.correct:
+                status = 'correct'
+            else:
+                status = 'wrong'
+            areas.setdefault(question.area)
+            for key in ((None, None), (status, None), (None, question.area), (status, question.area)):
+                positions.setdefault(key, []).append(i)
+
+        self.areas: Tuple[str, ...] = tuple(areas)
+        self._positions = {key: tuple(value) for key, value in positions.items()}
+
+    def select(self, status: Optional[str] = None, area: Optional[str] = None) -> Tuple[int, ...]:
+        """Posiciones de las preguntas con el estado y área indicados (None = todos)"""
+        return self._positions.get((status, area), ())
+
+    def count(self, status: Optional[str] = None, area: Optional[str] = None) -> int:
+        """Número de preguntas con el estado y área indicados"""
+        return len(self.select(status, area))
@@ -0,0 +1,186 @@
+"""
+Exportación de resultados
+=========================
+Escritores incrementales (sin pandas) para los resultados de un examen y
+para el historial completo de intentos.
+
+- Resultados de un examen: JSON detallado generado pregunta por pregunta y
+  resumen CSV de un renglón con el módulo ``csv``. La aplicación los pasa
+  como funciones a ``st.download_button``, así que sólo se generan cuando
+  la descarga realmente empieza.
+- Historial: NDJSON (un intento por línea) o Parquet (un grupo de renglones
+  por página de intentos), leyendo la base por páginas; la memoria no
+  depende del tamaño del historial.
+
+Uso::
+
+    python -m exani.export historial.ndjson
+    python -m exani.export historial.parquet --since 2025-01-01
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Iterator, List, Mapping, Optional, Sequence, TextIO, Tuple
+
+from exani.attempt_store import AttemptStore, StoredAttempt, get_attempt_store
+from exani.exam_state import answer_value
+from exani.question_bank import Question
+
+# Intentos por página al recorrer el historial (y por grupo de renglones en Parquet)
+EXPORT_PAGE_SIZE = 1000
+
+SUMMARY_CSV_HEADER = ('Tipo de Examen', 'Puntuación (%)', 'Respuestas Correctas', 'Respuestas Incorrectas',
+                      'Sin Responder', 'Total Preguntas', 'Duración', 'Fecha')
+
+
+def _json_default(value):
+    """Tipos que json no serializa por sí solo (duración del examen)"""
+    if isinstance(value, timedelta):
+        return str(value).split('.')[0]
+    if isinstance(value, datetime):
+        return value.isoformat(timespec='seconds')
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def iter_results_json(results: Mapping, questions: Sequence[Question],
+                      answers: Sequence[int]) -> Iterator[str]:
+    """Fragmentos del JSON detallado de un examen, una pregunta a la vez"""
+    yield '{"resumen": '
+    yield json.dumps(dict(results), ensure_ascii=False, default=_json_default)
+    yield ', "preguntas_detalle": ['
+    for i, (question, answer) in enumerate(zip(questions, answers)):
+        user_answer = answer_value(answer)
+        detail = {
+            'numero': i + 1,
+            'area': question.area,
+            'pregunta': question.text,
+            'opciones': question.options,
+            'respuesta_correcta': question.correct,
+            'respuesta_usuario': user_answer,
+            'es_correcta': user_answer == question.correct,
+            'sin_responder': user_answer is None
+        }
+        yield ('\n' if i == 0 else ',\n') + json.dumps(detail, ensure_ascii=False)
+    yield '\n]}\n'
+
+
+def results_json(results: Mapping, questions: Sequence[Question], answers: Sequence[int]) -> bytes:
+    """JSON detallado de un examen"""
+    return ''.join(iter_results_json(results, questions, answers)).encode('utf-8')
+
+
+def summary_csv(results: Mapping) -> bytes:
+    """Resumen CSV (encabezado y un renglón) de un examen"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(SUMMARY_CSV_HEADER)
+    writer.writerow((
+        results['exam_type'], results['score'], results['correct'], results['wrong'],
+        results['skipped'], results['total_questions'], _json_default(results['duration']),
+        results['date']
+    ))
+    return buffer.getvalue().encode('utf-8')
+
+
+def _attempt_record(attempt: StoredAttempt, answers: List[Tuple[int, int, bool]]) -> Dict:
+    record = attempt._asdict()
+    record['question_ids'] = [qid for qid, _, _ in answers]
+    record['answers'] = [answer for _, answer, _ in answers]
+    record['is_correct'] = [is_correct for _, _, is_correct in answers]
+    return record
+
+
+def write_attempts_ndjson(store: AttemptStore, output: TextIO, since: float = 0.0) -> int:
+    """Escribe el historial como NDJSON; devuelve el número de intentos"""
+    count = 0
+    for attempt, answers in store.iter_attempts(since, EXPORT_PAGE_SIZE):
+        output.write(json.dumps(_attempt_record(attempt, answers), ensure_ascii=False))
+        output.write('\n')
+        count += 1
+    return count
+
+
+def write_attempts_parquet(store: AttemptStore, output, since: float = 0.0) -> int:
+    """
+    Escribe el historial como Parquet (requiere pyarrow); cada página de
+    intentos es un grupo de renglones. ``output`` es una ruta o archivo binario.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow (pip install pyarrow)") from e
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('user_id', pa.string()), ('exam_type', pa.string()),
+        ('form_code', pa.string()), ('bank_version', pa.string()),
+        ('started_at', pa.float64()), ('finished_at', pa.float64()), ('duration_seconds', pa.float64()),
+        ('score', pa.int32()), ('correct', pa.int32()), ('wrong', pa.int32()),
+        ('skipped', pa.int32()), ('total', pa.int32()),
+        ('question_ids', pa.list_(pa.int64())), ('answers', pa.list_(pa.int8())),
+        ('is_correct', pa.list_(pa.bool_()))
+    ])
+
+    count = 0
+    page: List[Dict] = []
+    with pq.ParquetWriter(output, schema, compression='zstd') as writer:
+        for attempt, answers in store.iter_attempts(since, EXPORT_PAGE_SIZE):
+            page.append(_attempt_record(attempt, answers))
+            if len(page) >= EXPORT_PAGE_SIZE:
+                writer.write_table(pa.Table.from_pylist(page, schema=schema))
+                count += len(page)
+                page = []
+        if page or not count:
+            writer.write_table(pa.Table.from_pylist(page, schema=schema))
+            count += len(page)
+    return count
+
+
+def export_attempts(store: AttemptStore, output: BinaryIO, export_format: str, since: float = 0.0) -> int:
+    """Exporta el historial a un archivo binario en el formato indicado"""
+    if export_format == 'parquet':
+        return write_attempts_parquet(store, output, since)
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='\n', write_through=True)
+    try:
+        return write_attempts_ndjson(store, text, since)
+    finally:
+        text.detach()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m exani.export',
+        description='Exporta el historial de intentos a NDJSON o Parquet'
+    )
+    parser.add_argument('output', help='archivo de salida (.ndjson o .parquet; "-" = NDJSON a stdout)')
+    parser.add_argument('--format', choices=('ndjson', 'parquet'), default=None,
+                        help='formato (por defecto según la extensión)')
+    parser.add_argument('--since', default=None, help='sólo intentos terminados desde esta fecha (AAAA-MM-DD)')
+    parser.add_argument('--db', default=None, help='base de datos (por defecto EXANI_DB_PATH)')
+    args = parser.parse_args(argv)
+
+    export_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'ndjson')
+    since = datetime.strptime(args.since, '%Y-%m-%d').timestamp() if args.since else 0.0
+    store = get_attempt_store(args.db)
+
+    started = time.perf_counter()
+    if args.output == '-':
+        if export_format != 'ndjson':
+            parser.error('sólo NDJSON se puede escribir a stdout')
+        count = write_attempts_ndjson(store, sys.stdout, since)
+    else:
+        with open(args.output, 'wb') as output:
+            count = export_attempts(store, output, export_format, since)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ {count} intentos exportados en {elapsed:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Calificación vectorizada
+========================
+Califica matrices de respuestas (alumnos × reactivos) contra una clave con
+NumPy, en una sola pasada: aciertos, errores, omisiones, calificación y
+subtotales por área. La aplicación califica cada examen con este mismo
+código (una matriz de un solo renglón), así que los resultados coinciden
+exactamente con los de la calificación masiva.
+
+Las respuestas usan la convención de ``exam_state``: índice de la opción
+(0 = A) y ``UNANSWERED`` para las preguntas sin responder.
+
+Las hojas de respuestas en CSV (una columna de identificador y una columna
+por reactivo con la letra marcada) se leen por bloques, así que un archivo
+de 100 mil alumnos cabe en poca memoria::
+
+    python -m exani.grading respuestas.csv --form CEAA-AABK-BQAB-S5HA -o resultados.csv
+"""
+
+import argparse
+import csv
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+import numpy as np
+
+from exani.exam_forms import ExamForm, decode_form_code, get_form
+from exani.exam_state import UNANSWERED
+from exani.question_bank import Question, QuestionBank, get_bank_loader
+
+# Alumnos por bloque al leer CSV
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class AnswerKey(NamedTuple):
+    """Clave de respuestas y área de cada reactivo"""
+    correct: np.ndarray  # (reactivos,) int8
+    area_codes: np.ndarray  # (reactivos,) índice en ``areas``
+    areas: Tuple[str, ...]
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[int, str]]) -> 'AnswerKey':
+        """Construye la clave a partir de pares (opción correcta, área)"""
+        correct: List[int] = []
+        codes: List[int] = []
+        areas: Dict[str, int] = {}
+        for answer, area in items:
+            correct.append(answer)
+            codes.append(areas.setdefault(area, len(areas)))
+        return cls(np.array(correct, dtype=np.int8), np.array(codes, dtype=np.intp), tuple(areas))
+
+    @classmethod
+    def from_questions(cls, questions: Iterable[Question]) -> 'AnswerKey':
+        """Clave en el orden original de las opciones (como las guarda la aplicación)"""
+        return cls.from_items((question.correct, question.area) for question in questions)
+
+    @classmethod
+    def from_form(cls, bank: QuestionBank, form: ExamForm) -> 'AnswerKey':
+        """Clave en el orden en que la forma muestra las opciones (hojas impresas)"""
+        items = []
+        for i, qid in enumerate(form.question_ids):
+            question = bank[qid]
+            order = list(form.option_order(i, len(question.options)))
+            items.append((order.index(question.correct), question.area))
+        return cls.from_items(items)
+
+    def __len__(self) -> int:
+        return len(self.correct)
+
+    def area_totals(self) -> np.ndarray:
+        """Número de reactivos de cada área"""
+        return np.bincount(self.area_codes, minlength=len(self.areas))
+
+
+class GradeResult(NamedTuple):
+    """Resultados por alumno (un renglón por alumno)"""
+    correct: np.ndarray  # (alumnos,)
+    wrong: np.ndarray
+    skipped: np.ndarray
+    score: np.ndarray  # calificación 0-100 redondeada
+    area_answered: np.ndarray  # (alumnos, áreas)
+    area_correct: np.ndarray  # (alumnos, áreas)
+    area_totals: np.ndarray  # (áreas,)
+    areas: Tuple[str, ...]
+
+    def area_summary(self, row: int = 0) -> Dict[str, Dict[str, int]]:
+        """Resumen por área de un alumno: total, respondidas y correctas"""
+        return {area: {'total': int(self.area_totals[j]),
+                       'answered': int(self.area_answered[row, j]),
+                       'correct': int(self.area_correct[row, j])}
+                for j, area in enumerate(self.areas)}
+
+
+def grade_matrix(answers: np.ndarray, key: AnswerKey) -> GradeResult:
+    """
+    Califica una matriz (alumnos × reactivos) de respuestas contra la clave
+    """
+    answers = np.asarray(answers)
+    if answers.ndim != 2 or answers.shape[1] != len(key):
+        raise ValueError(f"Se esperaban {len(key)} reactivos por alumno, la matriz es {answers.shape}")
+
+    answered = answers != UNANSWERED
+    # UNANSWERED nunca coincide con una opción válida de la clave
+    hits = answers == key.correct
+
+    # Conteos por área con una multiplicación contra la matriz reactivo → área
+    area_matrix = np.zeros((len(key), len(key.areas)), dtype=np.int32)
+    area_matrix[np.arange(len(key)), key.area_codes] = 1
+    area_answered = answered.astype(np.int32) @ area_matrix
+    area_correct = hits.astype(np.int32) @ area_matrix
+
+    correct = area_correct.sum(axis=1)
+    answered_count = area_answered.sum(axis=1)
+    total = len(key)
+    # Mismo redondeo que round() de Python (mitades al par)
+    score = np.round(correct / total * 100).astype(np.int64) if total else np.zeros_like(correct)
+    return GradeResult(
+        correct=correct,
+        wrong=answered_count - correct,
+        skipped=total - answered_count,
+        score=score,
+        area_answered=area_answered,
+        area_correct=area_correct,
+        area_totals=key.area_totals(),
+        areas=key.areas
+    )
+
+
+def grade_answers(questions: Sequence[Question], answers: Iterable[int]) -> GradeResult:
+    """Califica un solo examen (renglón único) con la clave de sus preguntas"""
+    matrix = np.fromiter(answers, dtype=np.int8, count=len(questions)).reshape(1, -1)
+    return grade_matrix(matrix, AnswerKey.from_questions(questions))
+
+
+def letters_to_answers(values: np.ndarray) -> np.ndarray:
+    """
+    Convierte letras marcadas (A, b, " C ", ...) a índices de opción; se
+    ignoran los espacios alrededor. Las celdas vacías o con símbolos se
+    toman como sin responder, y también las marcas múltiples ("AB", "A,B"):
+    se anulan como en la lectura óptica, no cuentan como error.
+    """
+    cells = np.char.strip(np.asarray(values, dtype=str))
+    # Una sola letra por celda; lo demás (vacía o marca múltiple) queda en ''
+    single = np.char.str_len(cells) == 1
+    marks = np.ascontiguousarray(np.where(single, cells, ''), dtype='U1')
+    first = marks.view(np.uint32).reshape(marks.shape).astype(np.int64)
+    # Minúsculas a mayúsculas sin pasar por cadenas de Python
+    first = np.where((first >= ord('a')) & (first <= ord('z')), first - 32, first) - ord('A')
+    valid = (first >= 0) & (first < 26)
+    return np.where(valid, first, UNANSWERED).astype(np.int8)
+
+
+def read_answer_sheets(source, item_count: int,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Lee un CSV de hojas de respuestas por bloques
+    Devuelve pares (identificadores, matriz de respuestas) de hasta
+    ``chunk_size`` alumnos
+    """
+    import pandas as pd
+
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    for chunk in reader:
+        if chunk.shape[1] != item_count + 1:
+            raise ValueError(
+                f"El CSV tiene {chunk.shape[1] - 1} columnas de reactivos y la clave {item_count}"
+            )
+        yield chunk.iloc[:, 0].to_numpy(), letters_to_answers(chunk.iloc[:, 1:].to_numpy())
+
+
+def grade_csv(source, key: AnswerKey,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, GradeResult]]:
+    """Califica un CSV de hojas de respuestas bloque por bloque"""
+    for student_ids, answers in read_answer_sheets(source, len(key), chunk_size):
+        yield student_ids, grade_matrix(answers, key)
+
+
+def write_results(output: TextIO, graded: Iterable[Tuple[np.ndarray, GradeResult]]) -> int:
+    """Escribe los resultados en CSV conforme se califican; devuelve el número de alumnos"""
+    writer = csv.writer(output, lineterminator='\n')
+    rows = 0
+    header_written = False
+    for student_ids, result in graded:
+        if not header_written:
+            writer.writerow(['student', 'score', 'correct', 'wrong', 'skipped'] + list(result.areas))
+            header_written = True
+        writer.writerows(zip(
+            student_ids, result.score.tolist(), result.correct.tolist(),
+            result.wrong.tolist(), result.skipped.tolist(), *result.area_correct.T.tolist()
+        ))
+        rows += len(student_ids)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m exani.grading',
+        description='Califica hojas de respuestas (CSV) de una forma de examen'
+    )
+    parser.add_argument('answers', help='CSV con identificador y una columna por reactivo')
+    parser.add_argument('--form', required=True, help='código de la forma aplicada')
+    parser.add_argument('-o', '--output', default='-', help='CSV de resultados (por defecto stdout)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='alumnos por bloque')
+    parser.add_argument('--bank-dir', default=None, help='directorio de banco (por defecto EXANI_BANK_DIR)')
+    args = parser.parse_args(argv)
+
+    spec = decode_form_code(args.form)
+    loader = get_bank_loader(args.bank_dir)
+    bank = loader.get_bank(spec.modules)
+    errors = loader.errors(spec.modules)
+    for message in errors.values():
+        print(f"❌ {message}", file=sys.stderr)
+    if errors:
+        return 1
+    key = AnswerKey.from_form(bank, get_form(bank, args.form))
+
+    started = time.perf_counter()
+    graded = grade_csv(args.answers, key, args.chunk_size)
+    if args.output == '-':
+        rows = write_results(sys.stdout, graded)
+    else:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            rows = write_results(output, graded)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ {rows} alumnos calificados en {elapsed:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
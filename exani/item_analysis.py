@@ -0,0 +1,398 @@
+"""
+Análisis de reactivos
+=====================
+Estadísticas empíricas de cada reactivo a partir de los intentos
+registrados: índice de dificultad (p, proporción de aciertos),
+discriminación (correlación punto-biserial entre acertar el reactivo y la
+proporción de aciertos del intento) y tasa de selección de cada opción.
+
+Sólo se guardan sumas acumuladas por reactivo, vectorizadas con NumPy. Los
+intentos nuevos se suman sin recalcular lo anterior y las métricas se
+derivan de las sumas al momento de escribirlas. El resultado se escribe
+como metadatos por ID de reactivo en un archivo aparte del banco, de modo
+que editar las estadísticas no cambia la versión del banco ni invalida los
+códigos de forma. ``flagged_items()`` devuelve los reactivos a revisar; la
+aplicación y el generador por lotes los excluyen de las formas nuevas.
+
+Los intentos llegan de hojas de respuestas (CSV de una forma) o del
+historial de la aplicación; del historial sólo se suman los intentos
+posteriores al último ya analizado.
+
+Uso::
+
+    python -m exani.item_analysis hojas.csv --form CEAA-AABK-BQAB-S5HA
+    python -m exani.item_analysis --attempts
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from typing import Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from exani.attempt_store import AttemptStore, get_attempt_store
+from exani.exam_forms import ExamForm, decode_form_code, get_form
+from exani.exam_state import UNANSWERED
+from exani.grading import DEFAULT_CHUNK_SIZE, read_answer_sheets
+from exani.question_bank import QuestionBank, get_bank_loader
+
+# Archivo de metadatos por defecto (se puede cambiar con EXANI_ITEM_STATS)
+DEFAULT_STATS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stats', 'item_stats.json'
+)
+
+# Versión del formato del archivo de metadatos
+STATS_FORMAT_VERSION = 1
+
+# Opciones por reactivo que se cuentan por separado
+MAX_OPTIONS = 8
+
+# Intentos mínimos antes de marcar un reactivo
+MIN_ATTEMPTS = 30
+
+# Umbrales para marcar reactivos
+EASY_P_VALUE = 0.90
+HARD_P_VALUE = 0.20
+LOW_DISCRIMINATION = 0.10
+
+
+class ItemStatistics(NamedTuple):
+    """Métricas derivadas por reactivo (un renglón por reactivo)"""
+    question_ids: np.ndarray
+    attempts: np.ndarray
+    p_value: np.ndarray
+    point_biserial: np.ndarray
+    option_rates: np.ndarray  # (reactivos, MAX_OPTIONS)
+    skip_rate: np.ndarray
+
+
+class ItemAnalysis:
+    """
+    Acumulador incremental de estadísticas por reactivo
+    Guarda, por reactivo: intentos, aciertos, suma de la proporción de
+    aciertos del intento (y de su cuadrado, y restringida a los intentos que
+    acertaron el reactivo), conteos por opción y omisiones.
+    """
+
+    __slots__ = ('question_ids', 'correct_options', '_rows', 'attempts', 'correct',
+                 'sum_score', 'sum_score_sq', 'sum_score_correct', 'option_counts', 'skipped',
+                 'last_attempt_id')
+
+    def __init__(self):
+        self.question_ids = np.zeros(0, dtype=np.int64)
+        self.correct_options = np.zeros(0, dtype=np.int8)
+        self._rows: Dict[int, int] = {}
+        self.attempts = np.zeros(0, dtype=np.int64)
+        self.correct = np.zeros(0, dtype=np.int64)
+        self.sum_score = np.zeros(0, dtype=np.float64)
+        self.sum_score_sq = np.zeros(0, dtype=np.float64)
+        self.sum_score_correct = np.zeros(0, dtype=np.float64)
+        self.option_counts = np.zeros((0, MAX_OPTIONS), dtype=np.int64)
+        self.skipped = np.zeros(0, dtype=np.int64)
+        # Último intento del historial ya sumado
+        self.last_attempt_id = 0
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def _row_indices(self, question_ids: Sequence[int], correct: np.ndarray) -> np.ndarray:
+        """Renglón de cada reactivo, agregando los que aún no existen"""
+        new = [(qid, answer) for qid, answer in zip(question_ids, correct.tolist())
+               if qid not in self._rows]
+        if new:
+            start = len(self.question_ids)
+            for i, (qid, _) in enumerate(new):
+                self._rows[qid] = start + i
+            extra = len(new)
+            self.question_ids = np.concatenate([self.question_ids, [qid for qid, _ in new]])
+            self.correct_options = np.concatenate(
+                [self.correct_options, np.array([answer for _, answer in new], dtype=np.int8)]
+            )
+            for name in ('attempts', 'correct', 'sum_score', 'sum_score_sq', 'sum_score_correct', 'skipped'):
+                current = getattr(self, name)
+                setattr(self, name, np.concatenate([current, np.zeros(extra, dtype=current.dtype)]))
+            self.option_counts = np.concatenate(
+                [self.option_counts, np.zeros((extra, MAX_OPTIONS), dtype=np.int64)]
+            )
+        return np.fromiter((self._rows[qid] for qid in question_ids), dtype=np.intp, count=len(question_ids))
+
+    def add_attempts(self, question_ids: Sequence[int], correct: np.ndarray, answers: np.ndarray):
+        """
+        Suma un bloque de intentos de la misma forma
+        ``answers`` es (intentos × reactivos) con el índice original de la
+        opción elegida (o UNANSWERED); ``correct`` es la clave en ese orden
+        """
+        answers = np.asarray(answers)
+        if answers.ndim != 2 or answers.shape[1] != len(question_ids):
+            raise ValueError(f"Se esperaban {len(question_ids)} reactivos por intento, la matriz es {answers.shape}")
+        if not len(answers):
+            return
+
+        rows = self._row_indices(question_ids, np.asarray(correct))
+        hits = answers == correct
+        # Proporción de aciertos de cada intento (puntaje total normalizado)
+        scores = hits.mean(axis=1)
+
+        self.attempts[rows] += len(answers)
+        self.correct[rows] += hits.sum(axis=0)
+        self.sum_score[rows] += scores.sum()
+        self.sum_score_sq[rows] += (scores * scores).sum()
+        self.sum_score_correct[rows] += scores @ hits
+        self.skipped[rows] += (answers == UNANSWERED).sum(axis=0)
+        for option in range(MAX_OPTIONS):
+            self.option_counts[rows, option] += (answers == option).sum(axis=0)
+
+    def statistics(self) -> ItemStatistics:
+        """Calcula las métricas de todos los reactivos a partir de las sumas"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            attempts = self.attempts.astype(np.float64)
+            p_value = self.correct / attempts
+            mean = self.sum_score / attempts
+            sd = np.sqrt(np.maximum(self.sum_score_sq / attempts - mean * mean, 0.0))
+            mean_correct = self.sum_score_correct / self.correct
+            point_biserial = (mean_correct - mean) / sd * np.sqrt(p_value / (1.0 - p_value))
+            point_biserial = np.where((sd > 0) & (p_value > 0) & (p_value < 1), point_biserial, np.nan)
+            option_rates = self.option_counts / attempts[:, None]
+            skip_rate = self.skipped / attempts
+        return ItemStatistics(self.question_ids, self.attempts, p_value, point_biserial,
+                              option_rates, skip_rate)
+
+    def to_metadata(self) -> Dict:
+        """Sumas y métricas por reactivo en un diccionario serializable a JSON"""
+        stats = self.statistics()
+        items = {}
+        for row, qid in enumerate(self.question_ids.tolist()):
+            metadata = {
+                'attempts': int(self.attempts[row]),
+                'correct_option': int(self.correct_options[row]),
+                'p_value': _finite(stats.p_value[row]),
+                'point_biserial': _finite(stats.point_biserial[row]),
+                'option_rates': [_finite(rate) for rate in stats.option_rates[row]],
+                'skip_rate': _finite(stats.skip_rate[row]),
+                'sums': {
+                    'correct': int(self.correct[row]),
+                    'score': float(self.sum_score[row]),
+                    'score_sq': float(self.sum_score_sq[row]),
+                    'score_correct': float(self.sum_score_correct[row]),
+                    'options': self.option_counts[row].tolist(),
+                    'skipped': int(self.skipped[row])
+                }
+            }
+            metadata['flags'] = item_flags(metadata)
+            items[str(qid)] = metadata
+        return {'version': STATS_FORMAT_VERSION, 'last_attempt_id': self.last_attempt_id, 'items': items}
+
+    @classmethod
+    def from_metadata(cls, data: Mapping) -> 'ItemAnalysis':
+        """Reconstruye el acumulador a partir de los metadatos guardados"""
+        if data.get('version') != STATS_FORMAT_VERSION:
+            raise ValueError(f"Formato de estadísticas desconocido: {data.get('version')}")
+        analysis = cls()
+        analysis.last_attempt_id = data.get('last_attempt_id', 0)
+        items = data.get('items', {})
+        qids = [int(qid) for qid in items]
+        analysis._row_indices(qids, np.array([items[str(qid)]['correct_option'] for qid in qids], dtype=np.int8))
+        for row, qid in enumerate(qids):
+            metadata = items[str(qid)]
+            sums = metadata['sums']
+            analysis.attempts[row] = metadata['attempts']
+            analysis.correct[row] = sums['correct']
+            analysis.sum_score[row] = sums['score']
+            analysis.sum_score_sq[row] = sums['score_sq']
+            analysis.sum_score_correct[row] = sums['score_correct']
+            analysis.option_counts[row] = sums['options']
+            analysis.skipped[row] = sums['skipped']
+        return analysis
+
+
+def _finite(value: float) -> Optional[float]:
+    """Redondea para el archivo; NaN (sin datos suficientes) se guarda como null"""
+    return None if math.isnan(value) else round(float(value), 4)
+
+
+def item_flags(metadata: Mapping) -> List[str]:
+    """Motivos para revisar un reactivo (vacío si no hay intentos suficientes)"""
+    if metadata['attempts'] < MIN_ATTEMPTS:
+        return []
+    flags = []
+    p_value = metadata['p_value']
+    if p_value is not None and p_value > EASY_P_VALUE:
+        flags.append('too_easy')
+    if p_value is not None and p_value < HARD_P_VALUE:
+        flags.append('too_hard')
+    point_biserial = metadata['point_biserial']
+    if point_biserial is not None and point_biserial < LOW_DISCRIMINATION:
+        flags.append('low_discrimination')
+    # Un distractor elegido más que la respuesta correcta sugiere un error en la clave
+    rates = [rate or 0.0 for rate in metadata['option_rates']]
+    correct_rate = rates[metadata['correct_option']] if metadata['correct_option'] < len(rates) else 0.0
+    if any(rate > correct_rate for i, rate in enumerate(rates) if i != metadata['correct_option']):
+        flags.append('dominant_distractor')
+    return flags
+
+
+def original_answers(bank: QuestionBank, form: ExamForm, answers: np.ndarray) -> np.ndarray:
+    """
+    Convierte respuestas en el orden mostrado por la forma (hojas impresas)
+    al índice original de la opción en el banco
+    """
+    if form.option_orders is None:
+        return answers
+    orders = np.full((len(form.question_ids), MAX_OPTIONS), UNANSWERED, dtype=np.int8)
+    for i, qid in enumerate(form.question_ids):
+        order = form.option_order(i, len(bank[qid].options))
+        orders[i, :len(order)] = order
+    columns = np.arange(len(form.question_ids))
+    valid = (answers >= 0) & (answers < MAX_OPTIONS)
+    mapped = orders[columns, np.where(valid, answers, 0)]
+    # Marcas fuera del rango de opciones siguen contando como respondidas (y erróneas)
+    return np.where(valid, np.where(mapped == UNANSWERED, MAX_OPTIONS, mapped), answers).astype(np.int8)
+
+
+def load_item_stats(path: Optional[str] = None) -> ItemAnalysis:
+    """Carga los metadatos guardados (acumulador vacío si no existen)"""
+    path = path or os.environ.get('EXANI_ITEM_STATS', DEFAULT_STATS_PATH)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return ItemAnalysis.from_metadata(json.load(f))
+    except FileNotFoundError:
+        return ItemAnalysis()
+
+
+def save_item_stats(analysis: ItemAnalysis, path: Optional[str] = None):
+    """Escribe los metadatos de forma atómica (archivo temporal + reemplazo)"""
+    path = path or os.environ.get('EXANI_ITEM_STATS', DEFAULT_STATS_PATH)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(analysis.to_metadata(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+# Reactivos marcados por archivo: ruta → ((mtime, tamaño), IDs)
+_flagged_cache: Dict[str, Tuple[Tuple[int, int], FrozenSet[int]]] = {}
+
+
+def flagged_items(path: Optional[str] = None) -> FrozenSet[int]:
+    """
+    IDs de los reactivos marcados para revisión en los metadatos guardados
+    El archivo sólo se vuelve a leer cuando cambia su mtime o su tamaño.
+    """
+    path = path or os.environ.get('EXANI_ITEM_STATS', DEFAULT_STATS_PATH)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return frozenset()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _flagged_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f).get('items', {})
+    flagged = frozenset(int(qid) for qid, metadata in items.items() if metadata.get('flags'))
+    _flagged_cache[path] = (key, flagged)
+    return flagged
+
+
+def add_answer_sheets(analysis: ItemAnalysis, source, bank: QuestionBank, form: ExamForm,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Suma al análisis las hojas de respuestas de un CSV; devuelve el número de intentos"""
+    question_ids = list(form.question_ids)
+    correct = np.array([bank[qid].correct for qid in question_ids], dtype=np.int8)
+    rows = 0
+    for _, answers in read_answer_sheets(source, len(question_ids), chunk_size):
+        analysis.add_attempts(question_ids, correct, original_answers(bank, form, answers))
+        rows += len(answers)
+    return rows
+
+
+def add_stored_attempts(analysis: ItemAnalysis, store: AttemptStore, bank: QuestionBank,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Suma al análisis los intentos del historial posteriores a
+    ``analysis.last_attempt_id``; devuelve (intentos sumados, omitidos)
+    Se omiten los intentos con reactivos que ya no están en el banco. Los
+    intentos con las mismas preguntas en el mismo orden se suman en bloque.
+    """
+    blocks: Dict[Tuple[int, ...], List[List[int]]] = {}
+    pending = added = skipped = 0
+
+    def flush():
+        for question_ids, rows in blocks.items():
+            correct = np.array([bank[qid].correct for qid in question_ids], dtype=np.int8)
+            analysis.add_attempts(question_ids, correct, np.array(rows, dtype=np.int8))
+        blocks.clear()
+
+    for attempt, answers in store.iter_attempts(after_id=analysis.last_attempt_id):
+        question_ids = tuple(qid for qid, _, _ in answers)
+        if question_ids and all(qid in bank for qid in question_ids):
+            blocks.setdefault(question_ids, []).append([answer for _, answer, _ in answers])
+            added += 1
+            pending += 1
+            if pending >= chunk_size:
+                flush()
+                pending = 0
+        else:
+            skipped += 1
+        analysis.last_attempt_id = attempt.id
+    flush()
+    return added, skipped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m exani.item_analysis',
+        description='Actualiza las estadísticas de los reactivos con hojas de respuestas o con el historial'
+    )
+    parser.add_argument('answers', nargs='*', help='CSV de hojas de respuestas de la forma')
+    parser.add_argument('--form', default=None, help='código de la forma aplicada (obligatorio con hojas)')
+    parser.add_argument('--attempts', action='store_true',
+                        help='sumar los intentos nuevos del historial de la aplicación')
+    parser.add_argument('--db', default=None, help='base de datos del historial (por defecto EXANI_DB_PATH)')
+    parser.add_argument('--stats', default=None, help='archivo de metadatos (por defecto EXANI_ITEM_STATS)')
+    parser.add_argument('--rebuild', action='store_true', help='descartar las sumas anteriores')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='intentos por bloque')
+    parser.add_argument('--bank-dir', default=None, help='directorio de banco (por defecto EXANI_BANK_DIR)')
+    args = parser.parse_args(argv)
+    if args.answers and not args.form:
+        parser.error('--form es obligatorio con hojas de respuestas')
+    if not args.answers and not args.attempts:
+        parser.error('indica hojas de respuestas (con --form) o --attempts')
+
+    loader = get_bank_loader(args.bank_dir)
+    analysis = ItemAnalysis() if args.rebuild else load_item_stats(args.stats)
+
+    attempts = 0
+    if args.answers:
+        spec = decode_form_code(args.form)
+        bank = loader.get_bank(spec.modules)
+        errors = loader.errors(spec.modules)
+        for message in errors.values():
+            print(f"❌ {message}", file=sys.stderr)
+        if errors:
+            return 1
+        form = get_form(bank, args.form)
+        attempts += sum(add_answer_sheets(analysis, source, bank, form, args.chunk_size)
+                        for source in args.answers)
+    if args.attempts:
+        bank = loader.get_bank(loader.available_modules())
+        for message in loader.errors().values():
+            print(f"⚠️ Módulo omitido: {message}", file=sys.stderr)
+        added, skipped = add_stored_attempts(analysis, get_attempt_store(args.db), bank, args.chunk_size)
+        attempts += added
+        if skipped:
+            print(f"⚠️ {skipped} intentos del historial omitidos (reactivos que ya no están en el banco)",
+                  file=sys.stderr)
+    save_item_stats(analysis, args.stats)
+
+    flagged = len(flagged_items(args.stats))
+    print(f"✅ {attempts} intentos agregados; {len(analysis)} reactivos con estadísticas, "
+          f"{flagged} marcados para revisión", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Métricas de operación
+=====================
+Contadores e histogramas en formato de texto de Prometheus, sin
+dependencias externas. Se publican en un endpoint local
+(``EXANI_METRICS_PORT``, ``GET /metrics``) y/o se escriben periódicamente a
+un archivo (``EXANI_METRICS_FILE``, p. ej. para el textfile collector de
+node_exporter).
+
+Cada hilo de script de Streamlit escribe en su propio fragmento (shard) de
+valores, así que registrar un evento no toma ningún lock. El lock sólo se
+usa al publicar (para recorrer los fragmentos) y cuando un hilo termina y
+su fragmento se integra al acumulado.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) del histograma de latencia de rerun
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Segundos sin actividad tras los que una sesión ya no cuenta como activa
+SESSION_IDLE_SECONDS = 60
+
+# Segundos entre escrituras del archivo de métricas
+DEFAULT_WRITE_INTERVAL = 15.0
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardHandle:
+    """Vive en el threading.local; al terminar el hilo su fragmento se integra"""
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self, values: Dict):
+        self.values = values
+
+
+class MetricsRegistry:
+    """Registro de métricas con acumulación por hilo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._retired: Dict = {}
+        self._metrics: List['_Metric'] = []
+        self._callbacks: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+
+    def _shard(self) -> Dict:
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            values: Dict = {}
+            handle = self._local.handle = _ShardHandle(values)
+            with self._lock:
+                self._shards.append(values)
+            weakref.finalize(handle, self._retire, values)
+        return handle.values
+
+    def _retire(self, values: Dict):
+        """Integra el fragmento de un hilo terminado al acumulado"""
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard is not values]
+            _merge(self._retired, values)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> 'Counter':
+        return self._add(Counter(self, name, documentation, tuple(labelnames)))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> 'Histogram':
+        return self._add(Histogram(self, name, documentation, tuple(labelnames), tuple(buckets)))
+
+    def callback(self, name: str, documentation: str, metric_type: str, read: Callable[[], float]):
+        """
+        Métrica sin etiquetas cuyo valor se lee al publicar (gauge o counter)
+        Registrar otra vez el mismo nombre reemplaza la anterior.
+        """
+        with self._lock:
+            self._callbacks[name] = (documentation, metric_type, read)
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collect(self) -> Dict:
+        """Suma de todos los fragmentos: (métrica, etiquetas) -> valor"""
+        with self._lock:
+            shards = list(self._shards)
+            total = _merge({}, self._retired)
+        for shard in shards:
+            # dict.copy() es atómico con el GIL aunque el hilo dueño siga escribiendo
+            _merge(total, shard.copy())
+        return total
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        values = self.collect()
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics)
+            callbacks = list(self._callbacks.items())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            series = sorted((key[1], value) for key, value in values.items() if key[0] is metric)
+            lines.extend(metric.render(series))
+        for name, (documentation, metric_type, read) in callbacks:
+            try:
+                value = read()
+            except Exception:
+                logger.exception("No se pudo leer la métrica %s", name)
+                continue
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(total: Dict, values: Dict) -> Dict:
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = total.get(key)
+            total[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, registry: MetricsRegistry, name: str, documentation: str, labelnames: LabelValues):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        shard = self.registry._shard()
+        key = (self, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def render(self, series: List[Tuple[LabelValues, float]]) -> List[str]:
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in series]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, registry: MetricsRegistry, name: str, documentation: str,
+                 labelnames: LabelValues, buckets: Tuple[float, ...]):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labelvalues: str):
+        shard = self.registry._shard()
+        key = (self, labelvalues)
+        counts = shard.get(key)
+        if counts is None:
+            # un contador por límite, +Inf, suma
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self, series: List[Tuple[LabelValues, List[float]]]) -> List[str]:
+        lines = []
+        for labels, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class AppMetrics:
+    """Métricas del simulador"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry = registry or MetricsRegistry()
+        self.reruns = registry.counter(
+            'exani_reruns_total', 'Reruns completos del script por pantalla', ('screen',))
+        self.rerun_seconds = registry.histogram(
+            'exani_rerun_duration_seconds', 'Duración de un rerun completo por pantalla', ('screen',))
+        self.fragment_runs = registry.counter(
+            'exani_fragment_runs_total', 'Ejecuciones de fragmentos (incluye el chequeo periódico del tiempo)',
+            ('fragment',))
+        self.fragment_seconds = registry.histogram(
+            'exani_fragment_duration_seconds', 'Duración de una ejecución de fragmento', ('fragment',))
+        self.exam_starts = registry.counter(
+            'exani_exam_starts_total', 'Exámenes iniciados por tipo', ('exam_type',))
+        self.exam_finishes = registry.counter(
+            'exani_exam_finishes_total', 'Exámenes terminados por tipo', ('exam_type',))
+        self.answers = registry.counter(
+            'exani_answer_events_total', 'Respuestas registradas (incluye cambios y borrados)')
+
+        self._sessions: Dict[str, Tuple[str, float]] = {}
+        self._sessions_lock = threading.Lock()
+        registry.callback('exani_active_sessions', 'Sesiones con actividad reciente', 'gauge',
+                          lambda: self.active_sessions())
+        registry.callback('exani_active_exams', 'Sesiones con actividad reciente en la pantalla de examen',
+                          'gauge', lambda: self.active_sessions('exam'))
+
+    def record_rerun(self, screen: str, seconds: float):
+        self.reruns.inc(screen)
+        self.rerun_seconds.observe(seconds, screen)
+
+    def record_fragment(self, fragment: str, seconds: float):
+        self.fragment_runs.inc(fragment)
+        self.fragment_seconds.observe(seconds, fragment)
+
+    def touch_session(self, session: str, screen: str):
+        """Marca actividad de una sesión en una pantalla"""
+        with self._sessions_lock:
+            self._sessions[session] = (screen, time.monotonic())
+
+    def active_sessions(self, screen: Optional[str] = None) -> int:
+        cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+        with self._sessions_lock:
+            for session in [s for s, (_, seen) in self._sessions.items() if seen < cutoff]:
+                del self._sessions[session]
+            return sum(1 for current, _ in self._sessions.values() if screen is None or current == screen)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(registry: MetricsRegistry, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Publica ``GET /metrics`` en un hilo de fondo"""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='exani-metrics-http', daemon=True).start()
+    return server
+
+
+def write_metrics_file(registry: MetricsRegistry, path: str):
+    """Escribe las métricas de forma atómica (archivo temporal + rename)"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_file_writer(registry: MetricsRegistry, path: str,
+                      interval: float = DEFAULT_WRITE_INTERVAL) -> threading.Thread:
+    """Reescribe el archivo de métricas cada ``interval`` segundos en un hilo de fondo"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def run():
+        while True:
+            try:
+                write_metrics_file(registry, path)
+            except OSError:
+                logger.exception("No se pudo escribir %s", path)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='exani-metrics-file', daemon=True)
+    thread.start()
+    return thread
+
+
+@lru_cache(maxsize=1)
+def get_app_metrics() -> AppMetrics:
+    """
+    Métricas del proceso; publica según EXANI_METRICS_PORT / EXANI_METRICS_FILE
+    """
+    metrics = AppMetrics()
+    port = os.environ.get('EXANI_METRICS_PORT')
+    if port:
+        host = os.environ.get('EXANI_METRICS_HOST', '127.0.0.1')
+        try:
+            start_http_server(metrics.registry, int(port), host)
+        except OSError:
+            logger.exception("No se pudo abrir el endpoint de métricas en %s:%s", host, port)
+    path = os.environ.get('EXANI_METRICS_FILE')
+    if path:
+        start_file_writer(metrics.registry, path)
+    return metrics
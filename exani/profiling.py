@@ -0,0 +1,234 @@
+"""
+Perfilado por rerun
+===================
+Capa opcional (``EXANI_PROFILE=1``) que mide cada método de render y de
+estado decorado con ``@profiled`` durante un rerun de la aplicación:
+
+- tiempo con reloj monotónico (``perf_counter``), llamadas y máximo;
+- pico de memoria asignada durante la llamada (``tracemalloc``);
+- un rerun de cada ``EXANI_PROFILE_SAMPLE`` se ejecuta además bajo
+  ``cProfile`` y se guardan sus funciones más costosas.
+
+Con el perfilado apagado ``profiled`` devuelve la función sin envolver y
+``ProfileLog.rerun`` no hace nada, así que el costo es prácticamente cero.
+Los reruns de un fragmento no pasan por ``main()``: cada fragmento abre su
+propio ``rerun`` con la etiqueta ``fragment:<nombre>`` (dentro de un rerun
+completo el bloque no hace nada y sus métodos cuentan en el rerun externo).
+Cada sesión de Streamlit corre en su propio hilo, por eso el rerun activo
+vive en un ``threading.local``; ``tracemalloc`` en cambio es del proceso, y
+con varias sesiones simultáneas el pico incluye lo que asignan las demás.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, TypeVar
+
+PROFILE_ENABLED = os.environ.get('EXANI_PROFILE') == '1'
+
+# Un rerun de cada N se perfila con cProfile (0 = nunca)
+PROFILE_SAMPLE_EVERY = int(os.environ.get('EXANI_PROFILE_SAMPLE', '0') or 0)
+
+# Reruns recientes que se conservan en memoria para el panel y el volcado
+PROFILE_HISTORY = 200
+
+# Funciones del reporte de cProfile
+CPROFILE_TOP = 25
+
+F = TypeVar('F', bound=Callable)
+
+
+class CallTiming(NamedTuple):
+    """Tiempos de un método durante un rerun"""
+    name: str
+    calls: int
+    total_ms: float
+    max_ms: float
+    peak_kib: float  # pico de memoria asignada durante la llamada
+
+
+class RerunReport(NamedTuple):
+    """Resultado de perfilar un rerun"""
+    session: str
+    started_at: float  # epoch
+    total_ms: float
+    peak_kib: float
+    timings: List[CallTiming]  # en orden de tiempo total descendente
+    cprofile: Optional[str]  # reporte de texto si el rerun fue muestreado
+    label: str = 'script'  # 'script' o 'fragment:<nombre>'
+
+
+class _Frame:
+    __slots__ = ('name', 'base', 'peak')
+
+    def __init__(self, name: str, base: int):
+        self.name = name
+        self.base = base
+        self.peak = base
+
+
+class _Rerun:
+    """Acumulador del rerun activo en el hilo"""
+
+    def __init__(self):
+        self.calls: Dict[str, List[float]] = {}  # nombre -> [llamadas, total, máximo, pico]
+        self.stack: List[_Frame] = []
+
+    def enter(self, name: str):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        self.stack.append(_Frame(name, current))
+
+    def exit(self, elapsed_ms: float):
+        frame = self.stack.pop()
+        frame.peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, frame.peak)
+        stats = self.calls.setdefault(frame.name, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed_ms
+        stats[2] = max(stats[2], elapsed_ms)
+        stats[3] = max(stats[3], (frame.peak - frame.base) / 1024)
+
+
+_local = threading.local()
+
+
+def profiled(func: F = None, *, name: Optional[str] = None) -> F:
+    """
+    Decorador: mide la función en cada rerun perfilado
+    Sin EXANI_PROFILE=1 devuelve la función original.
+    """
+    if func is None:
+        return partial(profiled, name=name)
+    if not PROFILE_ENABLED:
+        return func
+    label = name or func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        rerun = getattr(_local, 'rerun', None)
+        if rerun is None:
+            # Fuera de un rerun perfilado
+            return func(*args, **kwargs)
+        rerun.enter(label)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            rerun.exit((time.perf_counter() - started) * 1000)
+
+    return wrapper
+
+
+def _cprofile_report(profile: cProfile.Profile) -> str:
+    output = io.StringIO()
+    pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(CPROFILE_TOP)
+    return output.getvalue()
+
+
+class ProfileLog:
+    """Reruns perfilados recientes de todo el proceso"""
+
+    def __init__(self, history: int = PROFILE_HISTORY, sample_every: int = PROFILE_SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self._reports: Deque[RerunReport] = deque(maxlen=history)
+        self._reruns = 0
+        self._lock = threading.Lock()
+
+    def _should_sample(self) -> bool:
+        with self._lock:
+            self._reruns += 1
+            return bool(self.sample_every) and self._reruns % self.sample_every == 0
+
+    @contextmanager
+    def rerun(self, session: str = '', label: str = 'script') -> Iterator[None]:
+        """Perfila todo lo que ocurre dentro del bloque como un rerun"""
+        if not PROFILE_ENABLED or getattr(_local, 'rerun', None) is not None:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        rerun = _local.rerun = _Rerun()
+        profile = cProfile.Profile() if self._should_sample() else None
+        started_at = time.time()
+        rerun.enter('rerun')
+        started = time.perf_counter()
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Otro hilo ya está bajo cProfile (sólo uno a la vez)
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            rerun.exit((time.perf_counter() - started) * 1000)
+            _local.rerun = None
+            total = rerun.calls.pop('rerun')
+            timings = sorted(
+                (CallTiming(name, int(calls), total_ms, max_ms, peak)
+                 for name, (calls, total_ms, max_ms, peak) in rerun.calls.items()),
+                key=lambda timing: timing.total_ms, reverse=True
+            )
+            report = RerunReport(session, started_at, total[1], total[3], timings,
+                                 _cprofile_report(profile) if profile is not None else None, label)
+            with self._lock:
+                self._reports.append(report)
+
+    def reports(self, session: Optional[str] = None) -> List[RerunReport]:
+        with self._lock:
+            reports = list(self._reports)
+        if session is not None:
+            reports = [report for report in reports if report.session == session]
+        return reports
+
+    def summary(self) -> List[CallTiming]:
+        """Tiempos acumulados de los reruns recientes (orden descendente)"""
+        totals: Dict[str, List[float]] = {}
+        for report in self.reports():
+            for timing in report.timings:
+                stats = totals.setdefault(timing.name, [0, 0.0, 0.0, 0.0])
+                stats[0] += timing.calls
+                stats[1] += timing.total_ms
+                stats[2] = max(stats[2], timing.max_ms)
+                stats[3] = max(stats[3], timing.peak_kib)
+        return sorted(
+            (CallTiming(name, int(calls), total_ms, max_ms, peak)
+             for name, (calls, total_ms, max_ms, peak) in totals.items()),
+            key=lambda timing: timing.total_ms, reverse=True
+        )
+
+    def dump(self, path: str) -> int:
+        """Vuelca los reruns recientes a un archivo JSON; devuelve cuántos"""
+        reports = self.reports()
+        data = [
+            dict(report._asdict(), timings=[timing._asdict() for timing in report.timings])
+            for report in reports
+        ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        return len(reports)
+
+
+@lru_cache(maxsize=1)
+def get_profile_log() -> ProfileLog:
+    """Registro de perfilado compartido por todo el proceso"""
+    return ProfileLog()
@@ -0,0 +1,361 @@
+"""
+Banco de preguntas inmutable e indexado
+=======================================
+El banco se construye una sola vez por proceso y se comparte entre todas las
+sesiones. Las preguntas son tuplas inmutables con un ID estable y el banco
+expone índices precalculados por módulo y por área.
+
+Los reactivos viven en archivos por módulo dentro de un directorio de banco
+(``<modulo>.json`` con una lista de reactivos o ``<modulo>.ndjson`` con un
+reactivo por línea). Sólo se cargan los módulos que se piden y cada archivo
+se vuelve a leer únicamente cuando cambia su mtime/tamaño y su contenido.
+Otros componentes (p. ej. el índice de búsqueda) pueden suscribirse a las
+cargas y recargas de módulos.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directorio de banco por defecto (se puede cambiar con EXANI_BANK_DIR)
+DEFAULT_BANK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bank')
+
+# Extensiones reconocidas, en orden de preferencia
+BANK_FILE_EXTENSIONS = ('.json', '.ndjson')
+
+# Suscriptor de cambios de módulo: (módulo, preguntas anteriores, preguntas nuevas)
+ShardListener = Callable[[str, Sequence['Question'], Sequence['Question']], None]
+
+
+class BankFormatError(ValueError):
+    """Archivo de banco con formato inválido"""
+
+
+class Question(NamedTuple):
+    """Reactivo de opción múltiple (inmutable)"""
+    qid: int
+    module: str
+    area: str
+    text: str
+    options: Tuple[str, ...]
+    correct: int
+
+
+def make_question_id(module: str, text: str) -> int:
+    """
+    Calcula un ID estable de 63 bits a partir del módulo y el enunciado.
+    No depende del orden de las preguntas en el banco, por lo que sobrevive
+    a inserciones y reordenamientos.
+    """
+    digest = hashlib.blake2b(f"{module}\x1f{text}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+def make_question(module: str, raw: Mapping) -> Question:
+    """Convierte un reactivo en formato diccionario a un Question inmutable"""
+    text = raw['text']
+    return Question(
+        qid=int(raw.get('id') or make_question_id(module, text)),
+        module=module,
+        area=raw['area'],
+        text=text,
+        options=tuple(raw['options']),
+        correct=int(raw['correct'])
+    )
+
+
+class QuestionBank:
+    """
+    Banco de preguntas de sólo lectura con índices precalculados
+    """
+
+    __slots__ = ('_by_id', '_by_module', '_by_area', 'version', '__weakref__')
+
+    def __init__(self, questions: Iterable[Question], version: str = ''):
+        by_id: Dict[int, Question] = {}
+        by_module: Dict[str, List[int]] = {}
+        by_area: Dict[str, List[int]] = {}
+
+        for question in questions:
+            if question.qid in by_id:
+                raise ValueError(f"ID de pregunta duplicado: {question.qid} ({question.module})")
+            by_id[question.qid] = question
+            by_module.setdefault(question.module, []).append(question.qid)
+            by_area.setdefault(question.area, []).append(question.qid)
+
+        self._by_id = MappingProxyType(by_id)
+        self._by_module = MappingProxyType({k: tuple(v) for k, v in by_module.items()})
+        self._by_area = MappingProxyType({k: tuple(v) for k, v in by_area.items()})
+        self.version = version
+
+    @classmethod
+    def from_dict(cls, database: Mapping[str, Iterable[Mapping]]) -> 'QuestionBank':
+        """Construye el banco a partir de un diccionario módulo → lista de reactivos"""
+        return cls(
+            make_question(module, raw)
+            for module, items in database.items()
+            for raw in items
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, qid: int) -> bool:
+        return qid in self._by_id
+
+    def __getitem__(self, qid: int) -> Question:
+        return self._by_id[qid]
+
+    @property
+    def modules(self) -> Tuple[str, ...]:
+        """Módulos disponibles en el banco"""
+        return tuple(self._by_module)
+
+    @property
+    def areas(self) -> Tuple[str, ...]:
+        """Áreas disponibles en el banco"""
+        return tuple(self._by_area)
+
+    def module_ids(self, module: str) -> Tuple[int, ...]:
+        """IDs de las preguntas de un módulo, en el orden del banco"""
+        return self._by_module.get(module, ())
+
+    def area_ids(self, area: str) -> Tuple[int, ...]:
+        """IDs de las preguntas de un área, en el orden del banco"""
+        return self._by_area.get(area, ())
+
+    def module_questions(self, module: str) -> Tuple[Question, ...]:
+        """Preguntas de un módulo, en el orden del banco"""
+        return tuple(self._by_id[qid] for qid in self.module_ids(module))
+
+
+def read_bank_file(path: str, module: str, data: Optional[bytes] = None) -> Tuple[Question, ...]:
+    """Lee un archivo de módulo (JSON o NDJSON) y devuelve sus preguntas"""
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    try:
+        text = data.decode('utf-8')
+        if path.endswith('.ndjson'):
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            items = json.loads(text)
+        questions = tuple(make_question(module, raw) for raw in items)
+    except (UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise BankFormatError(f"{path}: {e}") from e
+    seen = set()
+    for question in questions:
+        if question.qid in seen:
+            raise BankFormatError(f"{path}: ID de pregunta duplicado {question.qid}")
+        seen.add(question.qid)
+    return questions
+
+
+class _Shard(NamedTuple):
+    """Archivo de módulo cargado en memoria"""
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str
+    questions: Tuple[Question, ...]
+
+
+class _FailedFile(NamedTuple):
+    """Archivo de módulo que no se pudo cargar (no se vuelve a leer hasta que cambie)"""
+    path: str
+    mtime_ns: int
+    size: int
+    message: str
+
+
+class QuestionBankLoader:
+    """
+    Cargador perezoso del banco por módulo con recarga en caliente
+
+    Cada módulo se lee la primera vez que se solicita. En solicitudes
+    posteriores se revisa (como mucho cada ``check_interval`` segundos) el
+    mtime y tamaño del archivo; si cambiaron y el hash del contenido también,
+    sólo ese módulo se vuelve a leer.
+
+    Un módulo cuyo archivo es inválido en la primera carga (o cuyos IDs
+    chocan con los de otro módulo) queda fuera del banco y su error se
+    consulta con ``errors``; si el archivo cambia se vuelve a intentar. En
+    una recarga se conserva la versión anterior.
+    """
+
+    def __init__(self, bank_dir: str, check_interval: float = 2.0):
+        self.bank_dir = bank_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._shards: Dict[str, _Shard] = {}
+        self._last_check: Dict[str, float] = {}
+        self._banks: Dict[Tuple[Tuple[str, str], ...], QuestionBank] = {}
+        self._listeners: List[ShardListener] = []
+        self._failed: Dict[str, _FailedFile] = {}
+        self._conflicts: Dict[str, str] = {}
+
+    def subscribe(self, listener: ShardListener):
+        """
+        Registra un suscriptor que se llama (con el lock del cargador tomado)
+        cada vez que un módulo se carga, se recarga o desaparece; recibe de
+        inmediato los módulos ya cargados.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            for module, shard in self._shards.items():
+                listener(module, (), shard.questions)
+
+    def _notify(self, module: str, old: Sequence[Question], new: Sequence[Question]):
+        for listener in self._listeners:
+            try:
+                listener(module, old, new)
+            except Exception:
+                logger.exception("Falló un suscriptor del banco al actualizar el módulo %s", module)
+
+    def available_modules(self) -> Tuple[str, ...]:
+        """Módulos con archivo en el directorio de banco (sin leerlos)"""
+        try:
+            names = os.listdir(self.bank_dir)
+        except FileNotFoundError:
+            return ()
+        modules = {os.path.splitext(name)[0] for name in names
+                   if name.endswith(BANK_FILE_EXTENSIONS)}
+        return tuple(sorted(modules))
+
+    def get_bank(self, modules: Sequence[str]) -> QuestionBank:
+        """
+        Devuelve un banco inmutable con los módulos indicados, cargando o
+        recargando sólo los archivos que lo necesiten
+        """
+        with self._lock:
+            shards = []
+            for module in dict.fromkeys(modules):
+                shard = self._refresh_shard(module)
+                if shard is not None:
+                    shards.append((module, shard))
+
+            shards.sort(key=lambda item: item[0])
+            key = tuple((module, shard.digest) for module, shard in shards)
+            bank = self._banks.get(key)
+            if bank is None:
+                shards = self._without_conflicts(shards)
+                version = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).hexdigest()
+                bank = QuestionBank((q for _, shard in shards for q in shard.questions), version)
+                # Sólo se conservan los bancos de las versiones vigentes
+                current = {m: s.digest for m, s in self._shards.items()}
+                self._banks = {k: b for k, b in self._banks.items()
+                               if all(current.get(m) == d for m, d in k)}
+                self._banks[key] = bank
+            return bank
+
+    def _without_conflicts(self, shards: List[Tuple[str, _Shard]]) -> List[Tuple[str, _Shard]]:
+        """Deja fuera los módulos con IDs que ya usa un módulo anterior"""
+        owners: Dict[int, str] = {}
+        kept = []
+        for module, shard in shards:
+            qids = [question.qid for question in shard.questions]
+            other = next((owners[qid] for qid in qids if qid in owners), None)
+            if other is not None:
+                message = f"{shard.path}: ID de pregunta duplicado con el módulo {other}"
+                if self._conflicts.get(module) != message:
+                    logger.error("Módulo %s fuera del banco: %s", module, message)
+                self._conflicts[module] = message
+                continue
+            self._conflicts.pop(module, None)
+            owners.update(dict.fromkeys(qids, module))
+            kept.append((module, shard))
+        return kept
+
+    def errors(self, modules: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """Módulos que quedaron fuera del banco, con el error y el archivo"""
+        with self._lock:
+            errors = {module: failed.message for module, failed in self._failed.items()}
+            errors.update(self._conflicts)
+        if modules is not None:
+            errors = {module: errors[module] for module in modules if module in errors}
+        return errors
+
+    def refresh_all(self) -> Tuple[str, ...]:
+        """
+        Revisa todos los módulos (los del directorio y los ya cargados, por si
+        se borró su archivo) sin armar un banco; devuelve los vigentes
+        """
+        with self._lock:
+            modules = sorted(set(self.available_modules()) | set(self._shards))
+            return tuple(module for module in modules if self._refresh_shard(module) is not None)
+
+    def _module_path(self, module: str) -> Optional[str]:
+        for ext in BANK_FILE_EXTENSIONS:
+            path = os.path.join(self.bank_dir, module + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _refresh_shard(self, module: str) -> Optional[_Shard]:
+        shard = self._shards.get(module)
+        now = time.monotonic()
+        if shard is not None and now - self._last_check.get(module, 0.0) < self.check_interval:
+            return shard
+        self._last_check[module] = now
+
+        path = shard.path if shard is not None and os.path.exists(shard.path) else self._module_path(module)
+        if path is None:
+            self._failed.pop(module, None)
+            self._conflicts.pop(module, None)
+            removed = self._shards.pop(module, None)
+            if removed is not None:
+                self._notify(module, removed.questions, ())
+            return None
+
+        stat = os.stat(path)
+        if shard is not None and shard.path == path and \
+                (shard.mtime_ns, shard.size) == (stat.st_mtime_ns, stat.st_size):
+            return shard
+        failed = self._failed.get(module)
+        if shard is None and failed is not None and \
+                failed[:3] == (path, stat.st_mtime_ns, stat.st_size):
+            return None
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if shard is not None and shard.digest == digest:
+            # Sólo cambió el mtime: se conserva lo ya cargado
+            shard = shard._replace(path=path, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            try:
+                questions = read_bank_file(path, module, data)
+            except BankFormatError as e:
+                if shard is None:
+                    # Sin versión anterior: el módulo queda fuera del banco
+                    logger.error("Módulo %s fuera del banco: %s", module, e)
+                    self._failed[module] = _FailedFile(path, stat.st_mtime_ns, stat.st_size, str(e))
+                    return None
+                # Archivo a medio escribir o inválido: se mantiene la versión anterior
+                logger.warning("No se pudo recargar el módulo %s (%s); se conserva la versión anterior", module, e)
+                return shard
+            if shard is not None:
+                logger.info("Módulo %s recargado desde %s", module, path)
+            self._failed.pop(module, None)
+            self._notify(module, shard.questions if shard is not None else (), questions)
+            shard = _Shard(path, stat.st_mtime_ns, stat.st_size, digest, questions)
+
+        self._shards[module] = shard
+        return shard
+
+
+@lru_cache(maxsize=None)
+def get_bank_loader(bank_dir: Optional[str] = None) -> QuestionBankLoader:
+    """
+    Devuelve el cargador de banco del proceso, compartido por todas las sesiones
+    """
+    return QuestionBankLoader(bank_dir or os.environ.get('EXANI_BANK_DIR', DEFAULT_BANK_DIR))
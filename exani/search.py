@@ -0,0 +1,315 @@
+"""
+Búsqueda de texto en el banco
+=============================
+Índice invertido en memoria sobre el texto, las opciones y el área de cada
+reactivo, para que el personal encuentre reactivos por redacción.
+
+- Tokenización para español: minúsculas, sin acentos ni diéresis ("Pérez"
+  y "perez" son lo mismo), sin palabras vacías ("de", "la", "que"...) y con
+  plural simple ("autores" → "autor").
+- Todas las palabras de la consulta deben aparecer (AND); ``palabra*``
+  busca por prefijo sobre las palabras tal como aparecen (sin plural
+  simple, para que ``autores*`` encuentre "autores") y usa la lista del
+  término de cada una. Un prefijo se expande a lo más a
+  ``MAX_PREFIX_TERMS`` términos; el resultado indica si se recortó.
+- Cada reactivo recibe un número de documento y cada término guarda sus
+  documentos en un ``array('i')`` ordenado (4 bytes por aparición). Los
+  filtros por módulo y área son listas más, y la intersección se hace con
+  ``np.searchsorted`` partiendo de la lista más corta.
+- El índice se suscribe al cargador del banco: cuando un módulo se recarga
+  sólo se reindexan los reactivos que cambiaron. Los eliminados quedan
+  marcados y el índice se compacta cuando son muchos.
+
+Uso::
+
+    python -m exani.search "sor juana" --module comprension_lectora
+"""
+
+import argparse
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from exani.question_bank import Question, QuestionBankLoader, get_bank_loader
+
+# Palabras vacías (ya sin acentos) que no se indexan
+STOPWORDS = frozenset("""
+a al algo ante como con contra cual cuales cuando de del desde donde el ella ellas ellos en entre era es esa
+ese eso esta este esto estos estas fue ha han hay la las le les lo los mas me mi muy no nos o para pero por
+que se si sin sobre son su sus tambien te un una uno unos unas y ya
+""".split())
+
+# Términos que se expanden como máximo al buscar por prefijo
+MAX_PREFIX_TERMS = 64
+
+# Proporción de documentos eliminados que dispara la compactación
+COMPACT_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Prefijos de las listas de módulo y área (no pueden salir del tokenizador)
+_MODULE_KEY = '\x00module:'
+_AREA_KEY = '\x00area:'
+
+
+def fold(text: str) -> str:
+    """Minúsculas sin acentos, diéresis ni tilde de la ñ"""
+    # Tras NFKD los acentos quedan como marcas combinables, que ``ascii`` descarta
+    # (junto con ¿, ¡ y demás símbolos que el tokenizador ignora de todos modos)
+    return unicodedata.normalize('NFKD', text.casefold()).encode('ascii', 'ignore').decode('ascii')
+
+
+@lru_cache(maxsize=1 << 16)
+def _stem(token: str) -> str:
+    """Plural simple del español: autores → autor, clases → clase"""
+    if len(token) > 4 and token.endswith('es') and token[-3] in 'lrndzj':
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Términos indexables de un texto"""
+    return [_stem(token) for token in _TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
+
+
+def question_tokens(question: Question) -> Set[str]:
+    """Palabras de un reactivo (texto, opciones y área) antes del plural simple"""
+    text = ' '.join((question.text, *question.options, question.area.replace('_', ' ')))
+    return set(_TOKEN_RE.findall(fold(text))) - STOPWORDS
+
+
+def question_terms(question: Question) -> Set[str]:
+    """Términos de un reactivo: texto, opciones y área"""
+    return {_stem(token) for token in question_tokens(question)}
+
+
+def _as_numpy(postings: array) -> np.ndarray:
+    # Copia: una vista bloquearía el array('i') para nuevos append
+    return np.frombuffer(postings, dtype=np.int32).copy() if len(postings) else np.zeros(0, dtype=np.int32)
+
+
+def _intersect(lists: List[array]) -> np.ndarray:
+    """Documentos presentes en todas las listas (ordenadas)"""
+    lists = sorted(lists, key=len)
+    docs = _as_numpy(lists[0])
+    for postings in lists[1:]:
+        if not len(docs):
+            break
+        other = _as_numpy(postings)
+        positions = np.searchsorted(other, docs)
+        positions[positions == len(other)] = 0
+        docs = docs[other[positions] == docs]
+    return docs
+
+
+class SearchResult(NamedTuple):
+    """Resultado de una búsqueda"""
+    total: int  # reactivos que coinciden (antes del límite)
+    questions: List[Question]  # en el orden en que se indexaron
+    elapsed_ms: float
+    truncated: bool = False  # algún prefijo tenía más de MAX_PREFIX_TERMS términos
+
+
+class QuestionSearchIndex:
+    """Índice invertido con actualización incremental por módulo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs: List[Optional[Question]] = []  # número de documento → reactivo (None = eliminado)
+        self._doc_by_qid: Dict[int, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._deleted: Set[int] = set()  # documentos eliminados pendientes de compactar
+        self._stems: Dict[str, str] = {}  # palabra sin plural simple → término
+        self._vocabulary: Optional[List[str]] = None  # palabras ordenadas, para prefijos
+
+    def __len__(self) -> int:
+        return len(self._doc_by_qid)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def _add(self, question: Question):
+        doc = len(self._docs)
+        self._docs.append(question)
+        self._doc_by_qid[question.qid] = doc
+        terms = {_MODULE_KEY + question.module, _AREA_KEY + question.area}
+        for token in question_tokens(question):
+            term = _stem(token)
+            terms.add(term)
+            if token not in self._stems:
+                self._stems[token] = term
+                self._vocabulary = None
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array('i')
+            # Los documentos nuevos tienen el número más alto: la lista sigue ordenada
+            postings.append(doc)
+
+    def _remove(self, qid: int):
+        doc = self._doc_by_qid.pop(qid, None)
+        if doc is not None:
+            self._docs[doc] = None
+            self._deleted.add(doc)
+
+    def _compact(self):
+        """Renumera los documentos vigentes y reconstruye las listas"""
+        live = [question for question in self._docs if question is not None]
+        self._docs = []
+        self._doc_by_qid = {}
+        self._postings = {}
+        self._deleted = set()
+        self._stems = {}
+        self._vocabulary = None
+        for question in live:
+            self._add(question)
+
+    def add_questions(self, questions: Iterable[Question]):
+        """Indexa (o reindexa) reactivos"""
+        with self._lock:
+            for question in questions:
+                self._remove(question.qid)
+                self._add(question)
+
+    def remove_questions(self, qids: Iterable[int]):
+        with self._lock:
+            for qid in qids:
+                self._remove(qid)
+            self._maybe_compact()
+
+    def update_module(self, module: str, old: Sequence[Question], new: Sequence[Question]):
+        """
+        Aplica la recarga de un módulo: sólo se tocan los reactivos nuevos,
+        modificados o eliminados (firma de suscriptor del cargador del banco)
+        """
+        old_by_qid = {question.qid: question for question in old}
+        new_qids = {question.qid for question in new}
+        with self._lock:
+            for qid in old_by_qid.keys() - new_qids:
+                self._remove(qid)
+            for question in new:
+                if old_by_qid.get(question.qid) != question or question.qid not in self._doc_by_qid:
+                    self._remove(question.qid)
+                    self._add(question)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self._deleted) > COMPACT_RATIO * len(self._docs):
+            self._compact()
+
+    def _prefix_postings(self, prefix: str) -> Tuple[array, bool]:
+        """
+        Unión de las listas de los términos de las palabras que empiezan con
+        ``prefix``, y si se recortó en ``MAX_PREFIX_TERMS`` términos
+        """
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._stems)
+        vocabulary = self._vocabulary
+        terms: Dict[str, None] = {}
+        truncated = False
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[i]
+            if not token.startswith(prefix):
+                break
+            term = self._stems[token]
+            if term in terms:
+                continue
+            if len(terms) == MAX_PREFIX_TERMS:
+                truncated = True
+                break
+            terms[term] = None
+        if len(terms) == 1:
+            return self._postings[next(iter(terms))], truncated
+        lists = [_as_numpy(self._postings[term]) for term in terms]
+        return array('i', np.unique(np.concatenate(lists)).tobytes() if lists else b''), truncated
+
+    def search(self, query: str, module: Optional[str] = None, area: Optional[str] = None,
+               limit: int = 50) -> SearchResult:
+        """
+        Reactivos que contienen todas las palabras de la consulta
+        (``palabra*`` = prefijo), opcionalmente de un módulo o área
+        """
+        started = time.perf_counter()
+        lists: List[array] = []
+        truncated = False
+        with self._lock:
+            for raw in query.split():
+                prefix = raw.endswith('*')
+                terms = _TOKEN_RE.findall(fold(raw.rstrip('*')))
+                for i, term in enumerate(terms):
+                    if prefix and i == len(terms) - 1:
+                        postings, cut = self._prefix_postings(term)
+                        lists.append(postings)
+                        truncated = truncated or cut
+                    elif term not in STOPWORDS:
+                        lists.append(self._postings.get(_stem(term), array('i')))
+
+            if not lists:
+                return SearchResult(0, [], (time.perf_counter() - started) * 1000, truncated)
+            if module:
+                lists.append(self._postings.get(_MODULE_KEY + module, array('i')))
+            if area:
+                lists.append(self._postings.get(_AREA_KEY + area, array('i')))
+            docs = _intersect(lists)
+            if self._deleted:
+                docs = docs[~np.isin(docs, np.fromiter(self._deleted, dtype=np.int32, count=len(self._deleted)))]
+            total = len(docs)
+            matches = [self._docs[doc] for doc in docs[:limit].tolist()]
+        return SearchResult(total, matches, (time.perf_counter() - started) * 1000, truncated)
+
+
+@lru_cache(maxsize=None)
+def get_search_index(loader: Optional[QuestionBankLoader] = None) -> QuestionSearchIndex:
+    """
+    Índice del proceso, suscrito al cargador del banco: indexa los módulos
+    ya cargados y se actualiza cuando uno se carga o se recarga
+    """
+    index = QuestionSearchIndex()
+    (loader or get_bank_loader()).subscribe(index.update_module)
+    return index
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m exani.search',
+        description='Busca reactivos del banco por redacción'
+    )
+    parser.add_argument('query', help='palabras a buscar (todas deben aparecer; palabra* = prefijo)')
+    parser.add_argument('--module', default=None, help='sólo reactivos de este módulo')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--bank-dir', default=None, help='directorio del banco (por defecto EXANI_BANK_DIR)')
+    args = parser.parse_args(argv)
+
+    loader = get_bank_loader(args.bank_dir)
+    started = time.perf_counter()
+    index = get_search_index(loader)
+    loader.refresh_all()
+    build_ms = (time.perf_counter() - started) * 1000
+    for message in loader.errors().values():
+        print(f"⚠️ Módulo omitido: {message}", file=sys.stderr)
+
+    result = index.search(args.query, module=args.module, limit=args.limit)
+    for question in result.questions:
+        print(f"{question.qid}\t{question.module}\t{question.area}\t{question.text[:100]}")
+    print(f"🔎 {result.total} reactivos en {result.elapsed_ms:.2f} ms "
+          f"(índice de {len(index)} reactivos y {index.term_count} términos en {build_ms:.0f} ms)",
+          file=sys.stderr)
+    if result.truncated:
+        print(f"⚠️ Un prefijo abarca más de {MAX_PREFIX_TERMS} términos: sólo se buscaron los primeros; "
+              "usa un prefijo más largo", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Escritura diferida al historial
+===============================
+Cola en memoria con un hilo escritor para que guardar respuestas y
+resultados no agregue la latencia del disco a la interacción del usuario.
+
+- Las respuestas se agrupan por (sesión, posición): si una pregunta se
+  contesta varias veces antes de escribir, sólo se escribe la última. Los
+  puntos de control se agrupan por token de la misma forma.
+- Se escribe un lote cuando hay ``max_batch`` eventos pendientes o cuando
+  pasan ``flush_interval`` segundos, lo que ocurra primero.
+- Si la cola llega a ``max_pending`` eventos, quien encola espera (como
+  mucho ``put_timeout`` segundos) a que el escritor libere espacio; si no
+  lo hay, el evento se descarta y se cuenta en las métricas.
+- Al cerrar (y al terminar el proceso) se escriben todos los pendientes.
+- Si la base falla ``MAX_FLUSH_RETRIES`` veces seguidas se descartan las
+  respuestas en curso y los puntos de control del lote, pero nunca los
+  intentos terminados: siguen en la cola hasta que se escriban y, si el
+  proceso termina antes, se guardan en un archivo NDJSON junto a la base
+  que la siguiente cola vuelve a encolar al arrancar.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from exani.attempt_store import AttemptRecord, AttemptStore, CheckpointRow, LiveAnswer
+
+logger = logging.getLogger(__name__)
+
+# Eventos por lote y segundos máximos entre escrituras
+DEFAULT_MAX_BATCH = 500
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Eventos pendientes antes de aplicar contrapresión
+DEFAULT_MAX_PENDING = 20000
+
+# Segundos que espera quien encola cuando la cola está llena
+DEFAULT_PUT_TIMEOUT = 0.25
+
+# Reintentos de un lote que falla antes de descartarlo
+MAX_FLUSH_RETRIES = 3
+
+
+class QueueMetrics(NamedTuple):
+    """Métricas de la cola de escritura"""
+    depth: int  # eventos pendientes
+    enqueued: int
+    coalesced: int  # respuestas reemplazadas antes de escribirse
+    dropped: int
+    written: int
+    flushes: int
+    flush_errors: int
+    last_flush_ms: float
+    max_flush_ms: float
+    total_flush_ms: float
+    failing: bool = False  # la base lleva MAX_FLUSH_RETRIES escrituras fallidas seguidas
+    unsaved_results: int = 0  # intentos terminados que aún no están en la base
+
+
+class WriteBehindQueue:
+    """
+    Cola de escritura diferida hacia un AttemptStore
+    Segura para usarse desde todas las sesiones (hilos) del servidor.
+    """
+
+    def __init__(self, store: AttemptStore,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 put_timeout: float = DEFAULT_PUT_TIMEOUT,
+                 pending_path: Optional[str] = None):
+        self.store = store
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        # Intentos que no se pudieron escribir antes de cerrar
+        self.pending_path = pending_path or store.path + '.pending.ndjson'
+
+        self._condition = threading.Condition()
+        self._answers: Dict[Tuple[str, int], LiveAnswer] = {}
+        self._results: List[AttemptRecord] = self._read_pending()
+        self._replaying = bool(self._results)
+        self._checkpoints: Dict[str, CheckpointRow] = {}
+        self._closing = False
+        self._in_flight = 0
+        self._in_flight_results = 0
+        self._in_flight_checkpoints: Dict[str, CheckpointRow] = {}
+        self._flush_requested = False
+
+        self._enqueued = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._written = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._failing = False
+
+        self._thread = threading.Thread(target=self._run, name='exani-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _depth(self) -> int:
+        return len(self._answers) + len(self._results) + len(self._checkpoints)
+
+    def _wait_for_space(self) -> bool:
+        """Contrapresión: espera a que haya lugar en la cola (con el lock tomado)"""
+        deadline = time.monotonic() + self.put_timeout
+        while self._depth() >= self.max_pending and not self._closing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._condition.notify_all()
+            self._condition.wait(remaining)
+        return not self._closing
+
+    def submit_answer(self, session_id: str, position: int, question_id: int, answer: int) -> bool:
+        """Encola una respuesta; devuelve False si se descartó"""
+        key = (session_id, position)
+        with self._condition:
+            if key in self._answers:
+                self._coalesced += 1
+            elif not self._wait_for_space():
+                self._dropped += 1
+                return False
+            self._answers[key] = LiveAnswer(session_id, position, question_id, answer, time.time())
+            self._enqueued += 1
+            if self._depth() >= self.max_batch:
+                self._condition.notify_all()
+        return True
+
+    def submit_checkpoint(self, token: str, data: bytes) -> bool:
+        """Encola el punto de control de un examen; devuelve False si se descartó"""
+        with self._condition:
+            if token in self._checkpoints:
+                self._coalesced += 1
+            elif not self._wait_for_space():
+                self._dropped += 1
+                return False
+            self._checkpoints[token] = CheckpointRow(token, data, time.time())
+            self._enqueued += 1
+            if self._depth() >= self.max_batch:
+                self._condition.notify_all()
+        return True
+
+    def pending_checkpoint(self, token: str) -> Optional[bytes]:
+        """Punto de control aún sin escribir (para reanudar antes del siguiente lote)"""
+        with self._condition:
+            row = self._checkpoints.get(token) or self._in_flight_checkpoints.get(token)
+        return row.data if row else None
+
+    def submit_result(self, record: AttemptRecord) -> bool:
+        """
+        Encola un intento terminado; devuelve False si la cola está llena
+        (quien llama debe entonces guardarlo directamente)
+        """
+        with self._condition:
+            if not self._wait_for_space():
+                self._dropped += 1
+                return False
+            self._results.append(record)
+            self._enqueued += 1
+            if self._depth() >= self.max_batch:
+                self._condition.notify_all()
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Pide escribir lo pendiente y espera a que la cola quede vacía"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while (self._depth() or self._in_flight) and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Escribe todos los pendientes y detiene el hilo escritor"""
+        with self._condition:
+            if self._closing:
+                return
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def metrics(self) -> QueueMetrics:
+        with self._condition:
+            return QueueMetrics(
+                depth=self._depth(),
+                enqueued=self._enqueued,
+                coalesced=self._coalesced,
+                dropped=self._dropped,
+                written=self._written,
+                flushes=self._flushes,
+                flush_errors=self._flush_errors,
+                last_flush_ms=self._last_flush_ms,
+                max_flush_ms=self._max_flush_ms,
+                total_flush_ms=self._total_flush_ms,
+                failing=self._failing,
+                unsaved_results=len(self._results) + self._in_flight_results
+            )
+
+    def _read_pending(self) -> List[AttemptRecord]:
+        """Intentos que quedaron sin escribir al cerrar la cola anterior"""
+        try:
+            with open(self.pending_path, encoding='utf-8') as f:
+                records = [AttemptRecord(**json.loads(line)) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, TypeError):
+            logger.exception("No se pudieron leer los intentos pendientes de %s", self.pending_path)
+            return []
+        if records:
+            logger.warning("%d intentos pendientes de %s vuelven a la cola", len(records), self.pending_path)
+        return records
+
+    def _write_pending(self, results: List[AttemptRecord]):
+        """Guarda los intentos sin escribir (reemplaza el archivo: incluye los ya reencolados)"""
+        temporary = f'{self.pending_path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                for record in results:
+                    data = record._asdict()
+                    for field in ('question_ids', 'answers', 'correct_options'):
+                        data[field] = list(data[field])
+                    f.write(json.dumps(data, ensure_ascii=False) + '\n')
+            os.replace(temporary, self.pending_path)
+        except OSError:
+            logger.critical("Se perdieron %d intentos terminados: no se pudieron escribir ni guardar en %s",
+                            len(results), self.pending_path, exc_info=True)
+            return
+        logger.error("%d intentos terminados sin escribir quedaron en %s", len(results), self.pending_path)
+
+    def _take_batch(self) -> Tuple[List[LiveAnswer], List[AttemptRecord], List[CheckpointRow], bool]:
+        """Espera a que toque escribir y toma todo lo pendiente"""
+        with self._condition:
+            deadline = time.monotonic() + self.flush_interval
+            while not (self._closing or self._flush_requested) and self._depth() < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            answers = list(self._answers.values())
+            results = self._results
+            self._in_flight_checkpoints = self._checkpoints
+            self._answers = {}
+            self._results = []
+            self._checkpoints = {}
+            self._in_flight = len(answers) + len(results) + len(self._in_flight_checkpoints)
+            self._in_flight_results = len(results)
+            self._flush_requested = False
+            return answers, results, list(self._in_flight_checkpoints.values()), self._closing
+
+    def _requeue(self, answers: List[LiveAnswer], results: List[AttemptRecord],
+                 checkpoints: List[CheckpointRow]):
+        """Devuelve a la cola un lote que no se pudo escribir (lo nuevo tiene prioridad)"""
+        with self._condition:
+            for answer in answers:
+                self._answers.setdefault((answer.session_id, answer.position), answer)
+            for checkpoint in checkpoints:
+                self._checkpoints.setdefault(checkpoint.token, checkpoint)
+            self._results[:0] = results
+
+    def _run(self):
+        failures = 0
+        while True:
+            answers, results, checkpoints, closing = self._take_batch()
+            count = len(answers) + len(results) + len(checkpoints)
+            if count:
+                started = time.perf_counter()
+                try:
+                    self.store.write_batch(answers, results, checkpoints)
+                except Exception:
+                    logger.exception("No se pudo escribir un lote de %d eventos", count)
+                    failures += 1
+                    retry = not closing and failures < MAX_FLUSH_RETRIES
+                    if retry:
+                        self._requeue(answers, results, checkpoints)
+                    elif closing:
+                        if results:
+                            self._write_pending(results)
+                    else:
+                        # Los intentos terminados nunca se descartan: siguen en la cola
+                        self._requeue([], results, [])
+                    with self._condition:
+                        self._flush_errors += 1
+                        self._in_flight = 0
+                        self._in_flight_results = 0
+                        self._in_flight_checkpoints = {}
+                        if not retry:
+                            self._failing = True
+                            self._dropped += len(answers) + len(checkpoints)
+                    if not closing:
+                        time.sleep(self.flush_interval)
+                        continue
+                else:
+                    failures = 0
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if results and self._replaying:
+                        # Los intentos del archivo pendiente iban al frente de este lote
+                        self._replaying = False
+                        try:
+                            os.remove(self.pending_path)
+                        except OSError:
+                            logger.exception("No se pudo borrar %s", self.pending_path)
+                    with self._condition:
+                        self._failing = False
+                        self._written += count
+                        self._flushes += 1
+                        self._last_flush_ms = elapsed_ms
+                        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                        self._total_flush_ms += elapsed_ms
+                        self._in_flight = 0
+                        self._in_flight_results = 0
+                        self._in_flight_checkpoints = {}
+                        # Despierta a quien espera lugar o a flush()
+                        self._condition.notify_all()
+            if closing:
+                with self._condition:
+                    if not self._depth():
+                        self._condition.notify_all()
+                        return
@@ -20,13 +20,255 @@ Funcionalidades Implementadas:
 """
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import time
-import json
-import random
-from datetime import datetime, timedelta
-import pandas as pd
-from typing import Dict, List, Optional, Tuple
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional, Sequence, Tuple
+import logging
 import math
+import os
+import sqlite3
+from array import array
+
+from exani import exam_session
+from exani.attempt_store import AttemptRecord, AttemptStore, get_attempt_store
+from exani.checkpoint import Checkpoint, decode_checkpoint, encode_checkpoint, new_token
+from exani.exam_state import ExamStats, answer_value, answered_mask, new_answer_array
+from exani.exam_forms import EXAM_MODES, ExamForm, InvalidFormCodeError, decode_form_code, display_options, get_form
+from exani.export import results_json, summary_csv
+from exani.metrics import AppMetrics, get_app_metrics
+from exani.profiling import PROFILE_ENABLED, ProfileLog, get_profile_log, profiled
+from exani.question_bank import Question, QuestionBankLoader, get_bank_loader
+from exani.write_behind import WriteBehindQueue
+
+
+@st.cache_resource
+def load_shared_bank_loader() -> QuestionBankLoader:
+    """
+    Cargador del banco de preguntas compartido por todas las sesiones del servidor
+    Los módulos se leen una sola vez por proceso y se recargan al cambiar su archivo
+    """
+    return get_bank_loader()
+
+
+@st.cache_resource
+def load_search_index():
+    """
+    Índice de búsqueda del banco (sólo con EXANI_ADMIN=1); se actualiza solo
+    cuando el cargador carga o recarga un módulo. Se importa aquí y no al
+    arrancar porque usa NumPy y el panel inicial no lo necesita.
+    """
+    from exani.search import get_search_index
+    return get_search_index(load_shared_bank_loader())
+
+
+@st.cache_resource
+def load_attempt_store() -> AttemptStore:
+    """
+    Historial de intentos (SQLite) compartido por todas las sesiones del servidor
+    """
+    return get_attempt_store()
+
+
+@st.cache_resource
+def load_app_metrics() -> AppMetrics:
+    """
+    Métricas de operación del proceso (formato Prometheus), publicadas según
+    EXANI_METRICS_PORT / EXANI_METRICS_FILE; incluye la cola de escritura
+    """
+    metrics = get_app_metrics()
+    queue = load_write_queue()
+    registry = metrics.registry
+    registry.callback('exani_write_queue_depth', 'Eventos pendientes en la cola de escritura', 'gauge',
+                      lambda: queue.metrics().depth)
+    registry.callback('exani_write_queue_written_total', 'Eventos escritos al historial', 'counter',
+                      lambda: queue.metrics().written)
+    registry.callback('exani_write_queue_dropped_total', 'Eventos descartados por la cola', 'counter',
+                      lambda: queue.metrics().dropped)
+    # Latencia de escritura como suma y conteo: rate(suma) / rate(conteo) = promedio
+    registry.callback('exani_write_queue_flushes_total', 'Lotes escritos al historial', 'counter',
+                      lambda: queue.metrics().flushes)
+    registry.callback('exani_write_queue_flush_seconds_total', 'Tiempo total escribiendo lotes', 'counter',
+                      lambda: queue.metrics().total_flush_ms / 1000)
+    registry.callback('exani_write_queue_last_flush_seconds', 'Duración del último lote escrito', 'gauge',
+                      lambda: queue.metrics().last_flush_ms / 1000)
+    registry.callback('exani_write_queue_max_flush_seconds', 'Duración del lote más lento', 'gauge',
+                      lambda: queue.metrics().max_flush_ms / 1000)
+    registry.callback('exani_write_queue_flush_errors_total', 'Lotes que fallaron al escribirse', 'counter',
+                      lambda: queue.metrics().flush_errors)
+    registry.callback('exani_write_queue_failing', '1 si el historial no acepta escrituras', 'gauge',
+                      lambda: int(queue.metrics().failing))
+    registry.callback('exani_write_queue_unsaved_results', 'Exámenes terminados aún sin escribir', 'gauge',
+                      lambda: queue.metrics().unsaved_results)
+    return metrics
+
+
+@st.cache_resource
+def load_profile_log() -> ProfileLog:
+    """Registro de perfilado compartido por todas las sesiones (EXANI_PROFILE=1)"""
+    return get_profile_log()
+
+
+@st.cache_resource
+def load_write_queue() -> WriteBehindQueue:
+    """
+    Cola de escritura diferida al historial: las sesiones encolan respuestas y
+    resultados y un hilo del servidor los escribe por lotes
+    """
+    return WriteBehindQueue(load_attempt_store())
+
+
+# Modo administrador (EXANI_ADMIN=1): exportación del historial y búsqueda en el banco
+ADMIN_MODE = os.environ.get('EXANI_ADMIN') == '1'
+
+# Modo depuración (EXANI_DEBUG=1): verifica las estadísticas acumuladas en cada rerun
+DEBUG_MODE = os.environ.get('EXANI_DEBUG') == '1'
+
+# Reactivos que se muestran como máximo en la búsqueda del banco
+BANK_SEARCH_LIMIT = 50
+
+# Directorio donde el panel de perfilado vuelca los reruns
+PROFILE_DUMP_DIR = os.environ.get('EXANI_PROFILE_DIR', os.path.join('stats', 'profiles'))
+
+# Cada cuántos segundos el servidor verifica el límite de tiempo sin interacción
+DEADLINE_CHECK_SECONDS = 15
+
+# Retraso visual (en el navegador) antes de mostrar la siguiente pregunta al auto-avanzar
+AUTO_ADVANCE_DELAY_MS = 150
+
+# Botones por página en la navegación rápida (independiente del largo del examen)
+QUICK_NAV_PAGE_SIZE = 10
+
+# Parámetro de la URL con el token para reanudar el examen en curso
+RESUME_QUERY_PARAM = 't'
+
+# Preguntas por página en la pantalla de revisión
+REVIEW_PAGE_SIZE = 10
+
+# Filtros de estado de la revisión → clave del índice de revisión
+REVIEW_STATUS_FILTERS = {
+    "Todas": None,
+    "Correctas": 'correct',
+    "Incorrectas": 'wrong',
+    "Sin Responder": 'skipped'
+}
+
+# Segundos restantes a partir de los cuales el temporizador parpadea
+TIMER_WARNING_SECONDS = 300
+
+# Temporizador que corre en el navegador a partir del límite emitido por el servidor.
+# El HTML sólo depende del límite, así que no se vuelve a enviar en cada rerun.
+TIMER_HTML_TEMPLATE = """
+<style>
+body { margin: 0; font-family: "Source Sans Pro", sans-serif; }
+.timer-display {
+    background: linear-gradient(135deg, #dc2626, #b91c1c);
+    color: white;
+    padding: 15px 20px;
+    border-radius: 10px;
+    text-align: center;
+    font-size: 1.1rem;
+    font-weight: 600;
+    margin: 1rem 0;
+    min-width: 120px;
+}
+.timer-warning { animation: pulse 1s ease-in-out infinite; }
+@keyframes pulse {
+    0%, 100% { transform: scale(1); }
+    50% { transform: scale(1.05); }
+}
+</style>
+<div id="timer" class="timer-display">⏰ <span id="time">--:--:--</span></div>
+<script>
+const deadline = __DEADLINE_MS__;
+const warningSeconds = __WARNING_SECONDS__;
+const box = document.getElementById("timer");
+const label = document.getElementById("time");
+const pad = (n) => String(n).padStart(2, "0");
+function tick() {
+    const remaining = Math.max(0, Math.ceil((deadline - Date.now()) / 1000));
+    label.textContent = pad(Math.floor(remaining / 3600)) + ":" +
+        pad(Math.floor((remaining % 3600) / 60)) + ":" + pad(remaining % 60);
+    box.classList.toggle("timer-warning", remaining <= warningSeconds);
+    if (remaining > 0) {
+        const untilNextSecond = (deadline - Date.now()) % 1000;
+        setTimeout(tick, untilNextSecond > 0 ? untilNextSecond : 1000);
+    }
+}
+tick();
+</script>
+"""
+
+
+# Hoja de estilos servida desde static/ (server.enableStaticServing en .streamlit/config.toml)
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'exani.css')
+
+
+@st.cache_resource
+def load_stylesheet_tag() -> str:
+    """
+    Etiqueta HTML para cargar la hoja de estilos, calculada una vez por proceso
+    Con el servido estático activo se envía sólo un <link> con el hash del
+    contenido (el navegador cachea el archivo); si no, se incrusta el CSS.
+    """
+    with open(STYLESHEET_PATH, encoding='utf-8') as f:
+        css = f.read()
+    
+    if st.get_option('server.enableStaticServing'):
+        digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+        return f'<link rel="stylesheet" href="app/static/exani.css?v={digest}">'
+    return f'<style>\n{css}</style>'
+
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def build_indicators_html(total_questions: int, current_idx: int, answered_bits: int) -> str:
+    """
+    HTML de la tira de indicadores, memorizado por (pregunta actual, mapa de
+    bits de respondidas); un rerun sin cambios reutiliza la misma cadena
+    """
+    parts = ['<div class="indicators">']
+    for i in range(total_questions):
+        # Determinar el estado del indicador
+        if i == current_idx:
+            parts.append(f'<div class="indicator indicator-current" title="Pregunta {i+1} (Actual)"></div>')
+        elif answered_bits >> i & 1:
+            parts.append(f'<div class="indicator indicator-answered" title="Pregunta {i+1} (Respondida)"></div>')
+        else:
+            parts.append(f'<div class="indicator" title="Pregunta {i+1}"></div>')
+    parts.append('</div>')
+    return ''.join(parts)
+
+
+def rerun_fragment():
+    """
+    Vuelve a ejecutar sólo el fragmento actual
+    Si el fragmento se está ejecutando como parte de un rerun completo
+    (p. ej. primera carga), Streamlit no permite el alcance de fragmento y
+    se hace un rerun completo.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+@contextmanager
+def fragment_run(name: str) -> Iterator[None]:
+    """
+    Envuelve el cuerpo de un fragmento: sus reruns no pasan por main(), así
+    que se perfilan aquí (etiqueta fragment:<nombre>) y su latencia va a
+    exani_fragment_duration_seconds
+    """
+    started = time.perf_counter()
+    try:
+        with load_profile_log().rerun(st.session_state.get('session_tag', ''), f'fragment:{name}'):
+            yield
+    finally:
+        # También cuenta las ejecuciones interrumpidas por st.rerun()
+        load_app_metrics().record_fragment(name, time.perf_counter() - started)
+
 
 class ExaniSimulatorComplete:
     """
@@ -34,9 +276,12 @@ class ExaniSimulatorComplete:
     """
     
     def __init__(self):
+        self.reported_bank_errors = set()
         self.init_session_state()
+        self.resume_from_url()
         self.load_complete_question_database()
         
+    @profiled
     def init_session_state(self):
         """Inicializa todas las variables de estado de la sesión"""
         # Estados principales del simulador
@@ -44,16 +289,35 @@ class ExaniSimulatorComplete:
             st.session_state.current_screen = 'dashboard'
         if 'current_question_index' not in st.session_state:
             st.session_state.current_question_index = 0
-        if 'questions' not in st.session_state:
-            st.session_state.questions = []
+        # Código de la forma (reconstruye preguntas y orden de opciones) y
+        # respuestas (array('b'), UNANSWERED = sin responder)
+        if 'form_code' not in st.session_state:
+            st.session_state.form_code = None
         if 'user_answers' not in st.session_state:
-            st.session_state.user_answers = []
+            st.session_state.user_answers = new_answer_array(0)
+        if 'exam_bank' not in st.session_state:
+            st.session_state.exam_bank = None
+        # Avisos del muestreo (módulos que no alcanzaron su cuota)
+        if 'sampling_warnings' not in st.session_state:
+            st.session_state.sampling_warnings = []
+        # Estadísticas acumuladas (se actualizan en O(1) al responder)
+        if 'exam_stats' not in st.session_state:
+            st.session_state.exam_stats = ExamStats()
+        # Mapa de bits de preguntas respondidas (bit i = pregunta i)
+        if 'answered_mask' not in st.session_state:
+            st.session_state.answered_mask = 0
+        # Página de navegación rápida elegida: (página, pregunta actual al elegirla)
+        if 'quick_nav_page' not in st.session_state:
+            st.session_state.quick_nav_page = None
         if 'exam_start_time' not in st.session_state:
             st.session_state.exam_start_time = None
         if 'time_remaining' not in st.session_state:
             st.session_state.time_remaining = 0
         if 'timer_active' not in st.session_state:
             st.session_state.timer_active = False
+        # Límite absoluto del examen (epoch en segundos) emitido por el servidor
+        if 'exam_deadline' not in st.session_state:
+            st.session_state.exam_deadline = None
             
         # Configuración del examen (equivalente al objeto examConfig de JavaScript)
         if 'exam_config' not in st.session_state:
@@ -61,7 +325,9 @@ class ExaniSimulatorComplete:
                 'type': 'transversales',
                 'modules': ['pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta'],
                 'time_limit': 180,  # minutos
-                'question_count': 30
+                'question_count': 30,
+                'shuffle_options': False,
+                'user_id': ''
             }
             
         # Estados para modales y notificaciones
@@ -72,449 +338,85 @@ class ExaniSimulatorComplete:
         if 'notification_type' not in st.session_state:
             st.session_state.notification_type = "success"
             
+        # Auto-avance al responder, configurable por modo de examen
+        if 'auto_advance_by_mode' not in st.session_state:
+            st.session_state.auto_advance_by_mode = {}
+        if 'just_advanced' not in st.session_state:
+            st.session_state.just_advanced = False
+            
         # Resultados finales
         if 'final_results' not in st.session_state:
             st.session_state.final_results = {}
+        # Índice de revisión (se calcula al terminar) y página actual por filtro
+        if 'review_index' not in st.session_state:
+            st.session_state.review_index = None
+        if 'review_page' not in st.session_state:
+            st.session_state.review_page = (None, 0)
             
+    @profiled
     def load_complete_question_database(self):
         """
-        Carga la base de datos completa de preguntas EXANI-II
+        Obtiene el banco de preguntas EXANI-II compartido por todo el proceso
+        Sólo se cargan los módulos de la configuración actual
         Equivalente al objeto questionDatabase de JavaScript
         """
-        self.question_database = {
-            'pensamiento_matematico': [
-                {
-                    'text': 'En un plano se representa la construcción de una escalera para subir a un edificio. ¿Cuál es la medida del ángulo x si se tiene un ángulo de elevación de 20°?',
-                    'options': ['A) 20°', 'B) 45°', 'C) 70°'],
-                    'correct': 2,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Selecciona una opción equivalente al siguiente polinomio: $(8)(x - y)^3$',
-                    'options': ['A) $(4x - 4y)(4x + 4y)$', 'B) $(2x - 2y)^3$', 'C) $(4x - 4y)^3$'],
-                    'correct': 1,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Si $\\cos(x) = -4/5$ con $x$ en el segundo cuadrante, el valor de $\\sen(x)$ es:',
-                    'options': ['A) $-3/4$', 'B) $3/5$', 'C) $-3/5$'],
-                    'correct': 1,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Determina los valores de $x$ y $y$ en el siguiente sistema de ecuaciones: $3x - 2y = 13$ y $2x + 6y = -6$',
-                    'options': ['A) $x = -3, y = 2$', 'B) $x = 3, y = -2$', 'C) $x = 3, y = 2$'],
-                    'correct': 1,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Simplifica la siguiente expresión: $(8a³b⁴ - 18ab⁶)/(2ab)$',
-                    'options': ['A) $4a²b³ - 9b⁵$', 'B) $4a²b³ - 9ab⁵$', 'C) $6a²b³ - 16b⁵$'],
-                    'correct': 0,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'En un salón de clases de 20 alumnos, hay 12 mexicanos, 6 de Estados Unidos y 2 de Canadá. ¿Cuál es la probabilidad de que al nombrar lista se elija a un alumno de Estados Unidos o Canadá?',
-                    'options': ['A) 1/20', 'B) 2/20', 'C) 8/20'],
-                    'correct': 2,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Si $2^{4x} = 4^{x+2}$, ¿cuál es el valor de x?',
-                    'options': ['A) 0', 'B) 1', 'C) 2'],
-                    'correct': 2,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Simplifica la siguiente expresión: $(x + 3)(3x - 2)$',
-                    'options': ['A) $3x² + 7x - 6$', 'B) $3x² - 7x - 6$', 'C) $3x² + 7x + 6$'],
-                    'correct': 0,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': '¿Qué opción es equivalente a la expresión $16(x + 2y)(x + 2y)$?',
-                    'options': ['A) $(4x + 8y)²$', 'B) $(16x + 32y)²$', 'C) $(16x + 2y)²$'],
-                    'correct': 0,
-                    'area': 'Pensamiento Matemático'
-                },
-                {
-                    'text': 'Selecciona la opción equivalente a $9(x - 5)²$',
-                    'options': ['A) $(3x - 15)²$', 'B) $(9x - 45)²$', 'C) $(3x - 5)²$'],
-                    'correct': 0,
-                    'area': 'Pensamiento Matemático'
-                }
-            ],
-            'comprension_lectora': [
-                {
-                    'text': 'Del retrato: ¿Qué se puede decir del narrador de la historia?',
-                    'options': ['A) No es ninguno de los personajes involucrados', 'B) Es la víctima del asesinato', 'C) Es la protagonista de la historia'],
-                    'correct': 2,
-                    'area': 'Comprensión Lectora'
-                },
-                {
-                    'text': 'Del retrato: El personaje principal del relato es...',
-                    'options': ['A) Ana', 'B) Eponina', 'C) El niño'],
-                    'correct': 1,
-                    'area': 'Comprensión Lectora'
-                },
-                {
-                    'text': 'Del retrato: ¿Qué palabra sintetiza mejor el estado anímico de Eponina?',
-                    'options': ['A) Hastío', 'B) Odio', 'C) Tristeza'],
-                    'correct': 0,
-                    'area': 'Comprensión Lectora'
-                },
-                {
-                    'text': 'Poema "Antes del reino": En el poema da a entender que la persona a quien la voz lírica habla...',
-                    'options': ['A) lo trata muy mal', 'B) tiene múltiples personalidades', 'C) es anterior y posterior a todas las cosas'],
-                    'correct': 2,
-                    'area': 'Comprensión Lectora'
-                },
-                {
-                    'text': 'Del poema: Se puede decir que la persona a quien habla la voz lírica es...',
-                    'options': ['A) omnipresente', 'B) omnisciente', 'C) omnipotente'],
-                    'correct': 0,
-                    'area': 'Comprensión Lectora'
-                },
-                {
-                    'text': 'El reglamento deportivo escolar establece que en los equipos mixtos de voleibol, la razón entre niños y niñas debe ser de 5:4. Se planea formar 3 equipos de 9 integrantes y ya se han registrado 9 niñas y 1 niño, por lo que para completar los equipos hacen falta _____ niñas y _____ niños.',
-                    'options': ['A) 3, 14', 'B) 6, 11', 'C) 9, 8'],
-                    'correct': 1,
-                    'area': 'Comprensión Lectora'
-                }
-            ],
-            'redaccion_indirecta': [
-                {
-                    'text': 'Complete el fragmento con las grafías correctas: El ga___o cruzó la va___a del ga___inero y se extra___ó en la arboleda que hay al lado.',
-                    'options': ['A) ll – ll – ll – v', 'B) ll – y – ll – b', 'C) ll – y – ll – v'],
-                    'correct': 0,
-                    'area': 'Redacción Indirecta'
-                },
-                {
-                    'text': 'Seleccione las palabras cuyo significado se opone en la oración: A diferencia de los alumnos de la mañana, que son todos muy participativos y puntuales, los vespertinos son más bien medio tímidos y flojos.',
-                    'options': ['A) Puntuales – flojos', 'B) Participativos – tímidos', 'C) Mañana – diferencia'],
-                    'correct': 1,
-                    'area': 'Redacción Indirecta'
-                },
-                {
-                    'text': 'Elija la oración puntuada de manera correcta:',
-                    'options': ['A) A continuación, las noticias del día', 'B) Patricia, comió una ensalada que lo hizo daño', 'C) Debo comprar lechuga, jamón, pan, y queso'],
-                    'correct': 0,
-                    'area': 'Redacción Indirecta'
-                },
-                {
-                    'text': 'Complete el enunciado con la expresión que le da sentido: A pesar de que disfruto mucho de jugar videojuegos, no soy un jugador tan diverso como algunas personas piensan, sino que me gusta un tipo específico de juego, _______ me gustan mucho los RPG.',
-                    'options': ['A) Concretamente', 'B) En realidad', 'C) Sobre todo'],
-                    'correct': 0,
-                    'area': 'Redacción Indirecta'
-                },
-                {
-                    'text': 'Señale la oración acentuada de forma correcta:',
-                    'options': ['A) Andrea ganó el primer lugar en la competencia de natación', 'B) Desde que volvió de su viaje, Arturo actúa de manera muy extraña', 'C) En ocasiones lo mejor para concentrarse es tratar de hallar un lugar tranquilo donde estar a solas'],
-                    'correct': 0,
-                    'area': 'Redacción Indirecta'
-                },
-                {
-                    'text': 'Elija la oración escrita correctamente:',
-                    'options': ['A) La tarea de matemáticas y la de biología estuvo muy difícil', 'B) La sopa y el guiso que comimos hoy estaba muy salado', 'C) Lucía leyó un libro y un artículo muy interesantes'],
-                    'correct': 2,
-                    'area': 'Redacción Indirecta'
-                }
-            ],
-            'biologia': [
-                {
-                    'text': '¿Cuál es la unidad básica de la vida?',
-                    'options': ['A) La célula', 'B) El átomo', 'C) El tejido'],
-                    'correct': 0,
-                    'area': 'Biología'
-                },
-                {
-                    'text': '¿Qué proceso realizan las plantas para obtener energía?',
-                    'options': ['A) Fotosíntesis', 'B) Respiración', 'C) Digestión'],
-                    'correct': 0,
-                    'area': 'Biología'
-                }
-            ],
-            'fisica': [
-                {
-                    'text': '¿Cuál es la fórmula para calcular la velocidad?',
-                    'options': ['A) v = d/t', 'B) v = t/d', 'C) v = d × t'],
-                    'correct': 0,
-                    'area': 'Física'
-                },
-                {
-                    'text': '¿Cuál es la unidad de medida de la fuerza en el Sistema Internacional?',
-                    'options': ['A) Newton', 'B) Joule', 'C) Pascal'],
-                    'correct': 0,
-                    'area': 'Física'
-                }
-            ],
-            'quimica': [
-                {
-                    'text': '¿Cuál es el símbolo químico del oro?',
-                    'options': ['A) Au', 'B) Ag', 'C) Fe'],
-                    'correct': 0,
-                    'area': 'Química'
-                },
-                {
-                    'text': '¿Cuántos protones tiene el átomo de carbono?',
-                    'options': ['A) 6', 'B) 12', 'C) 14'],
-                    'correct': 0,
-                    'area': 'Química'
-                }
-            ],
-            'historia': [
-                {
-                    'text': '¿En qué año se consumó la Independencia de México?',
-                    'options': ['A) 1821', 'B) 1810', 'C) 1519'],
-                    'correct': 0,
-                    'area': 'Historia'
-                }
-            ],
-            'literatura': [
-                {
-                    'text': '¿Quién escribió "Cien años de soledad"?',
-                    'options': ['A) Gabriel García Márquez', 'B) Mario Vargas Llosa', 'C) Octavio Paz'],
-                    'correct': 0,
-                    'area': 'Literatura'
-                }
-            ]
-        }
+        if st.session_state.exam_bank is not None and st.session_state.form_code:
+            # Examen en curso: se resuelve contra el banco con el que se generó
+            self.question_bank = st.session_state.exam_bank
+            self.set_exam_form(get_form(self.question_bank, st.session_state.form_code))
+            return
+        modules = st.session_state.exam_config.get('modules', [])
+        loader = load_shared_bank_loader()
+        self.question_bank = loader.get_bank(modules)
+        self.report_bank_errors(loader, modules)
+        self.set_exam_form(None)
+
+    def report_bank_errors(self, loader: QuestionBankLoader, modules: Sequence[str]):
+        """Avisa (una vez por rerun) de los módulos que quedaron fuera del banco"""
+        for module, message in loader.errors(modules).items():
+            if module not in self.reported_bank_errors:
+                self.reported_bank_errors.add(module)
+                st.error(f"❌ El módulo {module.replace('_', ' ').title()} quedó fuera del banco: {message}")
+
+    def set_exam_form(self, form: Optional[ExamForm]):
+        """Fija la forma del examen en curso (compartida entre sesiones por código)"""
+        self.exam_form = form
+        self.question_ids = form.question_ids if form is not None else ()
+
+    def get_question(self, index: int) -> Question:
+        """Resuelve la pregunta en la posición indicada contra el banco compartido"""
+        return self.question_bank[self.question_ids[index]]
+
+    def iter_exam_questions(self) -> Iterator[Question]:
+        """Recorre las preguntas del examen en orden, resueltas contra el banco"""
+        bank = self.question_bank
+        return (bank[qid] for qid in self.question_ids)
+
+    @profiled
+    def set_answer(self, index: int, option: int):
+        """Guarda la respuesta de una pregunta y actualiza las estadísticas en O(1)"""
+        st.session_state.answered_mask = exam_session.record_answer(
+            st.session_state.exam_stats, st.session_state.user_answers, st.session_state.answered_mask,
+            index, self.get_question(index), option
+        )
+        load_app_metrics().answers.inc()
+        # Se escribe en segundo plano, fuera del camino de la interacción
+        if st.session_state.get('attempt_session_id'):
+            load_write_queue().submit_answer(
+                st.session_state.attempt_session_id, index, self.question_ids[index], option
+            )
+            self.save_checkpoint()
     
+    @profiled
     def apply_custom_css(self):
         """
         Aplica CSS personalizado para replicar el diseño del HTML original
+        La hoja de estilos se sirve como recurso estático cacheado por el
+        navegador; en cada rerun sólo se envía la etiqueta <link>
         """
-        st.markdown("""
-        <style>
-        /* Estilos principales equivalentes al CSS original */
-        .main-header {
-            background: linear-gradient(135deg, #2563eb, #1e40af);
-            color: white;
-            padding: 2rem;
-            border-radius: 20px 20px 0 0;
-            text-align: center;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-            margin-bottom: 0;
-            position: relative;
-            overflow: hidden;
-        }
-        
-        .main-header::before {
-            content: '';
-            position: absolute;
-            top: -50%;
-            left: -50%;
-            width: 200%;
-            height: 200%;
-            background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
-            animation: shimmer 3s ease-in-out infinite;
-        }
-        
-        @keyframes shimmer {
-            0%, 100% { transform: rotate(0deg); }
-            50% { transform: rotate(180deg); }
-        }
-        
-        .timer-display {
-            background: linear-gradient(135deg, #dc2626, #b91c1c);
-            color: white;
-            padding: 15px 20px;
-            border-radius: 10px;
-            text-align: center;
-            font-size: 1.1rem;
-            font-weight: 600;
-            margin: 1rem 0;
-            min-width: 120px;
-        }
-        
-        .timer-warning {
-            animation: pulse 1s ease-in-out infinite;
-        }
-        
-        @keyframes pulse {
-            0%, 100% { transform: scale(1); }
-            50% { transform: scale(1.05); }
-        }
-        
-        .question-card {
-            background: white;
-            border: 2px solid #e2e8f0;
-            border-radius: 15px;
-            padding: 2rem;
-            margin: 1rem 0;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.05);
-            animation: fadeInUp 0.5s ease-out;
-        }
-        
-        @keyframes fadeInUp {
-            from {
-                opacity: 0;
-                transform: translateY(20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-        
-        .stats-panel {
-            background: #f8fafc;
-            border-radius: 15px;
-            padding: 20px;
-            margin-bottom: 20px;
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-            gap: 15px;
-        }
-        
-        .stat-item {
-            text-align: center;
-            padding: 15px;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-        }
-        
-        .stat-value {
-            font-size: 1.5rem;
-            font-weight: 600;
-            color: #2563eb;
-            margin-bottom: 5px;
-        }
-        
-        .indicators {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 8px;
-            justify-content: center;
-            margin: 1rem 0;
-        }
-        
-        .indicator {
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            background: #e2e8f0;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            position: relative;
-        }
-        
-        .indicator-current {
-            background: #2563eb;
-            transform: scale(1.3);
-            box-shadow: 0 0 10px rgba(37, 99, 235, 0.5);
-        }
-        
-        .indicator-answered {
-            background: #059669;
-        }
-        
-        .mode-card {
-            background: #f8fafc;
-            border: 2px solid #e2e8f0;
-            border-radius: 15px;
-            padding: 1.5rem;
-            margin: 0.5rem 0;
-            cursor: pointer;
-            transition: all 0.3s ease;
-        }
-        
-        .mode-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            border-color: #2563eb;
-        }
-        
-        .mode-active {
-            border-color: #2563eb;
-            background: linear-gradient(135deg, rgba(37, 99, 235, 0.1), rgba(30, 64, 175, 0.1));
-        }
-        
-        .results-score {
-            background: linear-gradient(135deg, #059669, #047857);
-            color: white;
-            padding: 2rem;
-            border-radius: 20px;
-            text-align: center;
-            margin: 1rem 0;
-            position: relative;
-            overflow: hidden;
-        }
-        
-        .results-score::before {
-            content: '';
-            position: absolute;
-            top: -50%;
-            left: -50%;
-            width: 200%;
-            height: 200%;
-            background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
-            animation: scoreShimmer 4s ease-in-out infinite;
-        }
-        
-        @keyframes scoreShimmer {
-            0%, 100% { transform: rotate(0deg) scale(1); }
-            50% { transform: rotate(180deg) scale(1.1); }
-        }
-        
-        .score-number {
-            font-size: 3rem;
-            font-weight: 700;
-            margin-bottom: 0.5rem;
-            position: relative;
-            z-index: 1;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-        }
-        
-        .progress-bar {
-            height: 8px;
-            background: #e2e8f0;
-            border-radius: 4px;
-            overflow: hidden;
-            margin: 1rem 0;
-            position: relative;
-        }
-        
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, #2563eb, #1e40af);
-            transition: width 0.3s ease;
-            position: relative;
-        }
-        
-        .progress-fill::after {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: linear-gradient(45deg, transparent 30%, rgba(255,255,255,0.3) 50%, transparent 70%);
-            animation: progressShine 2s ease-in-out infinite;
-        }
-        
-        @keyframes progressShine {
-            0% { transform: translateX(-100%); }
-            100% { transform: translateX(100%); }
-        }
-        
-        /* Estilos para hacer la interfaz responsive */
-        @media (max-width: 768px) {
-            .stats-panel {
-                grid-template-columns: repeat(2, 1fr);
-            }
-            .indicators {
-                gap: 6px;
-            }
-            .indicator {
-                width: 10px;
-                height: 10px;
-            }
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        st.markdown(load_stylesheet_tag(), unsafe_allow_html=True)
     
+    @profiled
     def render_header(self):
         """Renderiza el encabezado principal equivalente al HTML"""
         st.markdown("""
@@ -524,6 +426,7 @@ class ExaniSimulatorComplete:
         </div>
         """, unsafe_allow_html=True)
     
+    @profiled
     def render_dashboard(self):
         """
         Renderiza el dashboard principal con modos y configuración
@@ -540,25 +443,22 @@ class ExaniSimulatorComplete:
                 if st.button("🎯 Áreas Transversales", 
                            help="Pensamiento Matemático, Comprensión Lectora y Redacción Indirecta\n90 preguntas - 3 horas",
                            use_container_width=True, key="mode_trans"):
-                    self.update_exam_config('transversales', 90, 180, 
-                                          ['pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta'])
+                    self.update_exam_config('transversales', *EXAM_MODES['transversales'])
                 
                 if st.button("📚 Módulos Específicos",
                            help="Conocimientos específicos por carrera\n48 preguntas - Variable",
                            use_container_width=True, key="mode_disc"):
-                    self.update_exam_config('disciplinares', 48, 120, 
-                                          ['biologia', 'fisica', 'quimica'])
+                    self.update_exam_config('disciplinares', *EXAM_MODES['disciplinares'])
                 
                 if st.button("🎓 EXANI-II Completo",
                            help="Simulacro completo oficial 138 reactivos\n138 preguntas - 4.5 horas",
                            use_container_width=True, key="mode_comp"):
-                    self.update_exam_config('completo', 138, 270, 
-                                          ['pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta', 'biologia', 'fisica'])
+                    self.update_exam_config('completo', *EXAM_MODES['completo'])
                 
                 if st.button("🔍 Información Diagnóstica",
                            help="Inglés (no cuenta para calificación)\n30 preguntas - 30 min",
                            use_container_width=True, key="mode_ing"):
-                    self.update_exam_config('ingles', 30, 30, ['literatura'])
+                    self.update_exam_config('ingles', *EXAM_MODES['ingles'])
         
         with col2:
             st.markdown("### ⚙️ Configuración del Examen")
@@ -622,188 +522,384 @@ class ExaniSimulatorComplete:
             )
             st.session_state.exam_config['question_count'] = question_count
             
+            # Auto-avance para el modo seleccionado
+            exam_type = st.session_state.exam_config['type']
+            st.session_state.auto_advance_by_mode[exam_type] = st.checkbox(
+                "⏩ Avanzar automáticamente al responder",
+                value=self.is_auto_advance_enabled(),
+                key=f"auto_advance_{exam_type}"
+            )
+            
+            # Mezclar el orden de las opciones (queda registrado en el código de forma)
+            st.session_state.exam_config['shuffle_options'] = st.checkbox(
+                "🔀 Mezclar opciones",
+                value=st.session_state.exam_config.get('shuffle_options', False),
+                key="shuffle_options"
+            )
+            
+            # Identificador para el historial de intentos
+            st.session_state.exam_config['user_id'] = st.text_input(
+                "👤 Nombre o matrícula (historial):",
+                value=st.session_state.exam_config.get('user_id', ''),
+                key="user_id_input"
+            ).strip()
+            
             # Botón para iniciar examen
             if st.button("🚀 Iniciar Simulacro", type="primary", use_container_width=True):
                 if self.start_exam():
                     st.rerun()
+            
+            # Repetir una forma compartida (mismas preguntas en el mismo orden)
+            st.markdown("---")
+            form_code = st.text_input(
+                "🔑 Código de forma:",
+                placeholder="XXXX-XXXX-XXXX-XXXX",
+                key="form_code_input"
+            )
+            if st.button("📋 Usar código", use_container_width=True, disabled=not form_code.strip()):
+                if self.start_exam(form_code.strip()):
+                    st.rerun()
+            
+            # Reanudar un examen en curso desde otro navegador o pestaña
+            resume_token = st.text_input(
+                "🔖 Reanudar examen (token):",
+                key="resume_token_input"
+            )
+            if st.button("▶️ Reanudar", use_container_width=True, disabled=not resume_token.strip()):
+                if self.resume_exam(resume_token.strip()):
+                    st.rerun()
+    
+    def is_auto_advance_enabled(self) -> bool:
+        """Indica si el modo de examen actual avanza automáticamente al responder"""
+        exam_type = st.session_state.exam_config['type']
+        return st.session_state.auto_advance_by_mode.get(exam_type, True)
     
-    def update_exam_config(self, exam_type: str, question_count: int, time_limit: int, modules: List[str]):
+    def update_exam_config(self, exam_type: str, question_count: int, time_limit: int, modules: Sequence[str]):
         """Actualiza la configuración del examen"""
         st.session_state.exam_config.update({
             'type': exam_type,
             'question_count': question_count,
             'time_limit': time_limit,
-            'modules': modules
+            'modules': list(modules)
         })
     
     def update_exam_settings_by_type(self, exam_type: str):
         """Actualiza configuraciones automáticamente según el tipo de examen"""
-        configs = {
-            'transversales': (90, 180, ['pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta']),
-            'disciplinares': (48, 120, ['biologia', 'fisica', 'quimica']),
-            'completo': (138, 270, ['pensamiento_matematico', 'comprension_lectora', 'redaccion_indirecta', 'biologia', 'fisica']),
-            'ingles': (30, 30, ['literatura'])
-        }
-        
-        if exam_type in configs:
-            question_count, time_limit, modules = configs[exam_type]
+        if exam_type in EXAM_MODES:
+            question_count, time_limit, modules = EXAM_MODES[exam_type]
             st.session_state.exam_config.update({
                 'question_count': question_count,
                 'time_limit': time_limit,
-                'modules': modules
+                'modules': list(modules)
             })
     
-    def start_exam(self) -> bool:
+    @profiled
+    def start_exam(self, form_code: Optional[str] = None) -> bool:
         """
         Inicia el examen - Equivalente a la función startExam() de JavaScript
+        Con ``form_code`` se reconstruye una forma compartida en lugar de
+        generar una nueva
         """
-        if not st.session_state.exam_config['modules']:
+        if form_code:
+            try:
+                spec = decode_form_code(form_code)
+            except InvalidFormCodeError as e:
+                st.error(f"❌ {e}")
+                return False
+            # La forma define módulos, número de preguntas y mezcla de opciones
+            st.session_state.exam_config.update({
+                'modules': list(spec.modules),
+                'question_count': spec.question_count,
+                'shuffle_options': spec.shuffle_options
+            })
+        elif not st.session_state.exam_config['modules']:
             st.error("❌ Debe seleccionar al menos un módulo")
             return False
         
-        # Generar preguntas
-        self.generate_questions()
+        # Generar preguntas con el banco de los módulos seleccionados
+        st.session_state.exam_bank = None
+        self.load_complete_question_database()
+        try:
+            self.generate_questions(form_code)
+        except ValueError as e:  # FormBankMismatchError o módulos sin código de forma
+            st.error(f"❌ {e}")
+            return False
         
-        if not st.session_state.questions:
+        if not self.question_ids:
             st.error("❌ No hay preguntas disponibles para los módulos seleccionados")
             return False
         
         # Inicializar estado del examen
-        st.session_state.current_question_index = 0
-        st.session_state.user_answers = [None] * len(st.session_state.questions)
-        st.session_state.exam_start_time = datetime.now()
-        st.session_state.time_remaining = st.session_state.exam_config['time_limit'] * 60
-        st.session_state.timer_active = True
-        st.session_state.current_screen = 'exam'
+        time_limit = st.session_state.exam_config['time_limit'] * 60
+        self.init_exam_state(new_token(), new_answer_array(len(self.question_ids)), 0,
+                             datetime.now(), time.time() + time_limit)
+        self.save_checkpoint()
         
+        load_app_metrics().exam_starts.inc(st.session_state.exam_config['type'])
         self.show_notification("🚀 ¡Examen iniciado! Buena suerte", "success")
         return True
     
-    def generate_questions(self):
+    def init_exam_state(self, token: str, answers: array, current_index: int,
+                        start_time: datetime, deadline: float):
+        """Estado de sesión de un examen nuevo o reanudado con la forma ya cargada"""
+        st.session_state.current_question_index = current_index
+        st.session_state.attempt_session_id = token
+        st.session_state.user_answers = answers
+        st.session_state.exam_bank = self.question_bank
+        st.session_state.exam_stats = ExamStats.from_answers(
+            self.iter_exam_questions(), st.session_state.user_answers
+        )
+        st.session_state.answered_mask = answered_mask(st.session_state.user_answers)
+        st.session_state.quick_nav_page = None
+        st.session_state.exam_start_time = start_time
+        st.session_state.exam_deadline = deadline
+        st.session_state.time_remaining = max(0, int(deadline - time.time()))
+        st.session_state.timer_active = True
+        st.session_state.current_screen = 'exam'
+        # El token en la URL permite reanudar al recargar la página
+        st.query_params[RESUME_QUERY_PARAM] = token
+    
+    @profiled
+    def save_checkpoint(self):
         """
-        Genera las preguntas según configuración - Equivalente a generateQuestions() de JavaScript
+        Encola el punto de control del examen en curso (unos cientos de bytes);
+        lo escribe el hilo de escritura diferida, sin bloquear el render
         """
-        questions = []
-        selected_modules = st.session_state.exam_config['modules']
-        total_questions = st.session_state.exam_config['question_count']
-        
-        if not selected_modules:
-            st.session_state.questions = []
+        token = st.session_state.get('attempt_session_id')
+        if not token or st.session_state.exam_start_time is None:
+            return
+        config = st.session_state.exam_config
+        checkpoint = Checkpoint(
+            form_code=st.session_state.form_code,
+            exam_type=config['type'],
+            user_id=config.get('user_id', ''),
+            time_limit=config['time_limit'],
+            current_index=st.session_state.current_question_index,
+            started_at=st.session_state.exam_start_time.timestamp(),
+            deadline=st.session_state.exam_deadline,
+            answers=st.session_state.user_answers
+        )
+        load_write_queue().submit_checkpoint(token, encode_checkpoint(checkpoint))
+        st.session_state.checkpoint_index = checkpoint.current_index
+    
+    @profiled
+    def resume_from_url(self):
+        """Reanuda el examen del token en la URL si la sesión es nueva (recarga o reinicio)"""
+        token = st.query_params.get(RESUME_QUERY_PARAM)
+        if (not token or st.session_state.current_screen != 'dashboard' or
+                st.session_state.get('resume_failed') == token):
             return
+        if not self.resume_exam(token):
+            st.session_state.resume_failed = token
+    
+    def resume_exam(self, token: str) -> bool:
+        """Reconstruye un examen en curso a partir de su punto de control"""
+        data = load_write_queue().pending_checkpoint(token)
+        if data is None:
+            try:
+                data = load_attempt_store().load_checkpoint(token)
+            except sqlite3.Error as e:
+                logging.getLogger(__name__).warning("No se pudo leer el punto de control: %s", e)
+        if data is None:
+            st.error("❌ No hay un examen en curso con ese token")
+            return False
         
-        questions_per_module = max(1, total_questions // len(selected_modules))
-        
-        # Distribuir preguntas por módulo
-        for module in selected_modules:
-            module_questions = self.question_database.get(module, [])
-            for i in range(min(questions_per_module, len(module_questions))):
-                if len(questions) < total_questions:
-                    questions.append(module_questions[i % len(module_questions)])
-        
-        # Llenar espacios restantes si es necesario
-        while len(questions) < total_questions:
-            random_module = random.choice(selected_modules)
-            module_questions = self.question_database.get(random_module, [])
-            if module_questions:
-                questions.append(random.choice(module_questions))
-        
-        # Mezclar preguntas aleatoriamente
-        random.shuffle(questions)
-        st.session_state.questions = questions[:total_questions]
+        try:
+            checkpoint = decode_checkpoint(data)
+            spec = decode_form_code(checkpoint.form_code)
+            loader = load_shared_bank_loader()
+            bank = loader.get_bank(spec.modules)
+            self.report_bank_errors(loader, spec.modules)
+            form = get_form(bank, checkpoint.form_code)
+        except ValueError as e:  # punto de control inválido o banco distinto al de la forma
+            st.error(f"❌ No se pudo reanudar el examen: {e}")
+            return False
+        if len(checkpoint.answers) != len(form.question_ids):
+            st.error("❌ No se pudo reanudar el examen: el punto de control no coincide con su forma")
+            return False
+        
+        st.session_state.exam_config.update({
+            'type': checkpoint.exam_type,
+            'modules': list(spec.modules),
+            'question_count': spec.question_count,
+            'shuffle_options': spec.shuffle_options,
+            'time_limit': checkpoint.time_limit,
+            'user_id': checkpoint.user_id
+        })
+        self.question_bank = bank
+        self.set_exam_form(form)
+        st.session_state.form_code = form.code
+        st.session_state.sampling_warnings = []
+        self.init_exam_state(token, checkpoint.answers, checkpoint.current_index,
+                             datetime.fromtimestamp(checkpoint.started_at), checkpoint.deadline)
+        
+        self.show_notification("🔖 Examen reanudado donde lo dejaste", "success")
+        return True
+    
+    def generate_questions(self, form_code: Optional[str] = None):
+        """
+        Genera las preguntas según configuración - Equivalente a generateQuestions() de JavaScript
+        La forma es función de (versión del banco, configuración, semilla): la
+        sesión sólo guarda su código y cualquier proceso la reconstruye igual
+        """
+        config = st.session_state.exam_config
+        total_questions = config['question_count']
+        
+        # Las formas nuevas dejan fuera los reactivos marcados por el análisis
+        # de reactivos (NumPy se importa aquí: el panel inicial no lo necesita)
+        exclude = frozenset()
+        if not form_code:
+            from exani.item_analysis import flagged_items
+            exclude = flagged_items()
+        
+        # Muestreo estratificado por módulo, sin preguntas repetidas
+        # (sólo IDs, el contenido queda en el banco; la forma se cachea por código)
+        form, warnings = exam_session.generate_form(self.question_bank, config['modules'], total_questions,
+                                                    config.get('shuffle_options', False), form_code, exclude=exclude)
+        self.set_exam_form(form)
+        st.session_state.form_code = form.code
+        
+        # Módulos que no alcanzaron su cuota
+        st.session_state.sampling_warnings = warnings
     
+    @profiled
     def render_exam_screen(self):
         """
         Renderiza la pantalla principal del examen
         Equivale a la sección exam-screen del HTML
         """
-        if not st.session_state.questions:
+        if not self.question_ids:
             st.error("❌ No hay preguntas cargadas")
             return
         
-        # Timer y progreso (equivalente a exam-header)
-        self.render_timer_and_progress()
+        # Timer (equivalente a exam-header); fuera de los fragmentos porque
+        # sólo cambia cuando cambia el límite de tiempo
+        self.render_timer()
         
-        # Panel de estadísticas (equivalente a stats-panel)
-        self.render_exam_stats()
+        # Progreso, estadísticas, pregunta y navegación: se vuelven a ejecutar
+        # solos al responder o navegar, sin tocar el resto de la página
+        self.render_exam_body()
         
-        # Pregunta actual (equivalente a question container)
-        self.render_current_question()
-        
-        # Navegación (equivalente a nav)
-        self.render_navigation()
-        
-        # Botón de finalizar examen
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col2:
-            if st.button("🏁 Terminar Examen", type="secondary", use_container_width=True):
-                st.session_state.show_finish_modal = True
-                st.rerun()
-        
-        # Modal de confirmación para terminar
-        if st.session_state.show_finish_modal:
-            self.render_finish_modal()
+        # Botón y modal para terminar el examen (fragmento independiente)
+        self.render_finish_controls()
     
-    def render_timer_and_progress(self):
+    @profiled
+    def render_timer(self):
         """
-        Renderiza el temporizador y barra de progreso
+        Renderiza el temporizador
         Equivalente a las funciones startTimer() y updateTimerDisplay() del JavaScript
         """
-        if not st.session_state.exam_start_time:
+        if not st.session_state.exam_deadline:
             return
         
-        # Calcular tiempo transcurrido y restante
-        elapsed_time = datetime.now() - st.session_state.exam_start_time
-        time_limit_seconds = st.session_state.exam_config['time_limit'] * 60
-        remaining_seconds = max(0, time_limit_seconds - elapsed_time.total_seconds())
-        
-        # Formatear tiempo restante
-        hours = int(remaining_seconds // 3600)
-        minutes = int((remaining_seconds % 3600) // 60)
-        seconds = int(remaining_seconds % 60)
-        
-        time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        warning_class = "timer-warning" if remaining_seconds <= 300 else ""
-        
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            # Información de progreso
-            current_q = st.session_state.current_question_index + 1
-            total_q = len(st.session_state.questions)
-            answered = sum(1 for ans in st.session_state.user_answers if ans is not None)
-            
-            st.markdown(f"**Pregunta {current_q} de {total_q}** | **{answered} respondidas**")
-            
-            # Barra de progreso
-            progress = current_q / total_q
-            progress_html = f"""
-            <div class="progress-bar">
-                <div class="progress-fill" style="width: {progress*100}%"></div>
-            </div>
-            """
-            st.markdown(progress_html, unsafe_allow_html=True)
+            config = st.session_state.exam_config
+            st.markdown(f"### 📝 Simulacro: {config['type'].title()}")
         
         with col2:
-            # Timer display
-            st.markdown(f"""
-            <div class="timer-display {warning_class}">
-                ⏰ {time_str}
-            </div>
-            """, unsafe_allow_html=True)
+            # Timer display (la cuenta regresiva avanza en el navegador)
+            timer_html = (TIMER_HTML_TEMPLATE
+                          .replace('__DEADLINE_MS__', str(int(st.session_state.exam_deadline * 1000)))
+                          .replace('__WARNING_SECONDS__', str(TIMER_WARNING_SECONDS)))
+            st.iframe(timer_html, height=90)
         
         # Verificar si se acabó el tiempo
-        if remaining_seconds <= 0:
-            st.error("⏰ ¡Tiempo agotado!")
-            self.finish_exam()
-            st.rerun()
+        if self.get_remaining_seconds() <= 0:
+            self.handle_time_up()
+    
+    @profiled
+    def render_exam_body(self):
+        """
+        Fragmento con progreso, estadísticas, pregunta actual y navegación
+        Al responder o navegar sólo se vuelve a ejecutar este fragmento
+        """
+        @st.fragment
+        def exam_body():
+            with fragment_run('exam_body'):
+                # La pregunta actual también forma parte del punto de control
+                if st.session_state.get('checkpoint_index') != st.session_state.current_question_index:
+                    self.save_checkpoint()
+                
+                # Avisos del muestreo hasta la primera respuesta
+                if st.session_state.sampling_warnings and st.session_state.exam_stats.answered == 0:
+                    for warning in st.session_state.sampling_warnings:
+                        st.warning(warning)
+                
+                # Progreso (equivalente a exam-header)
+                self.render_progress()
+                
+                # Panel de estadísticas (equivalente a stats-panel)
+                self.render_exam_stats()
+                
+                # Pregunta actual (equivalente a question container)
+                self.render_current_question()
+                
+                # Navegación (equivalente a nav)
+                self.render_navigation()
+            
+        exam_body()
+    
+    @profiled
+    def render_progress(self):
+        """Renderiza la información y barra de progreso"""
+        current_q = st.session_state.current_question_index + 1
+        total_q = len(self.question_ids)
+        answered = st.session_state.exam_stats.answered
+        
+        st.markdown(f"**Pregunta {current_q} de {total_q}** | **{answered} respondidas**")
+        
+        # Barra de progreso
+        progress = current_q / total_q
+        progress_html = f"""
+        <div class="progress-bar">
+            <div class="progress-fill" style="width: {progress*100}%"></div>
+        </div>
+        """
+        st.markdown(progress_html, unsafe_allow_html=True)
     
+    @profiled
+    def render_finish_controls(self):
+        """
+        Fragmento con el botón de terminar y su modal de confirmación
+        Abrir o cancelar el modal no vuelve a ejecutar el resto de la página
+        """
+        @st.fragment
+        def finish_controls():
+            with fragment_run('finish_controls'):
+                col1, col2, col3 = st.columns([1, 1, 1])
+                with col2:
+                    if st.button("🏁 Terminar Examen", type="secondary", use_container_width=True):
+                        st.session_state.show_finish_modal = True
+                        rerun_fragment()
+                
+                # Modal de confirmación para terminar
+                if st.session_state.show_finish_modal:
+                    self.render_finish_modal()
+            
+        finish_controls()
+    
+    def get_remaining_seconds(self) -> float:
+        """Segundos restantes hasta el límite del examen"""
+        if not st.session_state.exam_deadline:
+            return 0
+        return max(0, st.session_state.exam_deadline - time.time())
+    
+    def handle_time_up(self):
+        """Termina el examen cuando se alcanzó el límite de tiempo"""
+        st.error("⏰ ¡Tiempo agotado!")
+        self.finish_exam()
+        st.rerun()
+    
+    @profiled
     def render_exam_stats(self):
         """
         Renderiza las estadísticas del examen en tiempo real
         Equivalente a updateStats() del JavaScript
         """
         correct, wrong, skipped = self.calculate_current_stats()
-        total_questions = len(st.session_state.questions)
+        total_questions = len(self.question_ids)
         score = round((correct / total_questions) * 100) if total_questions > 0 else 0
         
         # Panel de estadísticas con diseño similar al HTML
@@ -829,32 +925,40 @@ class ExaniSimulatorComplete:
         """
         st.markdown(stats_html, unsafe_allow_html=True)
     
+    @profiled
     def render_current_question(self):
         """
         Renderiza la pregunta actual
         Equivalente a displayQuestion() del JavaScript
         """
-        if not st.session_state.questions:
+        if not self.question_ids:
             return
         
         current_idx = st.session_state.current_question_index
-        if current_idx >= len(st.session_state.questions):
+        if current_idx >= len(self.question_ids):
             return
         
-        question = st.session_state.questions[current_idx]
+        question = self.get_question(current_idx)
         
         # Encabezado de pregunta (equivalente a question-header)
         col1, col2 = st.columns([3, 1])
         with col1:
             st.markdown(f"### Pregunta {current_idx + 1}")
         with col2:
-            st.markdown(f"**📚 {question['area']}**")
+            st.markdown(f"**📚 {question.area}**")
+        
+        # Tras un auto-avance la tarjeta aparece con un pequeño retraso animado
+        # en el navegador (el servidor no espera)
+        card_style = ""
+        if st.session_state.just_advanced:
+            card_style = f' style="animation-delay: {AUTO_ADVANCE_DELAY_MS}ms; animation-fill-mode: backwards;"'
+            st.session_state.just_advanced = False
         
         # Tarjeta de pregunta con diseño del HTML
         question_html = f"""
-        <div class="question-card">
+        <div class="question-card"{card_style}>
             <div style="font-size: 1.1rem; line-height: 1.7; margin-bottom: 25px; color: #374151;">
-                {question['text']}
+                {question.text}
             </div>
         </div>
         """
@@ -864,9 +968,10 @@ class ExaniSimulatorComplete:
         st.markdown("**Selecciona tu respuesta:**")
         
         # Verificar si ya hay una respuesta seleccionada
-        current_answer = st.session_state.user_answers[current_idx]
+        current_answer = answer_value(st.session_state.user_answers[current_idx])
         
-        for i, option in enumerate(question['options']):
+        # Opciones en el orden de la forma; se guarda el índice original
+        for i, option in display_options(self.exam_form, current_idx, question):
             option_key = f"option_{current_idx}_{i}"
             
             # Botón de opción con estilo similar al HTML
@@ -876,15 +981,20 @@ class ExaniSimulatorComplete:
                 use_container_width=True,
                 type="primary" if current_answer == i else "secondary"
             ):
+                # No se aceptan respuestas fuera de tiempo
+                if self.get_remaining_seconds() <= 0:
+                    self.handle_time_up()
+                
                 # Guardar respuesta
-                st.session_state.user_answers[current_idx] = i
+                self.set_answer(current_idx, i)
                 
-                # Auto-avanzar después de seleccionar (con delay simulado)
-                time.sleep(0.1)  # Pequeña pausa para mejor UX
-                if current_idx < len(st.session_state.questions) - 1:
+                # Auto-avanzar después de seleccionar (sin bloquear el servidor)
+                if self.is_auto_advance_enabled() and current_idx < len(self.question_ids) - 1:
                     st.session_state.current_question_index += 1
-                st.rerun()
+                    st.session_state.just_advanced = True
+                rerun_fragment()
     
+    @profiled
     def render_navigation(self):
         """
         Renderiza los controles de navegación
@@ -898,7 +1008,7 @@ class ExaniSimulatorComplete:
                         disabled=(st.session_state.current_question_index == 0),
                         use_container_width=True):
                 st.session_state.current_question_index -= 1
-                st.rerun()
+                rerun_fragment()
         
         with col2:
             # Indicadores de preguntas (equivalente a indicators)
@@ -906,7 +1016,7 @@ class ExaniSimulatorComplete:
         
         with col3:
             # Botón Siguiente
-            next_disabled = st.session_state.current_question_index >= len(st.session_state.questions) - 1
+            next_disabled = st.session_state.current_question_index >= len(self.question_ids) - 1
             button_text = "Terminar" if next_disabled else "Siguiente →"
             
             if st.button(button_text, 
@@ -917,62 +1027,81 @@ class ExaniSimulatorComplete:
                     st.rerun()
                 else:
                     st.session_state.current_question_index += 1
-                    st.rerun()
+                    rerun_fragment()
     
+    @profiled
     def render_question_indicators(self):
         """
         Renderiza los indicadores de navegación entre preguntas
         Equivalente a la función updateIndicators() del JavaScript
         """
-        if not st.session_state.questions:
+        if not self.question_ids:
             return
         
-        total_questions = len(st.session_state.questions)
+        total_questions = len(self.question_ids)
         current_idx = st.session_state.current_question_index
         
-        # Crear indicadores visuales
-        indicators_html = '<div class="indicators">'
-        
-        for i in range(total_questions):
-            # Determinar el estado del indicador
-            if i == current_idx:
-                indicator_class = "indicator indicator-current"
-                title = f"Pregunta {i+1} (Actual)"
-            elif st.session_state.user_answers[i] is not None:
-                indicator_class = "indicator indicator-answered"
-                title = f"Pregunta {i+1} (Respondida)"
-            else:
-                indicator_class = "indicator"
-                title = f"Pregunta {i+1}"
-            
-            indicators_html += f'<div class="{indicator_class}" title="{title}"></div>'
-        
-        indicators_html += '</div>'
+        # Indicadores visuales (HTML memorizado)
+        indicators_html = build_indicators_html(
+            total_questions, current_idx, st.session_state.answered_mask
+        )
         st.markdown(indicators_html, unsafe_allow_html=True)
         
-        # Navegación rápida con botones numerados (limitado para mejor UX)
-        if total_questions <= 20:  # Solo mostrar si hay pocas preguntas
-            st.markdown("**Navegación rápida:**")
-            cols = st.columns(min(total_questions, 10))
-            
-            for i in range(total_questions):
-                col_idx = i % 10
-                if col_idx < len(cols):
-                    with cols[col_idx]:
-                        # Estado del botón
-                        if i == current_idx:
-                            button_type = "primary"
-                            label = f"🔵{i+1}"
-                        elif st.session_state.user_answers[i] is not None:
-                            button_type = "secondary"
-                            label = f"✅{i+1}"
-                        else:
-                            button_type = "secondary"
-                            label = f"⚪{i+1}"
-                        
-                        if st.button(label, key=f"nav_btn_{i}", type=button_type):
-                            st.session_state.current_question_index = i
-                            st.rerun()
+        # Navegación rápida paginada
+        self.render_quick_navigation(total_questions, current_idx)
+    
+    def render_quick_navigation(self, total_questions: int, current_idx: int):
+        """
+        Navegación rápida con botones numerados, paginada de QUICK_NAV_PAGE_SIZE
+        en QUICK_NAV_PAGE_SIZE para que el número de widgets por rerun no
+        dependa del largo del examen. Por defecto muestra la página de la
+        pregunta actual.
+        """
+        page_size = QUICK_NAV_PAGE_SIZE
+        page_count = math.ceil(total_questions / page_size)
+        answered_bits = st.session_state.answered_mask
+        
+        # La página elegida con ◀/▶ se mantiene mientras no cambie la pregunta actual
+        chosen = st.session_state.quick_nav_page
+        if chosen is not None and chosen[1] == current_idx:
+            page = chosen[0]
+        else:
+            page = current_idx // page_size
+        start = page * page_size
+        end = min(start + page_size, total_questions)
+        
+        st.markdown("**Navegación rápida:**")
+        
+        if page_count > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀", key="quick_nav_prev", disabled=(page == 0)):
+                    st.session_state.quick_nav_page = (page - 1, current_idx)
+                    rerun_fragment()
+            with col2:
+                st.caption(f"Preguntas {start + 1}–{end} de {total_questions}")
+            with col3:
+                if st.button("▶", key="quick_nav_next", disabled=(page >= page_count - 1)):
+                    st.session_state.quick_nav_page = (page + 1, current_idx)
+                    rerun_fragment()
+        
+        cols = st.columns(min(total_questions, page_size))
+        for i in range(start, end):
+            with cols[i - start]:
+                # Estado del botón
+                if i == current_idx:
+                    button_type = "primary"
+                    label = f"🔵{i+1}"
+                elif answered_bits >> i & 1:
+                    button_type = "secondary"
+                    label = f"✅{i+1}"
+                else:
+                    button_type = "secondary"
+                    label = f"⚪{i+1}"
+                
+                if st.button(label, key=f"nav_btn_{i}", type=button_type):
+                    st.session_state.current_question_index = i
+                    rerun_fragment()
     
     def render_finish_modal(self):
         """
@@ -988,7 +1117,7 @@ class ExaniSimulatorComplete:
         with col1:
             if st.button("❌ Cancelar", use_container_width=True):
                 st.session_state.show_finish_modal = False
-                st.rerun()
+                rerun_fragment()
         
         with col2:
             if st.button("✅ Terminar", type="primary", use_container_width=True):
@@ -998,22 +1127,15 @@ class ExaniSimulatorComplete:
     
     def calculate_current_stats(self) -> Tuple[int, int, int]:
         """
-        Calcula estadísticas actuales del examen
+        Devuelve las estadísticas actuales del examen desde el acumulador
         Equivalente a updateStats() del JavaScript
         """
-        correct = wrong = skipped = 0
-        
-        for i, answer in enumerate(st.session_state.user_answers):
-            if answer is None:
-                skipped += 1
-            elif i < len(st.session_state.questions):
-                if answer == st.session_state.questions[i]['correct']:
-                    correct += 1
-                else:
-                    wrong += 1
-        
-        return correct, wrong, skipped
+        if DEBUG_MODE:
+            return exam_session.current_stats(st.session_state.exam_stats, self.iter_exam_questions(),
+                                              st.session_state.user_answers)
+        return exam_session.current_stats(st.session_state.exam_stats)
     
+    @profiled
     def finish_exam(self):
         """
         Finaliza el examen y calcula resultados
@@ -1021,33 +1143,71 @@ class ExaniSimulatorComplete:
         """
         # Detener timer
         st.session_state.timer_active = False
-        
-        if st.session_state.exam_start_time:
-            exam_duration = datetime.now() - st.session_state.exam_start_time
-        else:
-            exam_duration = timedelta(0)
-        
-        # Calcular resultados finales
-        correct, wrong, skipped = self.calculate_current_stats()
-        total_questions = len(st.session_state.questions)
-        score = round((correct / total_questions) * 100) if total_questions > 0 else 0
-        
-        # Guardar resultados (equivalente a calculateResults)
-        st.session_state.final_results = {
-            'score': score,
-            'correct': correct,
-            'wrong': wrong,
-            'skipped': skipped,
-            'total_questions': total_questions,
-            'exam_type': st.session_state.exam_config['type'],
-            'modules': st.session_state.exam_config['modules'],
-            'duration': exam_duration,
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        st.query_params.pop(RESUME_QUERY_PARAM, None)
+        
+        load_app_metrics().exam_finishes.inc(st.session_state.exam_config['type'])
+        
+        # Calificación, resultados, intento e índice de revisión
+        config = st.session_state.exam_config
+        finished = exam_session.finish_exam(
+            list(self.iter_exam_questions()), st.session_state.user_answers,
+            exam_type=config['type'],
+            modules=config['modules'],
+            form_code=st.session_state.form_code,
+            bank_version=self.question_bank.version,
+            user_id=config.get('user_id') or 'anónimo',
+            started_at=st.session_state.exam_start_time,
+            session_id=st.session_state.get('attempt_session_id'),
+            stats=st.session_state.exam_stats if DEBUG_MODE else None
+        )
+        st.session_state.final_results = finished.results
+        self.save_attempt(finished.record)
+        st.session_state.review_index = finished.review
+        st.session_state.review_page = (None, 0)
         
         st.session_state.current_screen = 'results'
         self.show_notification("🏆 ¡Examen completado!", "success")
     
+    def save_attempt(self, record: AttemptRecord):
+        """
+        Guarda el intento en el historial (escritura diferida); si la base
+        falla el examen sigue disponible en la sesión
+        """
+        # Normalmente se encola; si la cola está llena se guarda directamente
+        queue = load_write_queue()
+        if queue.submit_result(record):
+            if queue.metrics().failing:
+                # No se descarta: queda en la cola hasta que la base responda
+                self.show_notification("⚠️ El historial no responde; el intento se guardará cuando se recupere",
+                                       "warning")
+            return
+        try:
+            load_attempt_store().save_attempt(record)
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).warning("No se pudo guardar el intento: %s", e)
+            self.show_notification("⚠️ No se pudo guardar el intento en el historial", "warning")
+    
+    def render_attempt_history(self):
+        """Últimos intentos del usuario guardados en el historial"""
+        user_id = st.session_state.exam_config.get('user_id') or 'anónimo'
+        try:
+            attempts = load_attempt_store().attempts_by_user(user_id, limit=10)
+        except sqlite3.Error:
+            return
+        if not attempts:
+            return
+        
+        with st.expander(f"📚 Historial de {user_id}"):
+            history = {
+                'Fecha': [datetime.fromtimestamp(a.finished_at).strftime('%Y-%m-%d %H:%M') for a in attempts],
+                'Tipo': [a.exam_type.title() for a in attempts],
+                'Calificación': [f"{a.score}%" for a in attempts],
+                'Correctas': [f"{a.correct}/{a.total}" for a in attempts],
+                'Código de forma': [a.form_code or '' for a in attempts]
+            }
+            st.dataframe(history, hide_index=True, use_container_width=True)
+    
+    @profiled
     def render_results_screen(self):
         """
         Renderiza la pantalla de resultados
@@ -1091,6 +1251,8 @@ class ExaniSimulatorComplete:
             st.write(f"**Total de preguntas:** {results['total_questions']}")
             st.write(f"**Fecha:** {results['date']}")
             st.write(f"**Módulos evaluados:** {', '.join(results['modules'])}")
+            if results.get('form_code'):
+                st.write(f"**Código de forma:** `{results['form_code']}`")
             
             # Atajos de teclado información
             st.markdown("---")
@@ -1113,12 +1275,12 @@ class ExaniSimulatorComplete:
             st.markdown("### 📈 Análisis de Rendimiento")
             
             # Gráfico de resultados
-            chart_data = pd.DataFrame({
+            chart_data = {
                 'Categoría': ['Correctas', 'Incorrectas', 'Sin Responder'],
                 'Cantidad': [results['correct'], results['wrong'], results['skipped']]
-            })
+            }
             
-            st.bar_chart(chart_data.set_index('Categoría'), use_container_width=True)
+            st.bar_chart(chart_data, x='Categoría', y='Cantidad', use_container_width=True)
         
         # Evaluación de rendimiento
         score = results['score']
@@ -1129,6 +1291,8 @@ class ExaniSimulatorComplete:
         else:
             st.error("📚 Necesitas estudiar más")
         
+        self.render_attempt_history()
+        
         # Acciones (equivalente a actions del HTML)
         st.markdown("---")
         col1, col2, col3 = st.columns(3)
@@ -1144,15 +1308,16 @@ class ExaniSimulatorComplete:
                 st.rerun()
         
         with col3:
-            if st.button("📁 Exportar Resultados", use_container_width=True):
-                self.export_results()
+            self.render_export_buttons()
     
+    @profiled
     def render_review_screen(self):
         """
         Renderiza la pantalla de revisión de respuestas
         Funcionalidad adicional no presente en el HTML original
         """
-        if not st.session_state.questions or 'final_results' not in st.session_state:
+        review_index = st.session_state.review_index
+        if not self.question_ids or review_index is None:
             st.error("❌ No hay información de examen para revisar")
             return
         
@@ -1163,38 +1328,58 @@ class ExaniSimulatorComplete:
         with col1:
             filter_type = st.selectbox(
                 "Filtrar por:",
-                ["Todas", "Correctas", "Incorrectas", "Sin Responder"]
+                list(REVIEW_STATUS_FILTERS)
             )
         with col2:
             area_filter = st.selectbox(
                 "Área:",
-                ["Todas"] + list(set(q['area'] for q in st.session_state.questions))
+                ["Todas"] + list(review_index.areas)
             )
         with col3:
             if st.button("🏠 Volver al Inicio"):
                 self.restart_exam()
                 st.rerun()
         
-        # Mostrar preguntas según filtros
+        # Preguntas que coinciden con los filtros (consulta precalculada)
+        status = REVIEW_STATUS_FILTERS[filter_type]
+        area = None if area_filter == "Todas" else area_filter
+        positions = review_index.select(status, area)
+        
+        # Paginación: al cambiar los filtros se vuelve a la primera página
+        filter_key = (status, area)
+        page_key, page = st.session_state.review_page
+        if page_key != filter_key:
+            page = 0
+        page_count = max(1, math.ceil(len(positions) / REVIEW_PAGE_SIZE))
+        page = min(page, page_count - 1)
+        
         st.markdown("---")
         
-        question_count = 0
-        for i, question in enumerate(st.session_state.questions):
-            user_answer = st.session_state.user_answers[i]
-            correct_answer = question['correct']
-            
-            # Aplicar filtros
-            if area_filter != "Todas" and question['area'] != area_filter:
-                continue
-                
-            if filter_type == "Correctas" and user_answer != correct_answer:
-                continue
-            elif filter_type == "Incorrectas" and (user_answer == correct_answer or user_answer is None):
-                continue
-            elif filter_type == "Sin Responder" and user_answer is not None:
-                continue
-            
-            question_count += 1
+        if not positions:
+            st.info("No hay preguntas que coincidan con los filtros seleccionados.")
+            return
+        
+        if page_count > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀ Anterior", key="review_prev", disabled=(page == 0)):
+                    st.session_state.review_page = (filter_key, page - 1)
+                    st.rerun()
+            with col2:
+                start = page * REVIEW_PAGE_SIZE
+                st.caption(f"Página {page + 1} de {page_count} · "
+                           f"Preguntas {start + 1}–{min(start + REVIEW_PAGE_SIZE, len(positions))} de {len(positions)}")
+            with col3:
+                if st.button("Siguiente ▶", key="review_next", disabled=(page >= page_count - 1)):
+                    st.session_state.review_page = (filter_key, page + 1)
+                    st.rerun()
+        
+        # Sólo se renderiza la página actual
+        start = page * REVIEW_PAGE_SIZE
+        for i in positions[start:start + REVIEW_PAGE_SIZE]:
+            question = self.get_question(i)
+            user_answer = answer_value(st.session_state.user_answers[i])
+            correct_answer = question.correct
             
             # Determinar estado de la respuesta
             if user_answer is None:
@@ -1208,89 +1393,116 @@ class ExaniSimulatorComplete:
                 status_color = "🔴"
             
             # Mostrar pregunta en expandible
-            with st.expander(f"{status_color} Pregunta {i+1} - {question['area']} - {status}"):
-                st.markdown(f"**{question['text']}**")
+            with st.expander(f"{status_color} Pregunta {i+1} - {question.area} - {status}"):
+                st.markdown(f"**{question.text}**")
                 st.markdown("---")
                 
-                for j, option in enumerate(question['options']):
+                for j, option in display_options(self.exam_form, i, question):
                     if j == correct_answer:
                         st.markdown(f"✅ **{option}** (Respuesta correcta)")
                     elif j == user_answer:
                         st.markdown(f"❌ **{option}** (Tu respuesta)")
                     else:
                         st.markdown(f"⚪ {option}")
-        
-        if question_count == 0:
-            st.info("No hay preguntas que coincidan con los filtros seleccionados.")
     
-    def export_results(self):
+    @profiled
+    def render_bank_search_screen(self):
         """
-        Exporta los resultados del examen
-        Equivalente a exportResults() del JavaScript
+        Buscador del banco completo para el personal (sólo con EXANI_ADMIN=1)
+        Todas las palabras deben aparecer; sin acentos ni mayúsculas; palabra* = prefijo
         """
-        if 'final_results' not in st.session_state:
-            st.error("❌ No hay resultados para exportar")
-            return
+        loader = load_shared_bank_loader()
+        index = load_search_index()
+        # Carga (o recarga) todos los módulos; el índice se actualiza sólo con lo que cambió
+        modules = loader.refresh_all()
+        self.report_bank_errors(loader, loader.available_modules())
         
-        results = st.session_state.final_results
+        st.markdown("## 🔎 Búsqueda en el Banco")
         
-        # Crear datos detallados para exportar
-        detailed_results = {
-            'resumen': results,
-            'preguntas_detalle': []
-        }
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            query = st.text_input("Buscar:", placeholder="p. ej. sor juana, ecuacion cuadr*")
+        with col2:
+            module_filter = st.selectbox(
+                "Módulo:",
+                ["Todos"] + list(modules)
+            )
+        with col3:
+            if st.button("🏠 Volver al Inicio"):
+                st.session_state.current_screen = 'dashboard'
+                st.rerun()
         
-        # Agregar detalles de cada pregunta
-        for i, question in enumerate(st.session_state.questions):
-            user_answer = st.session_state.user_answers[i]
-            correct_answer = question['correct']
-            
-            question_detail = {
-                'numero': i + 1,
-                'area': question['area'],
-                'pregunta': question['text'],
-                'opciones': question['options'],
-                'respuesta_correcta': correct_answer,
-                'respuesta_usuario': user_answer,
-                'es_correcta': user_answer == correct_answer if user_answer is not None else False,
-                'sin_responder': user_answer is None
-            }
-            detailed_results['preguntas_detalle'].append(question_detail)
+        st.caption(f"{len(index)} reactivos indexados · {index.term_count} términos")
+        st.markdown("---")
         
-        # Crear archivo JSON para descarga
-        json_str = json.dumps(detailed_results, ensure_ascii=False, indent=2)
+        if not query.strip():
+            st.info("Escribe una o más palabras para buscar en enunciados, opciones y áreas.")
+            return
         
-        # Botón de descarga
+        module = None if module_filter == "Todos" else module_filter
+        result = index.search(query, module=module, limit=BANK_SEARCH_LIMIT)
+        shown = f" (se muestran {len(result.questions)})" if result.total > len(result.questions) else ""
+        st.caption(f"{result.total} reactivos{shown} · {result.elapsed_ms:.2f} ms")
+        if result.truncated:
+            from exani.search import MAX_PREFIX_TERMS
+            st.warning(f"⚠️ Un prefijo abarca más de {MAX_PREFIX_TERMS} términos y sólo se buscaron los "
+                       "primeros: usa un prefijo más largo")
+        
+        if not result.total:
+            st.info("No hay reactivos que contengan todas las palabras buscadas.")
+            return
+        
+        for question in result.questions:
+            with st.expander(f"{question.module.replace('_', ' ').title()} - {question.area} - {question.text[:80]}"):
+                st.markdown(f"**{question.text}**")
+                st.caption(f"ID {question.qid}")
+                st.markdown("---")
+                for j, option in enumerate(question.options):
+                    if j == question.correct:
+                        st.markdown(f"✅ **{option}** (Respuesta correcta)")
+                    else:
+                        st.markdown(f"⚪ {option}")
+    
+    def render_export_buttons(self):
+        """
+        Botones de descarga de resultados
+        Equivalente a exportResults() del JavaScript; el contenido se genera
+        sólo cuando la descarga empieza, a partir de una copia del estado
+        (la función corre fuera de la sesión)
+        """
+        results = dict(st.session_state.final_results)
+        bank = self.question_bank
+        question_ids = self.question_ids
+        answers = array('b', st.session_state.user_answers)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
         st.download_button(
-            label="📥 Descargar Resultados Detallados (JSON)",
-            data=json_str,
-            file_name=f"EXANI-II_Resultados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            mime="application/json"
+            label="📥 Resultados Detallados (JSON)",
+            data=lambda: results_json(results, [bank[qid] for qid in question_ids], answers),
+            file_name=f"EXANI-II_Resultados_{stamp}.json",
+            mime="application/json",
+            on_click='ignore',
+            use_container_width=True
         )
-        
-        # También crear CSV con resumen
-        summary_data = {
-            'Tipo de Examen': [results['exam_type']],
-            'Puntuación (%)': [results['score']],
-            'Respuestas Correctas': [results['correct']],
-            'Respuestas Incorrectas': [results['wrong']],
-            'Sin Responder': [results['skipped']],
-            'Total Preguntas': [results['total_questions']],
-            'Duración': [str(results['duration']).split('.')[0]],
-            'Fecha': [results['date']]
-        }
-        
-        df = pd.DataFrame(summary_data)
-        csv = df.to_csv(index=False)
-        
         st.download_button(
-            label="📊 Descargar Resumen (CSV)",
-            data=csv,
-            file_name=f"EXANI-II_Resumen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+            label="📊 Resumen (CSV)",
+            data=lambda: summary_csv(results),
+            file_name=f"EXANI-II_Resumen_{stamp}.csv",
+            mime="text/csv",
+            on_click='ignore',
+            use_container_width=True
         )
-        
-        st.success("📁 Archivos preparados para descarga")
+
+    def render_bulk_export(self):
+        """
+        Cómo exportar el historial completo (sólo con EXANI_ADMIN=1)
+        Una descarga desde la aplicación pasa el archivo entero por la memoria
+        del servidor; el historial se exporta con el comando, por páginas
+        """
+        with st.expander("🗄️ Exportar historial"):
+            st.caption("El historial completo se exporta en el servidor, por páginas y con memoria constante:")
+            st.code("python -m exani.export historial.ndjson\n"
+                    "python -m exani.export historial.parquet --since 2025-01-01", language='bash')
     
     def restart_exam(self):
         """
@@ -1302,8 +1514,9 @@ class ExaniSimulatorComplete:
         
         # Limpiar estados del examen
         exam_states = [
-            'current_question_index', 'questions', 'user_answers', 
-            'exam_start_time', 'time_remaining', 'timer_active',
+            'current_question_index', 'form_code', 'attempt_session_id', 'checkpoint_index', 'user_answers', 'exam_bank', 'exam_stats',
+            'answered_mask', 'quick_nav_page', 'review_index', 'review_page', 'sampling_warnings',
+            'exam_start_time', 'time_remaining', 'timer_active', 'exam_deadline',
             'show_finish_modal', 'final_results'
         ]
         
@@ -1311,6 +1524,8 @@ class ExaniSimulatorComplete:
             if state in st.session_state:
                 del st.session_state[state]
         
+        st.query_params.pop(RESUME_QUERY_PARAM, None)
+        
         # Reinicializar
         self.init_session_state()
         st.session_state.exam_config = exam_config
@@ -1336,6 +1551,7 @@ class ExaniSimulatorComplete:
         else:
             st.info(message)
     
+    @profiled
     def render_sidebar(self):
         """
         Renderiza la barra lateral con información y controles adicionales
@@ -1345,19 +1561,15 @@ class ExaniSimulatorComplete:
             
             # Información del examen actual
             if st.session_state.current_screen == 'exam':
-                st.markdown("### ⏱️ Estado del Examen")
+                self.render_exam_status()
                 
-                if st.session_state.exam_start_time:
-                    elapsed = datetime.now() - st.session_state.exam_start_time
-                    st.write(f"⏰ Tiempo transcurrido: {str(elapsed).split('.')[0]}")
-                
-                if st.session_state.questions:
-                    current_q = st.session_state.current_question_index + 1
-                    total_q = len(st.session_state.questions)
-                    st.write(f"📝 Progreso: {current_q}/{total_q}")
-                    
-                    answered = sum(1 for ans in st.session_state.user_answers if ans is not None)
-                    st.write(f"✅ Respondidas: {answered}/{total_q}")
+                # Código para repetir o compartir esta misma forma
+                if st.session_state.form_code:
+                    st.caption("🔑 Código de forma")
+                    st.code(st.session_state.form_code, language=None)
+                if st.session_state.get('attempt_session_id'):
+                    st.caption("🔖 Token para reanudar este examen")
+                    st.code(st.session_state.attempt_session_id, language=None)
                 
                 st.markdown("---")
                 
@@ -1365,7 +1577,7 @@ class ExaniSimulatorComplete:
                 st.markdown("### 🚀 Accesos Rápidos")
                 
                 if st.button("⏭️ Saltar pregunta", use_container_width=True):
-                    if st.session_state.current_question_index < len(st.session_state.questions) - 1:
+                    if st.session_state.current_question_index < len(self.question_ids) - 1:
                         st.session_state.current_question_index += 1
                         st.rerun()
                 
@@ -1388,7 +1600,90 @@ class ExaniSimulatorComplete:
                 st.markdown("**Módulos seleccionados:**")
                 for module in config['modules']:
                     st.write(f"- {module.replace('_', ' ').title()}")
+            
+            if ADMIN_MODE:
+                st.markdown("---")
+                if st.session_state.current_screen == 'dashboard':
+                    if st.button("🔎 Buscar en el banco", use_container_width=True):
+                        st.session_state.current_screen = 'bank_search'
+                        st.rerun()
+                self.render_bulk_export()
+    
+    def render_exam_status(self):
+        """
+        Fragmento de la barra lateral con el estado del examen
+        Se refresca cada DEADLINE_CHECK_SECONDS segundos y en ese momento
+        también verifica el límite de tiempo, sin rerun completo del script
+        """
+        @st.fragment(run_every=DEADLINE_CHECK_SECONDS)
+        def exam_status():
+            with fragment_run('exam_status'):
+                # Chequeo periódico: también mantiene la sesión como activa
+                load_app_metrics().touch_session(st.session_state.session_tag, st.session_state.current_screen)
+                if (st.session_state.current_screen == 'exam' and
+                        st.session_state.timer_active and
+                        self.get_remaining_seconds() <= 0):
+                    self.handle_time_up()
+                
+                st.markdown("### ⏱️ Estado del Examen")
+                
+                if st.session_state.exam_start_time:
+                    elapsed = datetime.now() - st.session_state.exam_start_time
+                    st.write(f"⏰ Tiempo transcurrido: {str(elapsed).split('.')[0]}")
+                
+                if self.question_ids:
+                    current_q = st.session_state.current_question_index + 1
+                    total_q = len(self.question_ids)
+                    st.write(f"📝 Progreso: {current_q}/{total_q}")
+                    
+                    answered = st.session_state.exam_stats.answered
+                    st.write(f"✅ Respondidas: {answered}/{total_q}")
+            
+        exam_status()
     
+    def render_profile_panel(self, profile_log: ProfileLog, session: str):
+        """
+        Panel de depuración con los tiempos del último rerun de esta sesión
+        Sólo aparece con EXANI_PROFILE=1
+        """
+        def timing_table(timings):
+            return {
+                'Método': [t.name for t in timings],
+                'Llamadas': [t.calls for t in timings],
+                'Total (ms)': [round(t.total_ms, 2) for t in timings],
+                'Máx (ms)': [round(t.max_ms, 2) for t in timings],
+                'Pico (KiB)': [round(t.peak_kib, 1) for t in timings]
+            }
+        
+        reports = profile_log.reports(session)
+        if not reports:
+            return
+        last = reports[-1]
+        with st.sidebar:
+            with st.expander("🛠️ Perfilado"):
+                st.caption(f"Último rerun ({last.label}): {last.total_ms:.1f} ms, pico {last.peak_kib:.0f} KiB")
+                st.dataframe(timing_table(last.timings), hide_index=True, use_container_width=True)
+                
+                st.caption(f"Acumulado de los últimos {len(profile_log.reports())} reruns (todas las sesiones)")
+                st.dataframe(timing_table(profile_log.summary()), hide_index=True, use_container_width=True)
+                
+                metrics = load_write_queue().metrics()
+                st.caption(f"Cola de escritura: {metrics.depth} pendientes, {metrics.written} escritos, "
+                           f"{metrics.dropped} descartados, último lote {metrics.last_flush_ms:.1f} ms")
+                if metrics.failing:
+                    st.error(f"El historial no responde: {metrics.unsaved_results} intentos terminados en espera")
+                
+                sampled = next((r for r in reversed(reports) if r.cprofile), None)
+                if sampled is not None:
+                    st.caption("cProfile del último rerun muestreado")
+                    st.code(sampled.cprofile, language=None)
+                
+                if st.button("💾 Volcar a archivo", key='profile_dump'):
+                    path = os.path.join(PROFILE_DUMP_DIR, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+                    count = profile_log.dump(path)
+                    st.success(f"{count} reruns guardados en {path}")
+    
+    @profiled
     def handle_keyboard_shortcuts(self):
         """
         Maneja atajos de teclado
@@ -1447,13 +1742,8 @@ class ExaniSimulatorComplete:
             self.render_results_screen()
         elif st.session_state.current_screen == 'review':
             self.render_review_screen()
-        
-        # Auto-refresh para el timer (solo durante el examen)
-        if (st.session_state.current_screen == 'exam' and 
-            st.session_state.timer_active and 
-            st.session_state.exam_start_time):
-            time.sleep(1)
-            st.rerun()
+        elif st.session_state.current_screen == 'bank_search' and ADMIN_MODE:
+            self.render_bank_search_screen()
 
 
 def main():
@@ -1461,9 +1751,26 @@ def main():
     Función principal de la aplicación
     Punto de entrada del programa
     """
-    # Crear y ejecutar el simulador
-    simulator = ExaniSimulatorComplete()
-    simulator.run()
+    metrics = load_app_metrics()
+    session = st.session_state.setdefault('session_tag', new_token()[:8])
+    screen = st.session_state.get('current_screen', 'dashboard')
+    started = time.perf_counter()
+    try:
+        if not PROFILE_ENABLED:
+            # Crear y ejecutar el simulador
+            simulator = ExaniSimulatorComplete()
+            simulator.run()
+            return
+        
+        profile_log = load_profile_log()
+        with profile_log.rerun(session):
+            simulator = ExaniSimulatorComplete()
+            simulator.run()
+        simulator.render_profile_panel(profile_log, session)
+    finally:
+        # También cuenta los reruns interrumpidos por st.rerun()
+        metrics.record_rerun(screen, time.perf_counter() - started)
+        metrics.touch_session(session, st.session_state.get('current_screen', screen))
 
 
 if __name__ == "__main__":
@@ -1482,7 +1789,7 @@ REQUISITOS PREVIOS:
 
 INSTALACIÓN DE DEPENDENCIAS:
 ---------------------------
-pip install streamlit pandas
+pip install -r requirements.txt
 
 EJECUCIÓN:
 ----------
@@ -1537,9 +1844,9 @@ DECISIONES DE DISEÑO CLAVE:
    - HTML Dashboard → render_dashboard()
    - HTML Exam Screen → render_exam_screen()
    - HTML Results → render_results_screen()
-   - JavaScript Timer → render_timer_and_progress()
+   - JavaScript Timer → render_timer()
    - JavaScript Navigation → render_navigation()
-   - CSS Styles → apply_custom_css()
+   - CSS Styles → static/exani.css + apply_custom_css()
 
 5. MEJORAS RESPECTO AL ORIGINAL:
    - ✅ Revisión detallada de respuestas
@@ -1553,16 +1860,19 @@ PERSONALIZACIÓN Y EXTENSIÓN:
 ----------------------------
 
 AGREGAR MÁS PREGUNTAS:
-Editar el diccionario question_database en load_complete_question_database()
+Editar el archivo del módulo en bank/ (<modulo>.json o <modulo>.ndjson).
+Los cambios se recargan en caliente sin reiniciar el servidor. El directorio
+del banco se puede cambiar con la variable de entorno EXANI_BANK_DIR.
 
 MODIFICAR TIEMPOS:
 Cambiar valores por defecto en init_session_state()
 
 PERSONALIZAR APARIENCIA:
-Modificar CSS en apply_custom_css()
+Modificar CSS en static/exani.css (se sirve como recurso estático; el hash
+del contenido en la URL invalida la caché del navegador al cambiarlo)
 
 AÑADIR NUEVOS MÓDULOS:
-1. Agregar al diccionario question_database
+1. Crear bank/<modulo>.json con sus reactivos
 2. Incluir en all_modules del dashboard
 3. Actualizar configuraciones automáticas
 
@@ -1581,8 +1891,10 @@ DESPLIEGUE EN PRODUCCIÓN:
 LIMITACIONES Y CONSIDERACIONES:
 ------------------------------
 - Atajos de teclado limitados por Streamlit
-- Auto-refresh necesario para timer
-- Estado se reinicia al recargar página
+- El temporizador corre en el navegador; el servidor verifica el límite en
+  cada interacción y cada DEADLINE_CHECK_SECONDS segundos
+- Al recargar la página (o reiniciar el servidor) el examen en curso se
+  reanuda con el token de la URL (?t=...), a partir de su punto de control
 - Streamlit Cloud tiene límites de recursos
 
 MANTENIMIENTO:
@@ -0,0 +1,41 @@
+"""Pruebas del formato binario de puntos de control"""
+
+import os
+import sys
+from array import array
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.checkpoint import (  # noqa: E402
+    Checkpoint, InvalidCheckpointError, decode_checkpoint, encode_checkpoint
+)
+from exani.exam_forms import FormSpec, encode_form_code  # noqa: E402
+from exani.exam_state import UNANSWERED  # noqa: E402
+
+
+def _checkpoint(user_id: str) -> Checkpoint:
+    spec = FormSpec(seed=1234, question_count=5, modules=('pensamiento_matematico',),
+                    shuffle_options=False, bank_check=0)
+    answers = array('b', [0, 2, UNANSWERED, 1, UNANSWERED])
+    return Checkpoint(encode_form_code(spec), 'Completo', user_id, 180, 3,
+                      1_700_000_000.0, 1_700_010_800.0, answers)
+
+
+def test_round_trip():
+    checkpoint = _checkpoint('sustentante-01')
+    assert decode_checkpoint(encode_checkpoint(checkpoint)) == checkpoint
+
+
+@pytest.mark.parametrize('user_id', ['ñ' * 200, 'José' * 80, '🎓' * 100], ids=['2-bytes', 'mixto', '4-bytes'])
+def test_long_non_ascii_user_id_is_truncated_on_a_character_boundary(user_id):
+    decoded = decode_checkpoint(encode_checkpoint(_checkpoint(user_id)))
+    assert user_id.startswith(decoded.user_id)
+    assert 252 <= len(decoded.user_id.encode('utf-8')) <= 255
+    assert decoded.answers == _checkpoint(user_id).answers
+
+
+def test_garbage_is_rejected():
+    with pytest.raises(InvalidCheckpointError):
+        decode_checkpoint(b'\x01\x02')
@@ -0,0 +1,58 @@
+"""Pruebas de los códigos de forma con reactivos excluidos"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.attempt_store import get_attempt_store  # noqa: E402
+from exani.exam_forms import (  # noqa: E402
+    FormBankMismatchError, build_form, decode_form_code, encode_form_code, load_exclusion, new_form_spec,
+    save_exclusion
+)
+from exani.question_bank import Question, QuestionBank  # noqa: E402
+
+MODULES = ('pensamiento_matematico', 'comprension_lectora')
+
+
+def _bank() -> QuestionBank:
+    return QuestionBank((Question(qid, MODULES[qid % 2], 'area', f'Reactivo {qid}', ('A) x', 'B) y'), 0)
+                         for qid in range(200)), version='0123abcd')
+
+
+def _fresh_process():
+    """Olvida lo que el proceso tenga en memoria: sólo queda la base compartida"""
+    get_attempt_store.cache_clear()
+    save_exclusion.cache_clear()
+    load_exclusion.cache_clear()
+
+
+@pytest.fixture
+def shared_db(tmp_path, monkeypatch):
+    monkeypatch.setenv('EXANI_DB_PATH', str(tmp_path / 'exani.db'))
+    _fresh_process()
+    yield
+    _fresh_process()
+
+
+def test_code_with_exclusions_rebuilds_from_the_shared_database(shared_db):
+    bank = _bank()
+    exclude = frozenset(range(0, 200, 3))
+    spec = new_form_spec(bank, MODULES, 40, seed=7, exclude=exclude)
+    assert spec.excludes_items
+    form = build_form(bank, spec)
+    assert not set(form.question_ids) & exclude
+
+    _fresh_process()
+    rebuilt = build_form(_bank(), decode_form_code(encode_form_code(spec)))
+    assert rebuilt.question_ids == form.question_ids
+
+
+def test_missing_exclusion_list_is_a_bank_mismatch(shared_db, tmp_path, monkeypatch):
+    spec = new_form_spec(_bank(), MODULES, 40, seed=7, exclude=frozenset({1, 2}))
+    monkeypatch.setenv('EXANI_DB_PATH', str(tmp_path / 'otra.db'))
+    _fresh_process()
+    with pytest.raises(FormBankMismatchError):
+        build_form(_bank(), spec)
@@ -0,0 +1,29 @@
+"""Pruebas de la lectura de hojas de respuestas"""
+
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.exam_state import UNANSWERED  # noqa: E402
+from exani.grading import letters_to_answers, read_answer_sheets  # noqa: E402
+
+
+def test_padded_cells_are_read():
+    values = np.array([[' A', 'b ', ' c ', '\tD'], ['a', 'B', 'C', 'd']], dtype=object)
+    assert letters_to_answers(values).tolist() == [[0, 1, 2, 3], [0, 1, 2, 3]]
+
+
+def test_multiple_marks_and_symbols_are_unanswered():
+    values = np.array([['AB', 'A,B', ' a b ', 'ABCDE', '', '  ', '*', 'Ñ']], dtype=object)
+    assert letters_to_answers(values).tolist() == [[UNANSWERED] * 8]
+
+
+def test_csv_cells_with_spaces():
+    source = io.StringIO("student,r1,r2,r3\nS1, A ,BC,c\n")
+    (student_ids, answers), = read_answer_sheets(source, 3)
+    assert student_ids.tolist() == ['S1']
+    assert answers.tolist() == [[0, UNANSWERED, 2]]
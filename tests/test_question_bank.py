@@ -0,0 +1,50 @@
+"""Pruebas del cargador del banco con archivos inválidos"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.question_bank import QuestionBankLoader  # noqa: E402
+
+
+def _write_module(bank_dir, module: str, items):
+    path = os.path.join(bank_dir, module + '.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+    return path
+
+
+def _item(text: str, **extra):
+    return dict({'area': 'General', 'text': text, 'options': ['a', 'b', 'c', 'd'], 'correct': 0}, **extra)
+
+
+def test_malformed_module_is_left_out(tmp_path):
+    _write_module(tmp_path, 'biologia', [_item('¿Qué es una célula?')])
+    broken = tmp_path / 'fisica.json'
+    broken.write_text('[{"text": ', encoding='utf-8')
+    loader = QuestionBankLoader(str(tmp_path), check_interval=0)
+
+    bank = loader.get_bank(['biologia', 'fisica'])
+    assert bank.modules == ('biologia',)
+    errors = loader.errors(['biologia', 'fisica'])
+    assert list(errors) == ['fisica'] and str(broken) in errors['fisica']
+
+    # Al corregir el archivo el módulo vuelve al banco
+    os.remove(broken)
+    _write_module(tmp_path, 'fisica', [_item('¿Qué es la inercia?')])
+    assert set(loader.get_bank(['biologia', 'fisica']).modules) == {'biologia', 'fisica'}
+    assert loader.errors() == {}
+
+
+def test_duplicate_ids_are_left_out(tmp_path):
+    _write_module(tmp_path, 'biologia', [_item('Uno', id=7)])
+    duplicated = _write_module(tmp_path, 'quimica', [_item('Dos', id=7)])
+    repeated = _write_module(tmp_path, 'fisica', [_item('Tres'), _item('Tres')])
+    loader = QuestionBankLoader(str(tmp_path), check_interval=0)
+
+    bank = loader.get_bank(['biologia', 'fisica', 'quimica'])
+    assert bank.modules == ('biologia',)
+    errors = loader.errors()
+    assert duplicated in errors['quimica'] and repeated in errors['fisica']
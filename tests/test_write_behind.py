@@ -0,0 +1,65 @@
+"""Pruebas de la cola de escritura diferida ante fallas de la base"""
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exani.attempt_store import AttemptRecord, AttemptStore  # noqa: E402
+from exani.write_behind import MAX_FLUSH_RETRIES, WriteBehindQueue  # noqa: E402
+
+
+def _record(user_id: str) -> AttemptRecord:
+    return AttemptRecord(user_id=user_id, exam_type='completo', form_code=None, bank_version='v1',
+                         started_at=0.0, finished_at=1.0, score=50, correct=1, wrong=1, skipped=0,
+                         question_ids=(1, 2), answers=(0, 1), correct_options=(0, 0))
+
+
+class FlakyStore(AttemptStore):
+    """Almacén cuya escritura falla mientras ``down`` sea verdadero"""
+    down = True
+
+    def write_batch(self, live_answers, records, checkpoints=()):
+        if self.down:
+            raise sqlite3.OperationalError('database is locked')
+        return super().write_batch(live_answers, records, checkpoints)
+
+
+def _users(store: AttemptStore):
+    with store.connection() as connection:
+        return sorted(row[0] for row in connection.execute("SELECT user_id FROM attempts"))
+
+
+def test_results_survive_an_outage_longer_than_the_retries(tmp_path):
+    store = FlakyStore(str(tmp_path / 'exani.db'))
+    queue = WriteBehindQueue(store, flush_interval=0.01)
+    assert queue.submit_answer('s1', 0, 1, 0)
+    assert queue.submit_result(_record('ana'))
+    assert not queue.flush(timeout=0.01 * (MAX_FLUSH_RETRIES + 3))
+
+    metrics = queue.metrics()
+    assert metrics.failing and metrics.unsaved_results == 1
+    assert metrics.dropped == 1  # sólo la respuesta en curso
+
+    store.down = False
+    assert queue.flush(timeout=2)
+    assert _users(store) == ['ana']
+    assert not queue.metrics().failing
+    queue.close()
+
+
+def test_unwritten_results_are_kept_on_close_and_replayed(tmp_path):
+    store = FlakyStore(str(tmp_path / 'exani.db'))
+    queue = WriteBehindQueue(store, flush_interval=0.01)
+    queue.submit_result(_record('ana'))
+    queue.submit_result(_record('beto'))
+    queue.close()
+    assert os.path.exists(queue.pending_path)
+
+    store.down = False
+    replay = WriteBehindQueue(store, flush_interval=0.01)
+    assert replay.flush(timeout=2)
+    assert _users(store) == ['ana', 'beto']
+    assert not os.path.exists(replay.pending_path)
+    replay.close()